@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple, Callable, Any
+
+from rtree.data.database_entry import DatabaseEntry
+from rtree.data.entry_handle import SearchResult
+from rtree.data.mbb import MBB
+from rtree.data.nearest_heap import NearestHeap
+from rtree.data.rtree_node import RTreeNode
+from rtree.default_config import *
+from rtree.rtree import RTree
+
+
+class ReadWriteLock:
+    """Lock for asyncio tasks. Readers hold it together, writer holds it alone.
+    Waiting writer stops new readers, so that writes are not starved by a stream of queries."""
+
+    def __init__(self):
+        self.readers = 0
+        self.writing = False
+        self.waiting_writers = 0
+        # created on first use, inside the running event loop
+        self.__condition: Optional[asyncio.Condition] = None
+
+    def __get_condition(self) -> asyncio.Condition:
+        if self.__condition is None:
+            self.__condition = asyncio.Condition()
+        return self.__condition
+
+    @asynccontextmanager
+    async def read(self):
+        condition = self.__get_condition()
+        async with condition:
+            await condition.wait_for(lambda: not self.writing and self.waiting_writers == 0)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            async with condition:
+                self.readers -= 1
+                condition.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        condition = self.__get_condition()
+        async with condition:
+            self.waiting_writers += 1
+            try:
+                await condition.wait_for(lambda: not self.writing and self.readers == 0)
+            finally:
+                self.waiting_writers -= 1
+            self.writing = True
+        try:
+            yield
+        finally:
+            async with condition:
+                self.writing = False
+                condition.notify_all()
+
+
+class AsyncRTree:
+    """asyncio facade of RTree. File reads and writes run in a bounded pool of threads instead of the event loop.
+    Subtrees are searched concurrently, queries run concurrently and inserts or deletes run alone.
+    Nodes are read and entries found by the helpers of the tree, so the node cache and the hash index are used.
+    Queries always descend the tree as with PLAN_TREE, the query planner of the tree is not used."""
+
+    def __init__(self, tree: RTree, io_threads: int = ASYNC_IO_THREADS):
+        if io_threads < 1:
+            raise ValueError(f"Invalid number of threads: {io_threads}")
+
+        self.tree = tree
+        self.executor = ThreadPoolExecutor(max_workers=io_threads)
+        self.lock = ReadWriteLock()
+
+    async def __aenter__(self) -> AsyncRTree:
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Waits for running file operations. The tree stays open, its state and ids of cached nodes are saved"""
+        self.executor.shutdown()
+        if not self.tree.read_only and not self.tree.closed:
+            self.tree.flush()
+
+    async def __run(self, function: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def __get_children(self, node: RTreeNode, is_candidate: Callable[[MBB], bool]) -> List[RTreeNode]:
+        """Reads children of the inner node whose MBB satisfies is_candidate, called in the thread pool"""
+        return list(self.tree.iter_child_nodes(node, is_candidate))
+
+    def __search_leaf(self, node: RTreeNode, is_match: Callable[[List[int]], bool]) -> List[SearchResult]:
+        """Returns matching entries of the leaf, called in the thread pool"""
+        return [self.tree.materialize(entry_position, entry_coordinates)
+                for entry_position, entry_coordinates in self.tree.iter_leaf_entries(node)
+                if is_match(entry_coordinates)]
+
+    def __check_dimensions(self, *coordinates_lists: List[int]):
+        for coordinates in coordinates_lists:
+            if len(coordinates) != self.tree.dimensions:
+                raise Exception("coordinates have incorrect number of dimensions")
+
+    async def search_area(self, coordinates_min: List[int], coordinates_max: List[int]) -> List[SearchResult]:
+        self.__check_dimensions(coordinates_min, coordinates_max)
+        check_mbb = MBB.create_box_from_entry_list(coordinates_min)
+        check_mbb.insert_mbb(MBB.create_box_from_entry_list(coordinates_max).box)
+
+        async def visit(node: RTreeNode) -> List[SearchResult]:
+            if node.is_leaf:
+                return await self.__run(self.__search_leaf, node, check_mbb.contains_point)
+
+            # subtrees are searched concurrently, results keep the order of children
+            children = await self.__run(self.__get_children, node, check_mbb.overlaps)
+            found_entries: List[SearchResult] = []
+            for child_entries in await asyncio.gather(*(visit(child) for child in children)):
+                found_entries.extend(child_entries)
+            return found_entries
+
+        async with self.lock.read():
+            return await visit(await self.__run(self.tree.read_node, self.tree.root_id))
+
+    async def search_entry(self, coordinates: List[int]) -> Optional[SearchResult]:
+        """Point lookup of the tree, it uses the hash index when the tree has it"""
+        self.__check_dimensions(coordinates)
+        async with self.lock.read():
+            return await self.__run(self.tree.search_entry, coordinates)
+
+    async def search_knn(self, k: int, coordinates: List[int]) -> List[SearchResult]:
+        """Best-first search of k nearest entries, every step of the search runs in the thread pool"""
+        self.__check_dimensions(coordinates)
+        if k <= 0:
+            return []
+
+        async with self.lock.read():
+            heap = NearestHeap(coordinates, self.tree.root_id)
+            found_entries: List[Tuple[int, List[int]]] = []
+            while heap and len(found_entries) < k:
+                found = await self.__run(self.tree.nearest_step, heap)
+                if found is not None:
+                    found_entries.append(found)
+
+            return await self.__run(lambda: [self.tree.materialize(*found) for found in found_entries])
+
+    async def insert_entry(self, new_entry: DatabaseEntry):
+        async with self.lock.write():
+            await self.__run(self.tree.insert_entry, new_entry)
+
+    async def delete_entry(self, coordinates: List[int]) -> bool:
+        async with self.lock.write():
+            return await self.__run(self.tree.delete_entry, coordinates)
@@ -0,0 +1,331 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from math import ceil, log2
+from typing import List, Tuple, Iterable, Iterator, Callable, Optional
+
+from rtree.data.external_sorter import ExternalSorter, ItemFile, LeafItem
+from rtree.data.hilbert_curve import HilbertCurve
+from rtree.data.mbb import MBB
+from rtree.data.mbb_dim import MBBDim
+from rtree.data.node_layout import NodeLayout
+from rtree.data.rtree_node import RTreeNode
+from rtree.data.tree_file_handler import TreeFileHandler
+from rtree.default_config import *
+
+Box = Tuple[MBBDim, ...]
+
+
+class PackedTreeShape:
+    """Number of nodes on every level and ids of nodes in a packed (sub)tree with given number of entries.
+    Nodes are numbered level by level from first_id, starting with the leaves, the root is the last node.
+    Leaves hold up to leaf_capacity entries (capacity by default), inner nodes up to capacity children."""
+
+    def __init__(self, count: int, capacity: int, first_id: int = 0, levels: Optional[int] = None,
+                 root_parent_id: Optional[int] = None, leaf_capacity: Optional[int] = None):
+        self.count = count
+        self.capacity = capacity
+        self.leaf_capacity = leaf_capacity if leaf_capacity is not None else capacity
+        self.level_sizes = BulkLoader.get_level_sizes(count, capacity, self.leaf_capacity)
+
+        # subtree can be made higher by a chain of single nodes, so that it fits under a common parent
+        if levels is not None:
+            if levels < len(self.level_sizes):
+                raise ValueError(f"{count} entries cannot be packed into {levels} levels")
+            self.level_sizes += [1] * (levels - len(self.level_sizes))
+
+        self.level_offsets = [first_id + sum(self.level_sizes[:level]) for level in range(len(self.level_sizes))]
+        self.depth = len(self.level_sizes) - 1
+        self.root_id = self.level_offsets[-1]
+        self.root_parent_id = root_parent_id if root_parent_id is not None else self.root_id  # root is its own parent
+        self.node_count = sum(self.level_sizes)
+
+    def get_node_id(self, level: int, index: int) -> int:
+        return self.level_offsets[level] + index
+
+    def get_parent_id(self, level: int, index: int) -> int:
+        if level == self.depth:
+            return self.root_parent_id
+        return self.get_node_id(level + 1, index // self.capacity)
+
+
+def pack_nodes(layout: NodeLayout, shape: PackedTreeShape, level: int, children: List[int], child_boxes: List[Box],
+               child_counts: List[int], write_page: Callable[[int, bytes], None]) -> Tuple[List[Box], List[int]]:
+    """Groups consecutive child nodes into inner nodes of given level.
+    Returns boxes and entry counts of the new nodes."""
+    boxes: List[Box] = []
+    counts: List[int] = []
+    for index, first_child in enumerate(range(0, len(children), shape.capacity)):
+        box = BulkLoader.get_boxes_box(child_boxes[first_child:first_child + shape.capacity])
+        count = sum(child_counts[first_child:first_child + shape.capacity])
+        node = RTreeNode(mbb=MBB(box), parent_id=shape.get_parent_id(level, index),
+                         child_nodes=children[first_child:first_child + shape.capacity], is_leaf=False,
+                         entry_count=count, child_boxes=child_boxes[first_child:first_child + shape.capacity])
+        write_page(shape.get_node_id(level, index), layout.encode(node))
+        boxes.append(box)
+        counts.append(count)
+
+    return boxes, counts
+
+
+def pack_levels(layout: NodeLayout, shape: PackedTreeShape, items: Iterator[LeafItem],
+                write_page: Callable[[int, bytes], None]) -> Tuple[Box, int]:
+    """Packs ordered items into leaves and builds all levels of the (sub)tree above them.
+    Pages are passed to write_page(node_id, page) in the order of node ids. Returns box and entry count of the root."""
+    # leaf level, boxes and counts are kept for the parent level
+    boxes: List[Box] = []
+    counts: List[int] = []
+    for index in range(shape.level_sizes[0]):
+        chunk = list(islice(items, shape.leaf_capacity))
+        if chunk:
+            box = BulkLoader.get_items_box(coordinates for coordinates, _ in chunk)
+        else:
+            box = tuple(MBBDim(0, 0) for _ in range(layout.dimensions))  # empty tree
+
+        # points of entries are needed only if the leaf page stores them
+        child_boxes = None
+        if layout.leaf_coordinates:
+            child_boxes = [tuple(MBBDim(value, value) for value in coordinates) for coordinates, _ in chunk]
+
+        node = RTreeNode(mbb=MBB(box), parent_id=shape.get_parent_id(0, index),
+                         child_nodes=[position for _, position in chunk], is_leaf=True, child_boxes=child_boxes)
+        write_page(shape.get_node_id(0, index), layout.encode(node))
+        boxes.append(box)
+        counts.append(len(chunk))
+
+    # upper levels, each one built from the boxes of the level below
+    for level in range(1, shape.depth + 1):
+        children = [shape.get_node_id(level - 1, index) for index in range(len(boxes))]
+        boxes, counts = pack_nodes(layout, shape, level, children, boxes, counts, write_page)
+
+    return boxes[0], counts[0]
+
+
+def pack_slab_task(layout: NodeLayout, shape: PackedTreeShape, items: List[LeafItem], method: str,
+                   box: Box) -> Tuple[List[bytes], Box, int]:
+    """Orders items of one slab and packs them in a worker process.
+    Pages are returned in the order of node ids instead of being written."""
+    ordered_items = BulkLoader.sort_items(items, layout.dimensions, shape.leaf_capacity, method, box)
+    del items
+
+    pages: List[bytes] = []
+    root_box, root_count = pack_levels(layout, shape, iter(ordered_items), lambda node_id, page: pages.append(page))
+    return pages, root_box, root_count
+
+
+class BulkLoader:
+    """Builds a packed R-tree bottom-up.
+
+    The shape of the packed tree depends only on the number of items, so the id of every node
+    (and of its parent) is known before anything is written. Leaves get the lowest ids, every upper
+    level follows and the root is the last node. Each node is therefore written exactly once
+    and in sequential order."""
+
+    @staticmethod
+    def get_level_sizes(count: int, capacity: int, leaf_capacity: Optional[int] = None) -> List[int]:
+        """Returns number of nodes on each tree level, starting from the leaves"""
+        level_sizes = [max(1, ceil(count / (leaf_capacity if leaf_capacity is not None else capacity)))]
+        while level_sizes[-1] > 1:
+            level_sizes.append(ceil(level_sizes[-1] / capacity))
+        return level_sizes
+
+    @staticmethod
+    def str_sort(items: List[LeafItem], dimensions: int, capacity: int, dim: int = 0) -> List[LeafItem]:
+        """Orders items using Sort-Tile-Recursive, so that consecutive chunks of size capacity form the leaves"""
+        items = sorted(items, key=lambda item: item[0][dim])
+        if dim == dimensions - 1 or len(items) <= capacity:
+            return items
+
+        # split items sorted by this dimension into vertical slabs and sort each slab by the remaining ones
+        leaf_count = ceil(len(items) / capacity)
+        slab_count = ceil(leaf_count ** (1 / (dimensions - dim)))
+        slab_size = capacity * ceil(leaf_count / slab_count)
+
+        ordered: List[LeafItem] = []
+        for slab_start in range(0, len(items), slab_size):
+            ordered.extend(BulkLoader.str_sort(items[slab_start:slab_start + slab_size],
+                                               dimensions, capacity, dim + 1))
+        return ordered
+
+    @staticmethod
+    def get_hilbert_key_function(box: Box, order: int = HILBERT_CURVE_ORDER) -> Callable[[LeafItem], int]:
+        """Returns function which calculates position of an item on Hilbert curve laid over the box"""
+        # coordinates are scaled into the grid of the curve, [0, 2 ** order) in every dimension
+        highest_cell = (1 << order) - 1
+
+        def get_hilbert_key(item: LeafItem) -> int:
+            cells = [((value - dim.low) * highest_cell) // dim.get_diff() if dim.get_diff() != 0 else 0
+                     for value, dim in zip(item[0], box)]
+            return HilbertCurve.get_index(cells, order)
+
+        return get_hilbert_key
+
+    @staticmethod
+    def hilbert_sort(items: List[LeafItem], dimensions: int, order: int = HILBERT_CURVE_ORDER,
+                     box: Optional[Box] = None) -> List[LeafItem]:
+        """Orders items by their position on Hilbert curve laid over the box (bounding box of all items by default)"""
+        if len(items) == 0:
+            return items
+
+        if box is None:
+            box = BulkLoader.get_items_box(coordinates for coordinates, _ in items)
+        if len(box) != dimensions:
+            raise ValueError(f"Items have {len(box)} dimensions, but {dimensions} are expected")
+
+        return sorted(items, key=BulkLoader.get_hilbert_key_function(box, order))
+
+    @staticmethod
+    def sort_items(items: List[LeafItem], dimensions: int, capacity: int,
+                   method: str = DEFAULT_BULK_LOAD_METHOD, box: Optional[Box] = None) -> List[LeafItem]:
+        """Orders items for packing with given bulk load method"""
+        if method == BULK_LOAD_STR:
+            return BulkLoader.str_sort(items, dimensions, capacity)
+        if method == BULK_LOAD_HILBERT:
+            return BulkLoader.hilbert_sort(items, dimensions, box=box)
+        raise ValueError(f"Unknown bulk load method: {method}")
+
+    @staticmethod
+    def str_sort_external(sorter: ExternalSorter, items: Iterable[LeafItem], count: int, dimensions: int,
+                          capacity: int, dim: int = 0) -> Iterator[LeafItem]:
+        """Sort-Tile-Recursive ordering of a stream of count items in bounded memory, same order as str_sort.
+        Sort of every dimension runs inside the merge of the previous one, so the sorter has to have
+        only a part of the memory budget (see ExternalSorter.split)"""
+        ordered = sorter.sort(items, key=lambda item: item[0][dim])
+        if dim == dimensions - 1 or count <= capacity:
+            yield from ordered
+            return
+
+        leaf_count = ceil(count / capacity)
+        slab_count = ceil(leaf_count ** (1 / (dimensions - dim)))
+        slab_size = capacity * ceil(leaf_count / slab_count)
+
+        # every slab is read from the merged stream and sorted by the remaining dimensions on its own
+        for slab_start in range(0, count, slab_size):
+            slab_items = min(slab_size, count - slab_start)
+            yield from BulkLoader.str_sort_external(sorter, islice(ordered, slab_items), slab_items,
+                                                    dimensions, capacity, dim + 1)
+
+    @staticmethod
+    def sort_items_external(sorter: ExternalSorter, item_file: ItemFile, box: Optional[Box], dimensions: int,
+                            capacity: int, method: str = DEFAULT_BULK_LOAD_METHOD) -> Iterator[LeafItem]:
+        """Orders items spilled into a file for packing with given bulk load method, in the memory of the sorter"""
+        if method == BULK_LOAD_STR:
+            # sorts of all the dimensions may hold their runs at once, each of them gets its part of the memory
+            level_sorter = sorter.split(dimensions)
+            return BulkLoader.str_sort_external(level_sorter, item_file.read(level_sorter.run_length),
+                                                item_file.count, dimensions, capacity)
+        if method == BULK_LOAD_HILBERT:
+            if box is None:
+                return iter([])
+            return sorter.sort(item_file.read(sorter.run_length), key=BulkLoader.get_hilbert_key_function(box))
+        raise ValueError(f"Unknown bulk load method: {method}")
+
+    @staticmethod
+    def get_items_box(coordinates: Iterable[List[int]]) -> Box:
+        """Creates the smallest box containing all given points"""
+        return tuple(MBBDim(min(dim_values), max(dim_values)) for dim_values in zip(*coordinates))
+
+    @staticmethod
+    def get_boxes_box(boxes: List[Box]) -> Box:
+        """Creates the smallest box containing all given boxes"""
+        return tuple(MBBDim(min(dim.low for dim in dims), max(dim.high for dim in dims)) for dims in zip(*boxes))
+
+    def __init__(self, tree_handler: TreeFileHandler, dimensions: int, capacity: int, workers: int = 1,
+                 leaf_capacity: Optional[int] = None):
+        if tree_handler.highest_id != tree_handler.null_node_id:
+            raise ValueError("Bulk load requires an empty tree file")
+
+        self.tree_handler = tree_handler
+        self.dimensions = dimensions
+        self.capacity = capacity
+        self.leaf_capacity = leaf_capacity if leaf_capacity is not None else capacity
+        self.workers = workers
+
+    def load(self, items: List[LeafItem], method: str = DEFAULT_BULK_LOAD_METHOD) -> Tuple[int, int]:
+        """Orders items with given method and packs them. Returns root id and tree depth"""
+        if self.workers > 1 and len(items) > self.leaf_capacity * self.workers:
+            return self.__load_parallel(items, method)
+
+        ordered_items = self.sort_items(items, self.dimensions, self.leaf_capacity, method)
+        return self.pack(ordered_items, len(ordered_items))
+
+    def pack(self, ordered_items: Iterable[LeafItem], count: int) -> Tuple[int, int]:
+        """Writes leaves from already ordered items and all the upper levels. Returns root id and tree depth"""
+        shape = PackedTreeShape(count, self.capacity, leaf_capacity=self.leaf_capacity)
+        items_iter = iter(ordered_items)
+
+        pack_levels(self.tree_handler.layout, shape, items_iter, self.__write_page)
+
+        if next(items_iter, None) is not None:
+            raise ValueError(f"Bulk load expected exactly {count} items")
+
+        return shape.root_id, shape.depth
+
+    def __split_into_slabs(self, items: List[LeafItem], method: str, box: Box) -> List[List[LeafItem]]:
+        """Splits items into spatially coherent slabs of the same size, one for each worker"""
+        if method == BULK_LOAD_STR:
+            # vertical slabs along the first dimension
+            items = sorted(items, key=lambda item: item[0][0])
+        elif method == BULK_LOAD_HILBERT:
+            # coarse Hilbert curve, items of one slab follow each other on the fine one too
+            coarse_order = max(1, ceil(log2(self.workers * self.leaf_capacity) / self.dimensions))
+            items = sorted(items, key=self.get_hilbert_key_function(box, coarse_order))
+        else:
+            raise ValueError(f"Unknown bulk load method: {method}")
+
+        slab_size, larger_slabs = divmod(len(items), self.workers)
+        slabs: List[List[LeafItem]] = []
+        slab_start = 0
+        for slab in range(self.workers):
+            slab_end = slab_start + slab_size + (1 if slab < larger_slabs else 0)
+            slabs.append(items[slab_start:slab_end])
+            slab_start = slab_end
+        return slabs
+
+    def __load_parallel(self, items: List[LeafItem], method: str) -> Tuple[int, int]:
+        """Splits items into slabs, which are ordered and packed into subtrees in a process pool.
+        Each subtree gets its own range of node ids, the subtrees are joined under shared upper levels.
+        Returns root id and tree depth"""
+        box = self.get_items_box(coordinates for coordinates, _ in items)
+        slabs = self.__split_into_slabs(items, method, box)
+        del items
+
+        # every subtree has the same height, so that the tree stays balanced
+        levels = max(len(self.get_level_sizes(len(slab), self.capacity, self.leaf_capacity)) for slab in slabs)
+        slab_node_counts = [PackedTreeShape(len(slab), self.capacity, levels=levels,
+                                            leaf_capacity=self.leaf_capacity).node_count for slab in slabs]
+        upper_shape = PackedTreeShape(len(slabs), self.capacity, first_id=sum(slab_node_counts))
+
+        slab_root_ids: List[int] = []
+        slab_root_boxes: List[Box] = []
+        slab_root_counts: List[int] = []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            tasks = []
+            for index, slab in enumerate(slabs):
+                shape = PackedTreeShape(len(slab), self.capacity, first_id=sum(slab_node_counts[:index]),
+                                        levels=levels, root_parent_id=upper_shape.get_parent_id(-1, index),
+                                        leaf_capacity=self.leaf_capacity)
+                slab_root_ids.append(shape.root_id)
+                tasks.append(executor.submit(pack_slab_task, self.tree_handler.layout, shape, slab, method, box))
+            del slabs
+
+            # subtrees are written as soon as they are done, in the order of their ids
+            for task in tasks:
+                pages, root_box, root_count = task.result()
+                for page in pages:
+                    self.__write_page(self.tree_handler.highest_id + 1, page)
+                slab_root_boxes.append(root_box)
+                slab_root_counts.append(root_count)
+
+        # shared upper levels above the slabs
+        children, boxes, counts = slab_root_ids, slab_root_boxes, slab_root_counts
+        for level in range(upper_shape.depth + 1):
+            boxes, counts = pack_nodes(self.tree_handler.layout, upper_shape, level, children, boxes, counts,
+                                       self.__write_page)
+            children = [upper_shape.get_node_id(level, index) for index in range(len(boxes))]
+
+        return upper_shape.root_id, levels + upper_shape.depth
+
+    def __write_page(self, expected_id: int, page: bytes):
+        node_id = self.tree_handler.create_encoded_node(page)
+        if node_id != expected_id:
+            raise Exception(f"Bulk load wrote node {node_id}, but expected id {expected_id}")
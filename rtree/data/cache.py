@@ -1,63 +1,243 @@
-from math import floor
-from typing import Optional, List
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Iterable, Set
+
 from rtree.default_config import *
 from rtree.data.rtree_node import RTreeNode
 
 
 class Cache:
+    """Cache of nodes read from the tree file, its size in nodes is given by cache_memory / node_size.
+    Pinned nodes (top levels of the tree) are never evicted, the other nodes are evicted by the policy:
+    CACHE_POLICY_LRU evicts the least recently used node.
+    CACHE_POLICY_2Q (Johnson and Shasha) keeps nodes read once in a FIFO queue, nodes are moved to the LRU part
+    only when they are read again soon after their eviction from the queue. A scan of the tree then evicts only
+    nodes from the queue. Nodes are invalidated whenever their page is written, so the cache never returns
+    a stale node."""
+
     def __init__(self,
-                 child_size: int,
                  node_size: int = DEFAULT_NODE_SIZE,
-                 cache_memory: int = CACHE_MEMORY_SIZE):
-        self.child_size = child_size + 1  # for the root
+                 cache_memory: int = CACHE_MEMORY_SIZE,
+                 policy: str = DEFAULT_CACHE_POLICY):
+        if policy not in (CACHE_POLICY_LRU, CACHE_POLICY_2Q):
+            raise ValueError(f"Unknown cache policy: {policy}")
+
         self.node_size = node_size
         self.cache_memory = cache_memory
+        self.policy = policy
+
+        # maximum number of cached nodes, pinned included
+        self.cache_size = self.cache_memory // self.node_size
+
+        # pinned node ids, with node when it is loaded
+        self.memory_pinned: Dict[int, Optional[RTreeNode]] = {}
+
+        # other nodes, least recently used first
+        self.memory_lru: OrderedDict[int, RTreeNode] = OrderedDict()
+
+        # 2Q queue of nodes read once, first read first, and ids of nodes evicted from it
+        self.memory_in: OrderedDict[int, RTreeNode] = OrderedDict()
+        self.evicted_in: OrderedDict[int, None] = OrderedDict()
 
-        self.cache_size = floor(self.cache_memory / self.node_size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-        # make sure the first tree level (root and its children) is always cached
-        self.memory_permanent: List[Optional[RTreeNode]] = [None] * self.child_size
+        # ids of nodes invalidated while preloaded pages are read, they may be stale. None when no read is running
+        self.preload_invalidated: Optional[Set[int]] = None
 
-        # other levels are free to rewrite at any point
-        self.memory_variable: List[Optional[RTreeNode]] = [None] * self.cache_size
+        # nodes are stored also by the thread preloading the cache
+        self.lock = threading.RLock()
+
+        # ids of searched nodes while accesses are recorded, they can be replayed by CacheSimulator
+        self.access_log: Optional[List[int]] = None
 
     def __str__(self):
         return str(self.__dict__)
 
-    def __del__(self):
-        del self.memory_permanent
-        del self.memory_variable
+    def __len__(self):
+        return (len(self.memory_lru) + len(self.memory_in) +
+                sum(node is not None for node in self.memory_pinned.values()))
+
+    @property
+    def resident_bytes(self) -> int:
+        """Memory taken by loaded nodes, counted by the node size"""
+        return len(self) * self.node_size
+
+    @property
+    def hit_ratio(self) -> float:
+        searches = self.hits + self.misses
+        return self.hits / searches if searches else 0.0
+
+    def reset_statistics(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def start_recording(self):
+        """Starts recording ids of searched nodes"""
+        self.access_log = []
+
+    def stop_recording(self) -> List[int]:
+        """Stops recording, returns ids of nodes searched since start_recording"""
+        access_log = self.access_log if self.access_log is not None else []
+        self.access_log = None
+        return access_log
+
+    def __evict(self):
+        unpinned_size = self.cache_size - len(self.memory_pinned)
+        in_size = max(1, int(unpinned_size * CACHE_2Q_IN_FRACTION))
+        while len(self.memory_lru) + len(self.memory_in) > max(0, unpinned_size):
+            if self.memory_in and (len(self.memory_in) > in_size or not self.memory_lru):
+                node_id, _ = self.memory_in.popitem(last=False)
+                self.evicted_in[node_id] = None
+                while len(self.evicted_in) > max(1, int(self.cache_size * CACHE_2Q_OUT_FRACTION)):
+                    self.evicted_in.popitem(last=False)
+            else:
+                self.memory_lru.popitem(last=False)
+            self.evictions += 1
+
+    def search(self, node_id: int) -> Optional[RTreeNode]:
+        with self.lock:
+            if self.access_log is not None:
+                self.access_log.append(node_id)
+
+            if node_id in self.memory_pinned:
+                cached_node = self.memory_pinned[node_id]
+            elif node_id in self.memory_in:
+                # position in 2Q queue is given by the first read
+                cached_node = self.memory_in[node_id]
+            else:
+                cached_node = self.memory_lru.get(node_id)
+                if cached_node is not None:
+                    self.memory_lru.move_to_end(node_id)
+
+            if cached_node is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return cached_node
+
+    def store(self, new_node: RTreeNode):
+        with self.lock:
+            if new_node is None or new_node.id is None:
+                raise Exception("Cannot call cache store on Node with no ID")
+
+            if new_node.id in self.memory_pinned:
+                self.memory_pinned[new_node.id] = new_node
+            elif self.cache_size > len(self.memory_pinned):
+                if new_node.id in self.memory_in:
+                    self.memory_in[new_node.id] = new_node
+                elif self.policy == CACHE_POLICY_2Q and new_node.id not in self.memory_lru and \
+                        new_node.id not in self.evicted_in:
+                    # first read
+                    self.memory_in[new_node.id] = new_node
+                else:
+                    self.evicted_in.pop(new_node.id, None)
+                    self.memory_lru[new_node.id] = new_node
+                    self.memory_lru.move_to_end(new_node.id)
+                self.__evict()
+
+    def invalidate(self, node_id: int):
+        """Removes node whose page was written, pinned node stays pinned and is loaded again on next read"""
+        with self.lock:
+            if self.preload_invalidated is not None:
+                self.preload_invalidated.add(node_id)
+            if node_id in self.memory_pinned:
+                self.memory_pinned[node_id] = None
+            self.memory_lru.pop(node_id, None)
+            self.memory_in.pop(node_id, None)
+
+    def start_preload(self):
+        """Starts recording of invalidated nodes, called before pages to be preloaded are read"""
+        with self.lock:
+            self.preload_invalidated = set()
+
+    def store_preloaded(self, nodes: List[RTreeNode]) -> int:
+        """Stores nodes read in advance since start_preload, nodes invalidated since then are skipped.
+        Nodes already cached are kept as they are, the other ones are stored in the LRU part for both policies,
+        as they were cached before. Returns the number of stored nodes"""
+        with self.lock:
+            invalidated = self.preload_invalidated
+            self.preload_invalidated = None
+            if invalidated is None:
+                # cache was cleared while the pages were read
+                return 0
+
+            stored_count = 0
+            for node in nodes:
+                if node.id is None or node.id in invalidated:
+                    continue
+                if node.id in self.memory_pinned:
+                    if self.memory_pinned[node.id] is None:
+                        self.memory_pinned[node.id] = node
+                        stored_count += 1
+                elif node.id not in self.memory_lru and node.id not in self.memory_in:
+                    self.memory_lru[node.id] = node
+                    stored_count += 1
+            self.__evict()
+            return stored_count
+
+    def pin(self, node_ids: Iterable[int]):
+        """Replaces pinned nodes, only as many nodes as fit into the cache are pinned.
+        Nodes already cached stay loaded, nodes no longer pinned are moved to the LRU part"""
+        with self.lock:
+            old_pinned = self.memory_pinned
+            self.memory_pinned = {}
+            for node_id in node_ids:
+                if len(self.memory_pinned) >= self.cache_size:
+                    break
+                cached_node = old_pinned.pop(node_id, None)
+                if cached_node is None:
+                    cached_node = self.memory_lru.pop(node_id, None)
+                if cached_node is None:
+                    cached_node = self.memory_in.pop(node_id, None)
+                self.memory_pinned[node_id] = cached_node
+
+            for node_id, cached_node in old_pinned.items():
+                if cached_node is not None:
+                    self.memory_lru[node_id] = cached_node
+            self.__evict()
 
-    def __hash_per(self, data: int) -> int:
-        return data % self.child_size
+    def get_pinned_ids(self) -> List[int]:
+        return list(self.memory_pinned)
 
-    def __hash_var(self, data: int) -> int:
-        return data % self.cache_size
+    def get_resident_ids(self) -> List[int]:
+        """Returns sorted ids of loaded nodes"""
+        with self.lock:
+            pinned_ids = [node_id for node_id, node in self.memory_pinned.items() if node is not None]
+            return sorted(pinned_ids + list(self.memory_lru) + list(self.memory_in))
 
-    def search(self, node_id: int, permanent: bool = False) -> Optional[RTreeNode]:
-        return None
-        cached_node: Optional[RTreeNode] = None
+    @staticmethod
+    def save_ids(filename: str, unique_sequence: bytes, node_ids: List[int]):
+        """Saves ids of nodes, e.g. resident ones, so that they can be loaded into the cache after a restart"""
+        content = bytearray(unique_sequence)
+        for node_id in node_ids:
+            content += node_id.to_bytes(NODE_ID_SIZE, byteorder=TREE_BYTEORDER, signed=True)
 
-        if permanent:
-            hashed = self.__hash_per(node_id)
-            cached_node = self.memory_permanent[hashed]
-        else:
-            hashed = self.__hash_var(node_id)
-            cached_node = self.memory_variable[hashed]
+        with open(filename, 'wb') as file:
+            file.write(content)
 
-        if cached_node is None:
-            return None
+    @staticmethod
+    def load_ids(filename: str, unique_sequence: bytes) -> List[int]:
+        """Reads ids saved by save_ids(). Returns no ids when the file is missing or belongs to another tree"""
+        if not os.path.isfile(filename):
+            return []
 
-        return cached_node if cached_node.id == node_id else None
+        with open(filename, 'rb') as file:
+            content = file.read()
 
-    def store(self, new_node: RTreeNode, permanent: bool = False):
-        return
-        if new_node is None or new_node.id is None:
-            raise Exception("Cannot call cache store on Node with no ID")
+        if content[:UNIQUE_SEQUENCE_LENGTH] != unique_sequence:
+            return []
+        return [int.from_bytes(content[start:start + NODE_ID_SIZE], byteorder=TREE_BYTEORDER, signed=True)
+                for start in range(UNIQUE_SEQUENCE_LENGTH, len(content) - NODE_ID_SIZE + 1, NODE_ID_SIZE)]
 
-        if permanent:
-            hashed = self.__hash_per(new_node.id)
-            self.memory_permanent[hashed] = new_node
-        else:
-            hashed = self.__hash_var(new_node.id)
-            self.memory_variable[hashed] = new_node
+    def clear(self):
+        """Removes all nodes, pinned ids included. Statistics are kept"""
+        with self.lock:
+            self.preload_invalidated = None
+            self.memory_pinned = {}
+            self.memory_lru = OrderedDict()
+            self.memory_in = OrderedDict()
+            self.evicted_in = OrderedDict()
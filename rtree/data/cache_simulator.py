@@ -0,0 +1,84 @@
+from typing import List, Dict, Iterable, Tuple, Sequence
+
+from rtree.default_config import *
+
+
+class CacheSimulator:
+    """Replays recorded node accesses (see Cache.start_recording) and computes the miss ratio of the node cache
+    for any cache size. Uses stack distances of Mattson et al., so all sizes are evaluated by one pass over accesses.
+    Pinned nodes never leave the cache, they miss only on their first access and take place from the LRU part.
+    Miss ratios are those of CACHE_POLICY_LRU, 2Q is not a stack algorithm and has to be measured by Cache itself."""
+
+    def __init__(self, accesses: Iterable[int], node_size: int = DEFAULT_NODE_SIZE,
+                 pinned_ids: Sequence[int] = ()):
+        self.accesses = list(accesses)
+        self.node_size = node_size
+        self.pinned_ids = list(pinned_ids)
+
+        # stack distances and cold misses, computed for each number of pinned nodes when it is needed
+        self.__distances: Dict[int, Tuple[List[int], int]] = {}
+
+    @staticmethod
+    def get_stack_distances(accesses: Sequence[int]) -> Tuple[List[int], int]:
+        """Counts accesses with each stack distance, i.e. number of distinct nodes accessed since the last access
+        of the same node. Access with distance d hits in LRU cache of more than d nodes.
+        Returns the counts indexed by distance and the number of first (cold) accesses"""
+        # Fenwick tree over access times, marking the last access of every node
+        tree = [0] * (len(accesses) + 1)
+
+        def add(time: int, value: int):
+            time += 1
+            while time < len(tree):
+                tree[time] += value
+                time += time & -time
+
+        def prefix_sum(time: int) -> int:
+            total = 0
+            while time > 0:
+                total += tree[time]
+                time -= time & -time
+            return total
+
+        last_access: Dict[int, int] = {}
+        distance_counts: List[int] = []
+        cold_misses = 0
+        for time, node_id in enumerate(accesses):
+            previous_time = last_access.get(node_id)
+            if previous_time is None:
+                cold_misses += 1
+            else:
+                distance = prefix_sum(time) - prefix_sum(previous_time + 1)
+                if distance >= len(distance_counts):
+                    distance_counts.extend([0] * (distance + 1 - len(distance_counts)))
+                distance_counts[distance] += 1
+                add(previous_time, -1)
+            add(time, 1)
+            last_access[node_id] = time
+
+        return distance_counts, cold_misses
+
+    def __get_distances(self, pinned_count: int) -> Tuple[List[int], int]:
+        if pinned_count not in self.__distances:
+            pinned = set(self.pinned_ids[:pinned_count])
+            distance_counts, cold_misses = self.get_stack_distances(
+                [node_id for node_id in self.accesses if node_id not in pinned])
+            # pinned nodes miss only on their first access
+            cold_misses += len(pinned.intersection(self.accesses))
+            self.__distances[pinned_count] = (distance_counts, cold_misses)
+        return self.__distances[pinned_count]
+
+    def misses(self, cache_memory: int) -> int:
+        """Number of misses of a cache of given memory size when accesses are replayed"""
+        cache_size = cache_memory // self.node_size
+        pinned_count = min(cache_size, len(self.pinned_ids))
+        distance_counts, cold_misses = self.__get_distances(pinned_count)
+        return cold_misses + sum(distance_counts[cache_size - pinned_count:])
+
+    def miss_ratio(self, cache_memory: int) -> float:
+        if not self.accesses:
+            return 0.0
+        return self.misses(cache_memory) / len(self.accesses)
+
+    def report(self, cache_memories: Iterable[int]) -> List[Tuple[int, float]]:
+        """Returns (cache memory, miss ratio) for each given cache memory size"""
+        return [(cache_memory, self.miss_ratio(cache_memory)) for cache_memory in cache_memories]
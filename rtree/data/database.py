@@ -1,8 +1,10 @@
 import os
 import pickle
-from typing import Optional, List, Tuple
+import threading
+from typing import Optional, List, Tuple, Iterable, Generator
 
 from rtree.data.database_entry import DatabaseEntry
+from rtree.data.entry_cache import EntryCache
 from rtree.default_config import *
 
 
@@ -12,8 +14,11 @@ class Database:
                  dimensions: int = DEFAULT_DIMENSIONS,
                  parameters_size: int = PARAMETER_RECORD_SIZE,
                  unique_sequence: bytes = DEMO_UNIQUE_SEQUENCE,
-                 config_hash: bytes = DEMO_CONFIG_HASH):
+                 config_hash: bytes = DEMO_CONFIG_HASH,
+                 read_only: bool = False,
+                 entry_cache_memory: int = ENTRY_CACHE_MEMORY_SIZE):
         self.filename = filename
+        self.read_only = read_only
         self.dimensions = dimensions
         self.parameter_record_size = parameters_size
         self.header_size = UNIQUE_SEQUENCE_LENGTH + CONFIG_HASH_LENGTH
@@ -21,13 +26,15 @@ class Database:
         # create file if not exists
         save_header_to_file = False
         if not os.path.isfile(self.filename):  # todo maybe move to RTree
+            if self.read_only:
+                raise IOError(f"File cannot be opened as read-only, it does not exist: {self.filename}")
             save_header_to_file = True
             with open(self.filename, 'w+b'):
                 pass
 
         # open file
         try:
-            self.file = open(self.filename, 'r+b')
+            self.file = open(self.filename, 'rb' if self.read_only else 'r+b')
         except IOError:
             input(f"File cannot be opened: {self.filename}")
 
@@ -44,14 +51,24 @@ class Database:
 
         self.current_position = self.filesize
 
+        # entries are read by seeking in the shared file object, lock allows reading them from more threads
+        self.lock = threading.RLock()
+
+        # entries decoded by search, invalidated when they are marked as deleted
+        self.entry_cache = EntryCache(entry_cache_memory)
+
     def __del__(self):
-        if not self.file.closed:
-            self.file.flush()
-            self.file.close()
+        self.close()
 
         if DELETE_TREE_INDEX_FILE:
             os.remove(self.filename)
 
+    def close(self):
+        if not self.file.closed:
+            if not self.read_only:
+                self.file.flush()
+            self.file.close()
+
     def __str__(self):
         return str(self.__dict__)
 
@@ -77,6 +94,10 @@ class Database:
 
         return unique, config
 
+    def __check_writable(self):
+        if self.read_only:
+            raise IOError(f"Database file is opened as read-only: {self.filename}")
+
     def __verify_byte_position(self, byte_position: int) -> bool:
         # remove flag and dimensions from the "self.filesize", data is variable and must be handled differently
         return byte_position < ((self.filesize - RECORD_FLAG_SIZE) - (self.dimensions * self.parameter_record_size))
@@ -85,55 +106,140 @@ class Database:
         if not self.__verify_byte_position(byte_position):
             raise ValueError("Database error! Requesting position outside the file.")
 
-        self.file.seek(byte_position, 0)
+        with self.lock:
+            cached_entry = self.entry_cache.search(byte_position)
+            if cached_entry is not None:
+                return cached_entry
 
-        is_present = bool.from_bytes(self.file.read(RECORD_FLAG_SIZE), byteorder=DATABASE_BYTEORDER, signed=False)
+            self.file.seek(byte_position, 0)
 
-        # reads the range in each dimension
-        coordinates = []
-        for _ in range(self.dimensions):
-            dim = int.from_bytes(self.file.read(self.parameter_record_size), byteorder=DATABASE_BYTEORDER, signed=True)
-            coordinates.append(dim)
+            is_present = bool.from_bytes(self.file.read(RECORD_FLAG_SIZE), byteorder=DATABASE_BYTEORDER,
+                                         signed=False)
 
-        try:
-            data = pickle.load(self.file)
-        except Exception as e:
-            print(f"Error when calling pickle on position {byte_position}")
-            raise e
+            # reads the range in each dimension
+            coordinates = []
+            for _ in range(self.dimensions):
+                dim = int.from_bytes(self.file.read(self.parameter_record_size), byteorder=DATABASE_BYTEORDER,
+                                     signed=True)
+                coordinates.append(dim)
 
-        self.file.flush()
+            try:
+                data = pickle.load(self.file)
+            except Exception as e:
+                print(f"Error when calling pickle on position {byte_position}")
+                raise e
 
-        return DatabaseEntry(coordinates, data, is_present)
+            entry = DatabaseEntry(coordinates, data, is_present)
+            self.entry_cache.store(byte_position, entry, self.file.tell() - byte_position)
 
-    def create(self, new_record: DatabaseEntry) -> int:
+        return entry
+
+    def search_many(self, byte_positions: List[int]) -> List[DatabaseEntry]:
+        """Reads multiple entries, the file is read in the order of positions. Entries are returned in given order"""
+        entries = {}
+        for byte_position in sorted(set(byte_positions)):
+            entries[byte_position] = self.search(byte_position)
+        return [entries[byte_position] for byte_position in byte_positions]
+
+    def search_coordinates(self, byte_position: int) -> List[int]:
+        """Reads only coordinates of the entry, data are not unpickled"""
+        if not self.__verify_byte_position(byte_position):
+            raise ValueError("Database error! Requesting position outside the file.")
+
+        with self.lock:
+            self.file.seek(byte_position + RECORD_FLAG_SIZE, 0)
+            record = self.file.read(self.dimensions * self.parameter_record_size)
+
+        coordinates = []
+        for dim_start in range(0, len(record), self.parameter_record_size):
+            dim = int.from_bytes(record[dim_start:dim_start + self.parameter_record_size],
+                                 byteorder=DATABASE_BYTEORDER, signed=True)
+            coordinates.append(dim)
+
+        return coordinates
+
+    def __encode_entry(self, new_record: DatabaseEntry) -> bytes:
         if len(new_record.coordinates) != self.dimensions:
             raise ValueError("Data creation error! received incorrect dimensions.")
 
-        self.__update_file_size()
-        beginning = self.filesize
+        record = bytearray()
+        record += new_record.is_present.to_bytes(RECORD_FLAG_SIZE, byteorder=DATABASE_BYTEORDER, signed=False)
 
-        # append to the end of database file
-        self.file.seek(0, 2)
+        for dimension in new_record.coordinates:
+            record += dimension.to_bytes(self.parameter_record_size, byteorder=DATABASE_BYTEORDER, signed=True)
 
-        self.file.write(new_record.is_present.to_bytes(RECORD_FLAG_SIZE, byteorder=DATABASE_BYTEORDER, signed=False))
+        record += pickle.dumps(new_record.data)
+        return bytes(record)
 
-        for dimension in new_record.coordinates:
-            self.file.write(dimension.to_bytes(self.parameter_record_size, byteorder=DATABASE_BYTEORDER, signed=True))
+    def create(self, new_record: DatabaseEntry) -> int:
+        self.__check_writable()
+        record = self.__encode_entry(new_record)
 
-        pickle.dump(new_record.data, self.file)
+        with self.lock:
+            self.__update_file_size()
+            beginning = self.filesize
 
-        self.file.flush()
-        self.__update_file_size()
+            # append to the end of database file
+            self.file.seek(0, 2)
+            self.file.write(record)
+
+            self.file.flush()
+            self.__update_file_size()
 
         return beginning
 
+    def create_many(self, new_records: Iterable[DatabaseEntry],
+                    buffer_size: int = DATABASE_WRITE_BUFFER_SIZE) -> Generator[Tuple[List[int], int], None, None]:
+        """Appends entries to the database file in large writes.
+        Yields (coordinates, byte position) of every entry, entries are written at the latest when the iteration ends.
+        When reading or encoding of an entry fails, or the iteration is not finished, no entry is kept in the file"""
+        self.__check_writable()
+        self.__update_file_size()
+        original_size = self.filesize
+        beginning = self.filesize
+        buffer = bytearray()
+
+        try:
+            for new_record in new_records:
+                position = beginning + len(buffer)
+                buffer += self.__encode_entry(new_record)
+                yield new_record.coordinates, position
+
+                if len(buffer) >= buffer_size:
+                    self.__write_at_end(buffer)
+                    beginning += len(buffer)
+                    buffer = bytearray()
+        except BaseException:
+            self.__truncate(original_size)
+            raise
+
+        self.__write_at_end(buffer)
+
+    def __truncate(self, size: int):
+        """Removes entries written after the given size of file"""
+        with self.lock:
+            self.file.truncate(size)
+            self.file.flush()
+            self.__update_file_size()
+            self.entry_cache.clear()
+
+    def __write_at_end(self, buffer: bytearray):
+        with self.lock:
+            self.file.seek(0, 2)
+            self.file.write(buffer)
+            self.file.flush()
+            self.__update_file_size()
+
     def mark_to_delete(self, byte_position: int):
+        self.__check_writable()
         if not self.__verify_byte_position(byte_position):
             raise ValueError("Database error! Requesting position outside the file.")
 
-        self.file.seek(byte_position, 0)
-        self.file.write(False.to_bytes(RECORD_FLAG_SIZE, byteorder=DATABASE_BYTEORDER, signed=False))
-        self.file.flush()
+        with self.lock:
+            self.entry_cache.invalidate(byte_position)
+            self.file.seek(byte_position, 0)
+            self.file.write(False.to_bytes(RECORD_FLAG_SIZE, byteorder=DATABASE_BYTEORDER, signed=False))
+            self.file.flush()
 
     # future linear search stuffu
 
@@ -161,40 +267,42 @@ class Database:
         return DatabaseEntry(coordinates, data, is_present)
 
     def linear_search_entry(self, coordinates: List[int]) -> Optional[DatabaseEntry]:
-        self.__point_at_first()
-        try:
-            entry = self.__get_next_entry()
-            if entry is None:
-                return None
-            while entry.coordinates != coordinates:
+        with self.lock:
+            self.__point_at_first()
+            try:
                 entry = self.__get_next_entry()
                 if entry is None:
                     return None
-            return entry
-        except:
-            print("probably reached EOF, all entries were compared")
+                while entry.coordinates != coordinates:
+                    entry = self.__get_next_entry()
+                    if entry is None:
+                        return None
+                return entry
+            except:
+                print("probably reached EOF, all entries were compared")
         # coordinates not matched
         return None
 
     def linear_search_area(self, coordinates_min: List[int], coordinates_max: List[int]) -> List[DatabaseEntry]:
-        self.__point_at_first()
-        matching: List[DatabaseEntry] = []
-        try:
-            entry = self.__get_next_entry()
-        except EOFError as e:
-            return matching
-
-        while True:
-            tmp = 0
-            for mbb_dim in range(self.dimensions):
-                if coordinates_min[mbb_dim] <= entry.coordinates[mbb_dim] <= coordinates_max[mbb_dim]:
-                    tmp += 1
-            if tmp == self.dimensions:
-                matching.append(entry)
-            try:
-                entry = self.__get_next_entry()
-            except EOFError as e:
-                break
+        return [entry for _, entry in self.linear_search_area_positions(coordinates_min, coordinates_max)]
+
+    def linear_search_area_positions(self, coordinates_min: List[int],
+                                     coordinates_max: List[int]) -> List[Tuple[int, DatabaseEntry]]:
+        """Reads the whole file, returns (position, entry) of entries inside the area"""
+        matching: List[Tuple[int, DatabaseEntry]] = []
+        with self.lock:
+            self.__point_at_first()
+            while True:
+                byte_position = self.file.tell()
+                try:
+                    entry = self.__get_next_entry()
+                except EOFError:
+                    break
+
+                # deleted entries are returned as None
+                if entry is not None and all(coordinates_min[mbb_dim] <= entry.coordinates[mbb_dim] <=
+                                             coordinates_max[mbb_dim] for mbb_dim in range(self.dimensions)):
+                    matching.append((byte_position, entry))
 
         return matching
 
@@ -220,29 +328,35 @@ class Database:
         return matching
 
     def linear_search_knn(self, k: int, coordinates: List[int]) -> List[DatabaseEntry]:
-        self.__point_at_first()
-        entry_list: List[DatabaseEntry] = []
+        return [entry for _, entry in self.linear_search_knn_positions(k, coordinates)]
 
-        while True:
+    def linear_search_knn_positions(self, k: int, coordinates: List[int]) -> List[Tuple[int, DatabaseEntry]]:
+        """Reads the whole file, returns (position, entry) of k entries nearest to the point, nearest first"""
+        entry_list: List[Tuple[int, DatabaseEntry]] = []
+        if k <= 0:
+            return entry_list
 
-            entry = None
-            try:
-                entry = self.__get_next_entry()
-            except EOFError:
-                # print("probably reached EOF, all entries were compared")
-                break
+        with self.lock:
+            self.__point_at_first()
+            while True:
+                byte_position = self.file.tell()
+                try:
+                    entry = self.__get_next_entry()
+                except EOFError:
+                    # print("probably reached EOF, all entries were compared")
+                    break
 
-            if entry is None:
-                continue
+                if entry is None:
+                    continue
 
-            if len(entry_list) < k:
-                entry_list.append(entry)
-                entry_list.sort(key=lambda x: x.distance_from(coordinates))
+                if len(entry_list) < k:
+                    entry_list.append((byte_position, entry))
+                    entry_list.sort(key=lambda x: x[1].distance_from(coordinates))
 
-            elif entry_list[-1].distance_from(coordinates) > entry.distance_from(coordinates):
-                entry_list.append(entry)
-                entry_list.sort(key=lambda x: x.distance_from(coordinates))
-                entry_list = entry_list[0:-1]
+                elif entry_list[-1][1].distance_from(coordinates) > entry.distance_from(coordinates):
+                    entry_list.append((byte_position, entry))
+                    entry_list.sort(key=lambda x: x[1].distance_from(coordinates))
+                    entry_list = entry_list[0:-1]
 
         return entry_list
 
@@ -0,0 +1,62 @@
+import pickle
+from collections import OrderedDict
+from typing import Optional, Tuple, List
+
+from rtree.default_config import *
+from rtree.data.database_entry import DatabaseEntry
+
+
+class EntryCache:
+    """LRU cache of entries decoded from the database file, keyed by their byte position.
+    Size of an entry is the size of its record in the file, entries are evicted when they do not fit into cache_memory.
+    Data of entries are kept pickled and unpickled on every hit, so a caller changing returned data does not change
+    what the following queries get."""
+
+    def __init__(self, cache_memory: int = ENTRY_CACHE_MEMORY_SIZE):
+        self.cache_memory = cache_memory
+        self.memory_used = 0
+
+        # (coordinates, pickled data, is present) of entries with sizes of their records, least recently used first
+        self.memory_lru: OrderedDict[int, Tuple[Tuple[List[int], bytes, bool], int]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def __len__(self):
+        return len(self.memory_lru)
+
+    def search(self, byte_position: int) -> Optional[DatabaseEntry]:
+        cached = self.memory_lru.get(byte_position)
+        if cached is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.memory_lru.move_to_end(byte_position)
+        coordinates, pickled_data, is_present = cached[0]
+        return DatabaseEntry(list(coordinates), pickle.loads(pickled_data), is_present)
+
+    def store(self, byte_position: int, entry: DatabaseEntry, record_size: int):
+        if record_size > self.cache_memory:
+            return
+
+        self.invalidate(byte_position)
+        self.memory_lru[byte_position] = ((list(entry.coordinates), pickle.dumps(entry.data), entry.is_present),
+                                          record_size)
+        self.memory_used += record_size
+        while self.memory_used > self.cache_memory:
+            _, (_, evicted_size) = self.memory_lru.popitem(last=False)
+            self.memory_used -= evicted_size
+
+    def invalidate(self, byte_position: int):
+        cached = self.memory_lru.pop(byte_position, None)
+        if cached is not None:
+            self.memory_used -= cached[1]
+
+    def clear(self):
+        """Removes all entries, counters are kept"""
+        self.memory_lru = OrderedDict()
+        self.memory_used = 0
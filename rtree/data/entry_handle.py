@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import math
+from typing import List, Iterable, Union, Dict
+
+from rtree.data.database import Database
+from rtree.data.database_entry import DatabaseEntry
+from rtree.data.mbb import MBB
+
+
+class EntryHandle:
+    """Lightweight result of a query, holds position and coordinates of a database entry.
+    Data of the entry are unpickled when they are accessed for the first time."""
+
+    @staticmethod
+    def fetch_all(handles: Iterable[EntryHandle]):
+        """Loads data of all handles at once, the database file is read in the order of positions"""
+        handles_by_database: Dict[int, List[EntryHandle]] = {}
+        for handle in handles:
+            if not handle.is_loaded():
+                handles_by_database.setdefault(id(handle.database), []).append(handle)
+
+        for database_handles in handles_by_database.values():
+            database = database_handles[0].database
+            entries = database.search_many([handle.position for handle in database_handles])
+            for handle, entry in zip(database_handles, entries):
+                handle.set_entry(entry)
+
+    def __init__(self, database: Database, position: int, coordinates: List[int]):
+        self.database = database
+        self.position = position
+        self.coordinates = coordinates
+        self.is_present = True
+
+        self.__data: object = None
+        self.__loaded = False
+
+    def __str__(self):
+        return f"EntryHandle(position={self.position}, coordinates={self.coordinates})"
+
+    def set_entry(self, entry: DatabaseEntry):
+        """Sets data of the handle from its entry read from the database"""
+        self.__data = entry.data
+        self.is_present = entry.is_present
+        self.__loaded = True
+
+    def is_loaded(self) -> bool:
+        return self.__loaded
+
+    @property
+    def data(self) -> object:
+        if not self.__loaded:
+            self.set_entry(self.database.search(self.position))
+        return self.__data
+
+    def get_entry(self) -> DatabaseEntry:
+        return DatabaseEntry(self.coordinates, self.data, self.is_present)
+
+    def get_mbb(self):
+        return MBB.create_box_from_entry_list(self.coordinates)
+
+    def distance_from(self, coordinates: List[int]) -> float:
+        return math.dist(self.coordinates, coordinates)
+
+
+# queries return either full entries or handles with lazily loaded data
+SearchResult = Union[DatabaseEntry, EntryHandle]
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import heapq
+import struct
+import sys
+import tempfile
+from itertools import islice, chain
+from typing import List, Tuple, Iterable, Iterator, Callable, Optional, Any
+
+from rtree.data.mbb_dim import MBBDim
+from rtree.default_config import *
+
+# (coordinates of database entry, byte position of the entry in database file)
+LeafItem = Tuple[List[int], int]
+
+
+class ItemFile:
+    """Temporary file with fixed size records of leaf items, deleted when closed"""
+
+    def __init__(self, directory: str, dimensions: int):
+        self.dimensions = dimensions
+        self.record = struct.Struct(f"<{dimensions + 1}q")
+        # merge keeps many run files open at once, their buffers would not be counted in the memory budget
+        self.file = tempfile.TemporaryFile(dir=directory, buffering=0)
+        self.count = 0
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def write(self, items: Iterable[LeafItem]):
+        """Appends items, all of them are written by one write"""
+        records = [self.record.pack(*coordinates, position) for coordinates, position in items]
+        self.file.seek(0, 2)
+        self.file.write(b"".join(records))
+        self.count += len(records)
+
+    def read(self, block_size: int) -> Iterator[LeafItem]:
+        """Yields all items from the beginning of the file, block_size items are read at once"""
+        self.file.flush()
+        position = 0
+        while True:
+            self.file.seek(position)
+            block = self.file.read(block_size * self.record.size)
+            if not block:
+                break
+            position += len(block)
+            for values in self.record.iter_unpack(block):
+                yield list(values[:-1]), values[-1]
+
+
+class ExternalSorter:
+    """Sorts streams of leaf items in bounded memory.
+
+    Items are sorted in runs fitting into the memory budget, the runs are spilled into temporary
+    files in given directory and merged as a stream."""
+
+    @staticmethod
+    def get_item_memory_size(dimensions: int) -> int:
+        """Estimates number of bytes taken by one leaf item in memory, including its place in a list"""
+        coordinates = [sys.maxsize - dim for dim in range(dimensions)]
+        return (sys.getsizeof((coordinates, sys.maxsize)) + sys.getsizeof(coordinates)
+                + (dimensions + 1) * sys.getsizeof(sys.maxsize) + 8)
+
+    def __init__(self, directory: str, dimensions: int, memory_size: int = BULK_LOAD_MEMORY_SIZE):
+        self.directory = directory
+        self.dimensions = dimensions
+        self.memory_size = memory_size
+
+        # number of items sorted in memory at once
+        self.run_length = max(2, memory_size // self.get_item_memory_size(dimensions))
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def fits_in_memory(self, count: int) -> bool:
+        return count <= self.run_length
+
+    def split(self, parts: int) -> ExternalSorter:
+        """Returns sorter with a part of the memory budget, for sorts running nested in each other"""
+        return ExternalSorter(self.directory, self.dimensions, self.memory_size // parts)
+
+    @staticmethod
+    def drain(items: List[LeafItem]) -> Iterator[LeafItem]:
+        """Yields items of the list in their order and removes them from it, so that the list does not keep
+        the items which were already processed"""
+        items.reverse()
+        while items:
+            yield items.pop()
+
+    def spill(self, items: Iterable[LeafItem]) -> Tuple[ItemFile, Optional[Tuple[MBBDim, ...]]]:
+        """Writes unsorted items into a temporary file. Returns the file and bounding box of all items"""
+        item_file = ItemFile(self.directory, self.dimensions)
+        lows: List[int] = []
+        highs: List[int] = []
+        items_iter = iter(items)
+        while True:
+            block = list(islice(items_iter, self.run_length))
+            if not block:
+                break
+            for dim, values in enumerate(zip(*(coordinates for coordinates, _ in block))):
+                if dim < len(lows):
+                    lows[dim] = min(lows[dim], min(values))
+                    highs[dim] = max(highs[dim], max(values))
+                else:
+                    lows.append(min(values))
+                    highs.append(max(values))
+            item_file.write(block)
+            # written block is freed before the next one is read
+            del block
+
+        box = tuple(MBBDim(low, high) for low, high in zip(lows, highs)) if lows else None
+        return item_file, box
+
+    def sort(self, items: Iterable[LeafItem], key: Callable[[LeafItem], Any]) -> Iterator[LeafItem]:
+        """Yields items ordered by key. Sorting is stable, equal items keep their input order"""
+        items_iter = iter(items)
+        first_run = list(islice(items_iter, self.run_length))
+        first_run.sort(key=key)
+
+        # whole input fits in memory, nothing is spilled
+        next_item = next(items_iter, None)
+        if next_item is None:
+            yield from first_run
+            return
+
+        runs: List[ItemFile] = []
+        try:
+            run = first_run
+            rest = chain([next_item], items_iter)
+            del first_run
+            while run:
+                run_file = ItemFile(self.directory, self.dimensions)
+                run_file.write(run)
+                runs.append(run_file)
+                # written run is freed before the next one is read
+                del run
+                run = list(islice(rest, self.run_length))
+                run.sort(key=key)
+
+            # every run is read in blocks, all the blocks together fit into the memory budget
+            block_size = max(1, self.run_length // len(runs))
+            yield from heapq.merge(*(run_file.read(block_size) for run_file in runs), key=key)
+        finally:
+            for run_file in runs:
+                run_file.close()
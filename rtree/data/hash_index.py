@@ -0,0 +1,269 @@
+import os
+import threading
+import zlib
+from typing import List, Tuple, Iterable, Iterator, Optional
+
+from rtree.default_config import *
+
+# coordinates, database position and id of the leaf
+IndexRecord = Tuple[List[int], int, int]
+
+
+class HashIndex:
+    """Hash file mapping coordinates of entries to their positions in the database and ids of their leaves.
+    Bucket i is stored in page i, full buckets continue in overflow pages appended to the file.
+    When the buckets are too full, the file is rebuilt with twice as many of them."""
+
+    def __init__(self, filename: str, dimensions: int, parameters_size: int, id_size: int, unique_sequence: bytes,
+                 read_only: bool = False, page_size: int = HASH_INDEX_PAGE_SIZE):
+        self.filename = filename
+        self.dimensions = dimensions
+        self.parameters_size = parameters_size
+        self.id_size = id_size
+        self.unique_sequence = unique_sequence
+        self.read_only = read_only
+        self.page_size = page_size
+
+        self.coordinates_size = self.dimensions * self.parameters_size
+        self.record_size = RECORD_FLAG_SIZE + self.coordinates_size + HASH_INDEX_POSITION_SIZE + self.id_size
+        self.records_per_page = (self.page_size - HASH_INDEX_POSITION_SIZE) // self.record_size
+        if self.records_per_page < 1:
+            raise ValueError(f"Page of hash index ({self.page_size}B) is too small for a record ({self.record_size}B)")
+
+        self.header_size = UNIQUE_SEQUENCE_LENGTH + 3 * HASH_INDEX_POSITION_SIZE
+        self.bucket_count = 0
+        self.page_count = 0
+        self.entry_count = 0
+
+        # file of another tree or of different size of records is replaced by an empty index
+        is_valid = os.path.isfile(self.filename) and self.__read_header()
+        if not is_valid:
+            if self.read_only:
+                raise IOError(f"Hash index cannot be opened as read-only, it is missing or invalid: {self.filename}")
+            with open(self.filename, 'w+b'):
+                pass
+
+        self.file = open(self.filename, 'rb' if self.read_only else 'r+b')
+        if not is_valid:
+            self.reset()
+
+        # pages are read by seeking in the shared file object, lock allows searching from more threads at once
+        self.read_lock = threading.Lock()
+
+        self.pages_read_count = 0
+
+    def __del__(self):
+        if hasattr(self, "file"):
+            self.close()
+
+    def close(self):
+        if not self.file.closed:
+            if not self.read_only:
+                self.file.flush()
+            self.file.close()
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def __encode_int(self, value: int, size: int = HASH_INDEX_POSITION_SIZE) -> bytes:
+        return value.to_bytes(size, byteorder=TREE_BYTEORDER, signed=True)
+
+    def __decode_int(self, content: bytes, start: int, size: int = HASH_INDEX_POSITION_SIZE) -> int:
+        return int.from_bytes(content[start:start + size], byteorder=TREE_BYTEORDER, signed=True)
+
+    def __read_header(self) -> bool:
+        """Reads header of existing file. Returns False when the file does not belong to the tree"""
+        with open(self.filename, 'rb') as file:
+            header = file.read(self.header_size)
+            file_size = os.path.getsize(self.filename)
+
+        if len(header) != self.header_size or header[:UNIQUE_SEQUENCE_LENGTH] != self.unique_sequence:
+            return False
+
+        self.bucket_count = self.__decode_int(header, UNIQUE_SEQUENCE_LENGTH)
+        self.page_count = self.__decode_int(header, UNIQUE_SEQUENCE_LENGTH + HASH_INDEX_POSITION_SIZE)
+        self.entry_count = self.__decode_int(header, UNIQUE_SEQUENCE_LENGTH + 2 * HASH_INDEX_POSITION_SIZE)
+        return self.bucket_count > 0 and file_size == self.header_size + self.page_count * self.page_size
+
+    def __write_header(self):
+        self.file.seek(0, 0)
+        self.file.write(self.unique_sequence + self.__encode_int(self.bucket_count) +
+                        self.__encode_int(self.page_count) + self.__encode_int(self.entry_count))
+
+    def __check_writable(self):
+        if self.read_only:
+            raise IOError(f"Hash index is opened as read-only: {self.filename}")
+
+    def __get_page_address(self, page_id: int) -> int:
+        return self.header_size + page_id * self.page_size
+
+    def __read_page(self, page_id: int) -> bytes:
+        with self.read_lock:
+            self.pages_read_count += 1
+            self.file.seek(self.__get_page_address(page_id), 0)
+            return self.file.read(self.page_size)
+
+    def __write_page(self, page_id: int, page: bytes):
+        self.file.seek(self.__get_page_address(page_id), 0)
+        self.file.write(page)
+
+    def __create_page(self) -> int:
+        page_id = self.page_count
+        self.page_count += 1
+        self.__write_page(page_id, self.__encode_int(NULL_NODE_ID) + bytes(self.page_size - HASH_INDEX_POSITION_SIZE))
+        return page_id
+
+    def __get_record_address(self, slot: int) -> int:
+        return HASH_INDEX_POSITION_SIZE + slot * self.record_size
+
+    def __encode_coordinates(self, coordinates: List[int]) -> bytes:
+        if len(coordinates) != self.dimensions:
+            raise ValueError("Hash index error! received incorrect dimensions.")
+        return b"".join(self.__encode_int(value, self.parameters_size) for value in coordinates)
+
+    def __encode_record(self, coordinates: bytes, position: int, leaf_id: int) -> bytes:
+        return True.to_bytes(RECORD_FLAG_SIZE, byteorder=TREE_BYTEORDER, signed=False) + coordinates + \
+               self.__encode_int(position) + self.__encode_int(leaf_id, self.id_size)
+
+    def __get_bucket(self, coordinates: bytes) -> int:
+        return zlib.crc32(coordinates) % self.bucket_count
+
+    def __iter_chain(self, page_id: int) -> Iterator[Tuple[int, bytes]]:
+        """Yields (page id, page) of the bucket and of its overflow pages"""
+        while page_id != NULL_NODE_ID:
+            page = self.__read_page(page_id)
+            yield page_id, page
+            page_id = self.__decode_int(page, 0)
+
+    def __iter_slots(self, page: bytes) -> Iterator[Tuple[int, Optional[bytes]]]:
+        """Yields (slot, record) of the page, record is None for an empty slot"""
+        for slot in range(self.records_per_page):
+            record_address = self.__get_record_address(slot)
+            if page[record_address]:
+                yield slot, page[record_address:record_address + self.record_size]
+            else:
+                yield slot, None
+
+    def __decode_record(self, record: bytes) -> IndexRecord:
+        coordinates = [self.__decode_int(record, RECORD_FLAG_SIZE + dim * self.parameters_size, self.parameters_size)
+                       for dim in range(self.dimensions)]
+        position = self.__decode_int(record, RECORD_FLAG_SIZE + self.coordinates_size)
+        leaf_id = self.__decode_int(record, RECORD_FLAG_SIZE + self.coordinates_size + HASH_INDEX_POSITION_SIZE,
+                                    self.id_size)
+        return coordinates, position, leaf_id
+
+    def __find_record(self, coordinates: bytes, position: int) -> Optional[Tuple[int, int]]:
+        """Returns (page id, slot) of the record of the entry"""
+        for page_id, page in self.__iter_chain(self.__get_bucket(coordinates)):
+            for slot, record in self.__iter_slots(page):
+                if record is not None and record[RECORD_FLAG_SIZE:RECORD_FLAG_SIZE + self.coordinates_size] == \
+                        coordinates and self.__decode_record(record)[1] == position:
+                    return page_id, slot
+        return None
+
+    def reset(self, bucket_count: int = HASH_INDEX_MIN_BUCKETS):
+        """Removes all records, the file is created again with given number of empty buckets"""
+        self.__check_writable()
+        self.file.truncate(0)
+        self.bucket_count = max(bucket_count, HASH_INDEX_MIN_BUCKETS)
+        self.page_count = 0
+        self.entry_count = 0
+        for _ in range(self.bucket_count):
+            self.__create_page()
+        self.__write_header()
+        self.file.flush()
+
+    def search(self, coordinates: List[int]) -> List[Tuple[int, int]]:
+        """Returns (database position, leaf id) of all entries with the coordinates"""
+        encoded_coordinates = self.__encode_coordinates(coordinates)
+        found: List[Tuple[int, int]] = []
+        for _, page in self.__iter_chain(self.__get_bucket(encoded_coordinates)):
+            for _, record in self.__iter_slots(page):
+                if record is not None and \
+                        record[RECORD_FLAG_SIZE:RECORD_FLAG_SIZE + self.coordinates_size] == encoded_coordinates:
+                    _, position, leaf_id = self.__decode_record(record)
+                    found.append((position, leaf_id))
+        return found
+
+    def __insert_record(self, coordinates: bytes, record: bytes):
+        last_page_id = NULL_NODE_ID
+        for page_id, page in self.__iter_chain(self.__get_bucket(coordinates)):
+            for slot, slot_record in self.__iter_slots(page):
+                if slot_record is None:
+                    self.file.seek(self.__get_page_address(page_id) + self.__get_record_address(slot), 0)
+                    self.file.write(record)
+                    return
+            last_page_id = page_id
+
+        # all pages of the bucket are full, new overflow page is linked from the last one
+        new_page_id = self.__create_page()
+        self.file.seek(self.__get_page_address(last_page_id), 0)
+        self.file.write(self.__encode_int(new_page_id))
+        self.file.seek(self.__get_page_address(new_page_id) + self.__get_record_address(0), 0)
+        self.file.write(record)
+
+    def insert(self, coordinates: List[int], position: int, leaf_id: int):
+        self.__check_writable()
+        encoded_coordinates = self.__encode_coordinates(coordinates)
+        self.__insert_record(encoded_coordinates, self.__encode_record(encoded_coordinates, position, leaf_id))
+        self.entry_count += 1
+
+        if self.entry_count > self.bucket_count * self.records_per_page * HASH_INDEX_MAX_LOAD:
+            self.__resize(self.bucket_count * 2)
+        else:
+            self.__write_header()
+        self.file.flush()
+
+    def remove(self, coordinates: List[int], position: int) -> bool:
+        """Removes record of the entry. Returns False when the entry is not in the index"""
+        self.__check_writable()
+        found = self.__find_record(self.__encode_coordinates(coordinates), position)
+        if found is None:
+            return False
+
+        page_id, slot = found
+        self.file.seek(self.__get_page_address(page_id) + self.__get_record_address(slot), 0)
+        self.file.write(bytes(self.record_size))
+        self.entry_count -= 1
+        self.__write_header()
+        self.file.flush()
+        return True
+
+    def update_leaf(self, coordinates: List[int], position: int, leaf_id: int) -> bool:
+        """Changes the leaf of the entry, when it was moved by a split. Returns False when the entry is not found"""
+        self.__check_writable()
+        encoded_coordinates = self.__encode_coordinates(coordinates)
+        found = self.__find_record(encoded_coordinates, position)
+        if found is None:
+            return False
+
+        page_id, slot = found
+        self.file.seek(self.__get_page_address(page_id) + self.__get_record_address(slot), 0)
+        self.file.write(self.__encode_record(encoded_coordinates, position, leaf_id))
+        self.file.flush()
+        return True
+
+    def iter_records(self) -> Iterator[IndexRecord]:
+        for page_id in range(self.page_count):
+            for _, record in self.__iter_slots(self.__read_page(page_id)):
+                if record is not None:
+                    yield self.__decode_record(record)
+
+    def build(self, records: Iterable[IndexRecord], count: int):
+        """Replaces content of the index by the records, buckets are sized for count records at once"""
+        records_per_bucket = max(1, int(self.records_per_page * HASH_INDEX_MAX_LOAD))
+        self.reset(-(-count // records_per_bucket))
+        self.__fill(records)
+
+    def __resize(self, bucket_count: int):
+        records = list(self.iter_records())
+        self.reset(bucket_count)
+        self.__fill(records)
+
+    def __fill(self, records: Iterable[IndexRecord]):
+        for coordinates, position, leaf_id in records:
+            encoded_coordinates = self.__encode_coordinates(coordinates)
+            self.__insert_record(encoded_coordinates, self.__encode_record(encoded_coordinates, position, leaf_id))
+            self.entry_count += 1
+        self.__write_header()
+        self.file.flush()
@@ -0,0 +1,44 @@
+from typing import List
+
+
+class HilbertCurve:
+    """Hilbert space filling curve in any number of dimensions (J. Skilling, Programming the Hilbert curve, 2004)"""
+
+    @staticmethod
+    def get_index(point: List[int], order: int) -> int:
+        """Returns position of a point on the curve. Every coordinate must be in range [0, 2 ** order)"""
+        axes = list(point)
+        dimensions = len(axes)
+        highest_bit = 1 << (order - 1)
+
+        # inverse undo excess work
+        bit = highest_bit
+        while bit > 1:
+            lower_bits = bit - 1
+            for i in range(dimensions):
+                if axes[i] & bit:
+                    axes[0] ^= lower_bits
+                else:
+                    swap = (axes[0] ^ axes[i]) & lower_bits
+                    axes[0] ^= swap
+                    axes[i] ^= swap
+            bit >>= 1
+
+        # gray encode
+        for i in range(1, dimensions):
+            axes[i] ^= axes[i - 1]
+        flip = 0
+        bit = highest_bit
+        while bit > 1:
+            if axes[dimensions - 1] & bit:
+                flip ^= bit - 1
+            bit >>= 1
+        for i in range(dimensions):
+            axes[i] ^= flip
+
+        # interleave the transposed bits, most significant first
+        index = 0
+        for bit_position in range(order - 1, -1, -1):
+            for axis in axes:
+                index = (index << 1) | ((axis >> bit_position) & 1)
+        return index
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import os
+from typing import List, Optional
+
+from rtree.default_config import *
+
+
+class Histogram:
+    """Equi-width histogram of entry coordinates, one for each dimension.
+    When a value falls outside the buckets, pairs of buckets are merged and the covered range doubles."""
+
+    @staticmethod
+    def load(filename: str, dimensions: int, unique_sequence: bytes) -> Optional[Histogram]:
+        """Reads histogram saved by save(). Returns None when the file is missing or belongs to another tree"""
+        if not os.path.isfile(filename):
+            return None
+
+        with open(filename, 'rb') as file:
+            content = file.read()
+
+        if content[:UNIQUE_SEQUENCE_LENGTH] != unique_sequence:
+            return None
+        values = [int.from_bytes(content[start:start + HISTOGRAM_VALUE_SIZE], byteorder=TREE_BYTEORDER, signed=True)
+                  for start in range(UNIQUE_SEQUENCE_LENGTH, len(content), HISTOGRAM_VALUE_SIZE)]
+
+        if len(values) < 3:
+            return None
+        buckets, total, deleted = values[0], values[1], values[2]
+        if len(values) != 3 + dimensions * (buckets + 2):
+            return None
+
+        histogram = Histogram(dimensions, buckets)
+        histogram.total = total
+        histogram.deleted = deleted
+        position = 3
+        for dim in range(dimensions):
+            histogram.lows[dim] = values[position]
+            histogram.widths[dim] = values[position + 1]
+            histogram.counts[dim] = values[position + 2:position + 2 + buckets]
+            position += buckets + 2
+        return histogram
+
+    def __init__(self, dimensions: int, buckets: int = HISTOGRAM_BUCKETS):
+        if buckets < 2 or buckets % 2 != 0:
+            raise ValueError(f"Number of histogram buckets has to be even and at least 2: {buckets}")
+
+        self.dimensions = dimensions
+        self.buckets = buckets
+
+        # number of entries in the histogram
+        self.total = 0
+
+        # number of removed entries, their records stay in the database file and are read by its scan
+        self.deleted = 0
+
+        # bucket i of dimension covers values [low + i * width, low + (i + 1) * width), width 0 means no values yet
+        self.lows: List[int] = [0] * dimensions
+        self.widths: List[int] = [0] * dimensions
+        self.counts: List[List[int]] = [[0] * buckets for _ in range(dimensions)]
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def save(self, filename: str, unique_sequence: bytes):
+        values = [self.buckets, self.total, self.deleted]
+        for dim in range(self.dimensions):
+            values += [self.lows[dim], self.widths[dim]] + self.counts[dim]
+
+        content = bytearray(unique_sequence)
+        for value in values:
+            content += value.to_bytes(HISTOGRAM_VALUE_SIZE, byteorder=TREE_BYTEORDER, signed=True)
+
+        with open(filename, 'wb') as file:
+            file.write(content)
+
+    def __merge_buckets(self, dim: int, extend_left: bool):
+        counts = self.counts[dim]
+        merged = [counts[i] + counts[i + 1] for i in range(0, self.buckets, 2)]
+        empty = [0] * (self.buckets // 2)
+
+        if extend_left:
+            self.lows[dim] -= self.widths[dim] * self.buckets
+            self.counts[dim] = empty + merged
+        else:
+            self.counts[dim] = merged + empty
+        self.widths[dim] *= 2
+
+    def __get_bucket(self, dim: int, value: int) -> int:
+        if self.widths[dim] == 0:
+            self.lows[dim] = value
+            self.widths[dim] = 1
+
+        while value < self.lows[dim]:
+            self.__merge_buckets(dim, extend_left=True)
+        while value >= self.lows[dim] + self.widths[dim] * self.buckets:
+            self.__merge_buckets(dim, extend_left=False)
+
+        return (value - self.lows[dim]) // self.widths[dim]
+
+    def add(self, coordinates: List[int]):
+        for dim, value in enumerate(coordinates):
+            # buckets can be merged into a new list, so the bucket is found first
+            bucket = self.__get_bucket(dim, value)
+            self.counts[dim][bucket] += 1
+        self.total += 1
+
+    def remove(self, coordinates: List[int]):
+        if self.total == 0:
+            return
+
+        for dim, value in enumerate(coordinates):
+            if self.widths[dim] == 0 or not self.lows[dim] <= value < self.lows[dim] + self.widths[dim] * self.buckets:
+                continue
+            bucket = (value - self.lows[dim]) // self.widths[dim]
+            self.counts[dim][bucket] = max(0, self.counts[dim][bucket] - 1)
+        self.total -= 1
+        self.deleted += 1
+
+    def estimate_fraction(self, dim: int, low: int, high: int) -> float:
+        """Estimates fraction of entries with value of the dimension in [low, high], values in bucket are uniform"""
+        dim_total = sum(self.counts[dim])
+        if dim_total == 0 or high < low:
+            return 0.0
+
+        width = self.widths[dim]
+        inside = 0.0
+        for bucket, count in enumerate(self.counts[dim]):
+            if count == 0:
+                continue
+            bucket_low = self.lows[dim] + bucket * width
+            overlap = min(high, bucket_low + width - 1) - max(low, bucket_low) + 1
+            if overlap > 0:
+                inside += count * overlap / width
+        return inside / dim_total
+
+    def estimate_count(self, coordinates_min: List[int], coordinates_max: List[int]) -> float:
+        """Estimates number of entries inside the area, dimensions are considered independent"""
+        estimate = float(self.total)
+        for dim in range(self.dimensions):
+            low, high = sorted((coordinates_min[dim], coordinates_max[dim]))
+            estimate *= self.estimate_fraction(dim, low, high)
+        return estimate
@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+from typing import List, Iterator, Optional, TextIO, Union, Dict, Any
+
+from rtree.data.database_entry import DatabaseEntry
+from rtree.default_config import *
+
+
+class JsonRecordReader:
+    """Reads a JSON document record by record, only a small part of the file is kept in memory.
+
+    Expected format:
+    {"dimensions": N, "labels": [...], "data": [{"name": ..., "values": [...]}, ...]}
+    Records of the "data" array are yielded one at a time, other top level values are stored in header."""
+
+    def __init__(self, file: TextIO, buffer_size: int = IMPORT_READ_BUFFER_SIZE):
+        self.file = file
+        self.buffer_size = buffer_size
+        self.decoder = json.JSONDecoder()
+        self.header: Dict[str, Any] = {}
+
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def __fill(self) -> bool:
+        """Reads next part of the file, already parsed part of the buffer is dropped. Returns False at the end"""
+        if self.eof:
+            return False
+
+        chunk = self.file.read(self.buffer_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def __peek(self) -> str:
+        """Returns next non whitespace character without consuming it"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.__fill():
+                raise ValueError("Unexpected end of JSON file")
+
+    def __expect(self, char: str):
+        if self.__peek() != char:
+            raise ValueError(f"Invalid JSON file, expected '{char}' at '{self.buffer[self.position:][:20]}'")
+        self.position += 1
+
+    def __decode_value(self) -> Any:
+        """Decodes one complete JSON value, the buffer is extended until the value fits in"""
+        self.__peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # number at the end of buffer may continue in the next part of the file
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.__fill()
+
+    def read(self) -> Iterator[Dict[str, Any]]:
+        self.__expect("{")
+        if self.__peek() == "}":
+            return
+
+        while True:
+            key = self.__decode_value()
+            self.__expect(":")
+
+            if key == "data":
+                self.__expect("[")
+                if self.__peek() != "]":
+                    while True:
+                        yield self.__decode_value()
+                        if self.__peek() != ",":
+                            break
+                        self.__expect(",")
+                self.__expect("]")
+            else:
+                self.header[key] = self.__decode_value()
+
+            if self.__peek() != ",":
+                break
+            self.__expect(",")
+
+        self.__expect("}")
+
+
+class Importer:
+    """Converts records of JSON or CSV files to database entries, the files are read as a stream.
+
+    Record values are multiplied by scale and rounded, as the tree indexes integer coordinates."""
+
+    @staticmethod
+    def get_file_format(filename: str) -> str:
+        extension = os.path.splitext(filename)[1].lower().lstrip(".")
+        if extension not in (IMPORT_JSON, IMPORT_CSV):
+            raise ValueError(f"Unknown import file format: {filename}")
+        return extension
+
+    @staticmethod
+    def to_coordinate(value: Union[int, float, str], scale: Union[int, float] = 1) -> int:
+        if scale == 1:
+            if isinstance(value, int):
+                return value
+            if isinstance(value, str) and value.strip().lstrip("+-").isdigit():
+                return int(value)
+        return round(float(value) * scale)
+
+    def __init__(self, dimensions: int, scale: Union[int, float] = 1,
+                 buffer_size: int = IMPORT_READ_BUFFER_SIZE):
+        self.dimensions = dimensions
+        self.scale = scale
+        self.buffer_size = buffer_size
+        self.imported_count = 0
+
+    def __create_entry(self, values: List[Any], data: object) -> DatabaseEntry:
+        if len(values) != self.dimensions:
+            raise ValueError(f"Record {self.imported_count} has {len(values)} values, "
+                             f"but {self.dimensions} dimensions are expected")
+        self.imported_count += 1
+        return DatabaseEntry(coordinates=[self.to_coordinate(value, self.scale) for value in values], data=data)
+
+    def read_json(self, file: TextIO) -> Iterator[DatabaseEntry]:
+        """Whole record (including the original values) is stored as entry data"""
+        reader = JsonRecordReader(file, self.buffer_size)
+        for record in reader.read():
+            dimensions = reader.header.get("dimensions", self.dimensions)
+            if dimensions != self.dimensions:
+                raise ValueError(f"File has {dimensions} dimensions, but {self.dimensions} are expected")
+            yield self.__create_entry(record["values"], record)
+
+    def read_csv(self, file: TextIO, coordinate_columns: Optional[List[str]] = None) -> Iterator[DatabaseEntry]:
+        """First row contains column names. Coordinates are read from coordinate_columns (first columns by default),
+        the whole row is stored as entry data"""
+        reader = csv.DictReader(file)
+        if reader.fieldnames is None:
+            return
+
+        if coordinate_columns is None:
+            coordinate_columns = list(reader.fieldnames[:self.dimensions])
+        for row in reader:
+            yield self.__create_entry([row[column] for column in coordinate_columns], row)
+
+    def read_file(self, filename: str, file_format: Optional[str] = None) -> Iterator[DatabaseEntry]:
+        if file_format is None:
+            file_format = self.get_file_format(filename)
+
+        with open(filename, 'r', newline='', encoding='utf-8', buffering=self.buffer_size) as file:
+            if file_format == IMPORT_JSON:
+                yield from self.read_json(file)
+            elif file_format == IMPORT_CSV:
+                yield from self.read_csv(file)
+            else:
+                raise ValueError(f"Unknown import file format: {file_format}")
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import math
 from typing import Tuple, List
 
 from rtree.data.mbb_dim import MBBDim
@@ -55,6 +56,28 @@ class MBB:
                 return False
         return True
 
+    def contains_point(self, coordinates: List[int]) -> bool:
+        """Checks if the point is inside this MBB"""
+        for dim, coordinate in zip(self.box, coordinates):
+            if not dim.low <= coordinate <= dim.high:
+                return False
+        return True
+
+    def min_distance(self, coordinates: List[int]) -> float:
+        """Calculates the smallest possible distance between the point and any point inside this MBB (MINDIST)"""
+        diff_sum = 0
+        for dim, coordinate in zip(self.box, coordinates):
+            diff_sum += dim.distance_from(coordinate) ** 2
+        return math.sqrt(diff_sum)
+
+    def min_distance_from_mbb(self, other: MBB) -> float:
+        """Calculates the smallest possible distance between any two points of this and other MBB"""
+        diff_sum = 0
+        for dim, other_dim in zip(self.box, other.box):
+            gap = max(other_dim.low - dim.high, dim.low - other_dim.high, 0)
+            diff_sum += gap ** 2
+        return math.sqrt(diff_sum)
+
     def contains_inner(self, inner_mbb: MBB):
         """Checks if passed MBB is inside this MBB"""
         if len(self.box) != len(inner_mbb.box):
@@ -18,6 +18,14 @@ class MBBDim:
     def get_diff(self):
         return self.high - self.low
 
+    def distance_from(self, value: int) -> int:
+        """Distance of the value from this range, 0 if the value is inside"""
+        if value < self.low:
+            return self.low - value
+        if value > self.high:
+            return value - self.high
+        return 0
+
     def contains(self, inner: MBBDim):
         return inner.low >= self.low and inner.high <= self.high
 
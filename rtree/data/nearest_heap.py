@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import heapq
+from typing import List, Tuple, Union
+
+from rtree.data.rtree_node import RTreeNode
+
+# node read already, id of node not read yet, or (entry position, entry coordinates)
+NearestItem = Union[RTreeNode, int, Tuple[int, List[int]]]
+
+
+class NearestHeap:
+    """Heap of the best-first search of entries nearest to a point. Nodes and entries wait in it ordered by
+    their smallest possible distance from the point, items of equal distance keep the order they were pushed in."""
+
+    def __init__(self, coordinates: List[int], root_id: int):
+        self.coordinates = coordinates
+        # (distance, sequence number for stable order, item)
+        self.heap: List[Tuple[float, int, NearestItem]] = [(0.0, 0, root_id)]
+        self.pushed_count = 1
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push(self, distance: float, item: NearestItem):
+        heapq.heappush(self.heap, (distance, self.pushed_count, item))
+        self.pushed_count += 1
+
+    def pop(self) -> NearestItem:
+        return heapq.heappop(self.heap)[2]
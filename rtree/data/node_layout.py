@@ -0,0 +1,161 @@
+from typing import Optional
+
+from rtree.data.rtree_node import RTreeNode, MBBDim, MBB
+from rtree.default_config import *
+
+
+class NodeLayout:
+    """Describes how a single node is stored in the tree file. Converts nodes to pages of bytes and back.
+
+    Page of a node:
+    (leaf_flag), parent_id, entry_count, N * [min, max], K * child id, padding
+    entry_count is the number of database entries in the subtree of inner node, leaves count their children
+
+    With PAGE_FORMAT_LEAF_COORDINATES every child of a leaf is stored as (child id, N * coordinate),
+    so leaves hold fewer entries, but entries can be compared without reading the database.
+    With PAGE_FORMAT_CHILD_MBBS every child of an inner node is stored as (child id, N * [min, max]),
+    so children can be pruned without reading their pages.
+    """
+
+    def __init__(self, dimensions: int, node_size: int, id_size: int, parameters_size: int,
+                 node_flag_size: int = NODE_FLAG_SIZE, null_node_id: int = NULL_NODE_ID,
+                 page_format: int = DEFAULT_PAGE_FORMAT):
+        self.dimensions = dimensions
+        self.node_size = node_size
+        self.id_size = id_size
+        self.parameters_size = parameters_size
+        self.node_flag_size = node_flag_size
+        self.null_node_id = null_node_id
+        self.page_format = page_format
+
+        if self.page_format & ~(PAGE_FORMAT_LEAF_COORDINATES | PAGE_FORMAT_CHILD_MBBS):
+            raise ValueError(f"Unknown page format: {self.page_format}")
+        self.leaf_coordinates = bool(self.page_format & PAGE_FORMAT_LEAF_COORDINATES)
+        self.child_mbbs = bool(self.page_format & PAGE_FORMAT_CHILD_MBBS)
+
+        self.header_size = self.node_flag_size + 2 * self.id_size + (self.dimensions * self.parameters_size * 2)
+
+        self.child_size = self.id_size
+        if self.child_mbbs:
+            self.child_size += self.dimensions * self.parameters_size * 2
+        self.children_per_node = int((self.node_size - self.header_size) / self.child_size)
+        self.node_padding = self.node_size - (self.header_size + (self.children_per_node * self.child_size))
+
+        self.leaf_child_size = self.id_size
+        if self.leaf_coordinates:
+            self.leaf_child_size += self.dimensions * self.parameters_size
+        self.leaf_children_per_node = int((self.node_size - self.header_size) / self.leaf_child_size)
+
+        if min(self.children_per_node, self.leaf_children_per_node) < 2:
+            raise ValueError(f"Node size {self.node_size} is too small, node can hold only "
+                             f"{min(self.children_per_node, self.leaf_children_per_node)} children")
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def get_children_per_node(self, is_leaf: bool) -> int:
+        return self.leaf_children_per_node if is_leaf else self.children_per_node
+
+    def encode(self, node: RTreeNode) -> bytes:
+        """Creates page of bytes from the node"""
+        if len(node.mbb.box) != self.dimensions:
+            raise Exception(f"Incorrect MBB dimension count")
+        if node.parent_id is None:
+            raise Exception("Parent id cannot be None when saving to file.")
+        if len(node.child_nodes) > self.get_children_per_node(node.is_leaf):
+            raise ValueError(f"Node cannot have {len(node.child_nodes)} entries, "
+                             f"maximum allowed is: {self.get_children_per_node(node.is_leaf)}")
+
+        page = bytearray()
+        page += int(node.is_leaf).to_bytes(self.node_flag_size, byteorder=TREE_BYTEORDER, signed=False)
+        page += node.parent_id.to_bytes(self.id_size, byteorder=TREE_BYTEORDER, signed=True)
+        page += node.entry_count.to_bytes(self.id_size, byteorder=TREE_BYTEORDER, signed=True)
+
+        for one_dim in node.mbb.box:
+            page += one_dim.low.to_bytes(self.parameters_size, byteorder=TREE_BYTEORDER, signed=True)
+            page += one_dim.high.to_bytes(self.parameters_size, byteorder=TREE_BYTEORDER, signed=True)
+
+        # child nodes followed by null child nodes
+        null_child = int(self.null_node_id).to_bytes(self.id_size, byteorder=TREE_BYTEORDER, signed=True)
+        if node.is_leaf and self.leaf_coordinates:
+            if node.child_boxes is None:
+                raise Exception("Coordinates of leaf entries are required by the page format")
+            for child, box in zip(node.child_nodes, node.child_boxes):
+                page += child.to_bytes(self.id_size, byteorder=TREE_BYTEORDER, signed=True)
+                for one_dim in box:
+                    page += one_dim.low.to_bytes(self.parameters_size, byteorder=TREE_BYTEORDER, signed=True)
+            page += (null_child + bytes(self.leaf_child_size - self.id_size)) * \
+                (self.leaf_children_per_node - len(node.child_nodes))
+        elif not node.is_leaf and self.child_mbbs:
+            if node.child_boxes is None:
+                raise Exception("MBBs of child nodes are required by the page format")
+            for child, box in zip(node.child_nodes, node.child_boxes):
+                page += child.to_bytes(self.id_size, byteorder=TREE_BYTEORDER, signed=True)
+                for one_dim in box:
+                    page += one_dim.low.to_bytes(self.parameters_size, byteorder=TREE_BYTEORDER, signed=True)
+                    page += one_dim.high.to_bytes(self.parameters_size, byteorder=TREE_BYTEORDER, signed=True)
+            page += (null_child + bytes(self.child_size - self.id_size)) * \
+                (self.children_per_node - len(node.child_nodes))
+        else:
+            for child in node.child_nodes:
+                page += child.to_bytes(self.id_size, byteorder=TREE_BYTEORDER, signed=True)
+            page += null_child * (self.get_children_per_node(node.is_leaf) - len(node.child_nodes))
+
+        if len(page) > self.node_size:
+            raise Exception(f"Node with {len(node.child_nodes)} children does not fit into the page")
+        page += bytes(self.node_size - len(page))
+        return bytes(page)
+
+    def decode(self, node_id: Optional[int], page: bytes) -> RTreeNode:
+        """Creates node from page of bytes"""
+        position = 0
+
+        def read(size: int, signed: bool) -> int:
+            nonlocal position
+            value = int.from_bytes(page[position:position + size], byteorder=TREE_BYTEORDER, signed=signed)
+            position += size
+            return value
+
+        # read flag, that determines whether the node is a leaf
+        is_leaf = bool(read(self.node_flag_size, False))
+        parent_id = read(self.id_size, True)
+        entry_count = read(self.id_size, True)
+
+        # reads the range in each dimension
+        rectangle = []
+        for _ in range(self.dimensions):
+            low = read(self.parameters_size, True)
+            high = read(self.parameters_size, True)
+            rectangle.append(MBBDim(low, high))
+
+        # reads the ids of children nodes.
+        child_nodes = []
+        child_boxes = None
+        if is_leaf and self.leaf_coordinates:
+            # entries are stored with their coordinates
+            child_boxes = []
+            for _ in range(self.leaf_children_per_node):
+                child_id = read(self.id_size, True)
+                if child_id == self.null_node_id:
+                    break
+                child_nodes.append(child_id)
+                child_boxes.append(tuple(MBBDim(value, value) for value in
+                                         (read(self.parameters_size, True) for _ in range(self.dimensions))))
+        elif not is_leaf and self.child_mbbs:
+            # child nodes are stored with their MBBs
+            child_boxes = []
+            for _ in range(self.children_per_node):
+                child_id = read(self.id_size, True)
+                if child_id == self.null_node_id:
+                    break
+                child_nodes.append(child_id)
+                child_boxes.append(tuple(MBBDim(read(self.parameters_size, True), read(self.parameters_size, True))
+                                         for _ in range(self.dimensions)))
+        else:
+            for _ in range(self.get_children_per_node(is_leaf)):
+                child_id = read(self.id_size, True)
+                if child_id != self.null_node_id:
+                    child_nodes.append(child_id)
+
+        return RTreeNode(node_id=node_id, parent_id=parent_id, mbb=MBB(tuple(rectangle)), child_nodes=child_nodes,
+                         is_leaf=is_leaf, entry_count=entry_count, child_boxes=child_boxes)
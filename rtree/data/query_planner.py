@@ -0,0 +1,55 @@
+import math
+
+from rtree.data.histogram import Histogram
+from rtree.default_config import *
+
+
+class QueryPlan:
+    """Plan chosen for a query (PLAN_TREE or PLAN_SCAN) together with the estimates it was chosen by"""
+
+    def __init__(self, plan: str, estimated_count: float, tree_cost: float, scan_cost: float, forced: bool = False):
+        self.plan = plan
+        self.estimated_count = estimated_count
+        self.tree_cost = tree_cost
+        self.scan_cost = scan_cost
+        self.forced = forced
+
+    def __str__(self):
+        return f"QueryPlan(plan={self.plan}, estimated_count={self.estimated_count:.1f}, " \
+               f"tree_cost={self.tree_cost:.1f}, scan_cost={self.scan_cost:.1f}, forced={self.forced})"
+
+
+class QueryPlanner:
+    """Chooses between traversal of the tree and sequential scan of the database file.
+    Costs are counted in sequential reads of one record, reading a page or record at random position costs more."""
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def estimate_tree_cost(self, estimated_count: float, depth: int, leaf_capacity: int,
+                           leaf_coordinates: bool) -> float:
+        leaves = math.ceil(estimated_count / (leaf_capacity * PLANNER_NODE_FILL))
+        pages = depth + leaves
+
+        # matching entries are read from the database, other entries of visited leaves only for coordinates
+        records = estimated_count
+        if not leaf_coordinates:
+            records += leaves * leaf_capacity * PLANNER_NODE_FILL
+        return PLANNER_RANDOM_READ_COST * (pages + records)
+
+    def estimate_scan_cost(self) -> float:
+        # every record is read and unpickled, records of deleted entries too
+        return float(self.histogram.total + self.histogram.deleted)
+
+    def choose(self, estimated_count: float, depth: int, leaf_capacity: int, leaf_coordinates: bool,
+               plan: str = PLAN_AUTO) -> QueryPlan:
+        if plan not in (PLAN_AUTO, PLAN_TREE, PLAN_SCAN):
+            raise ValueError(f"Unknown query plan: {plan}")
+
+        tree_cost = self.estimate_tree_cost(estimated_count, depth, leaf_capacity, leaf_coordinates)
+        scan_cost = self.estimate_scan_cost()
+        if plan != PLAN_AUTO:
+            return QueryPlan(plan, estimated_count, tree_cost, scan_cost, forced=True)
+
+        chosen_plan = PLAN_SCAN if scan_cost < tree_cost else PLAN_TREE
+        return QueryPlan(chosen_plan, estimated_count, tree_cost, scan_cost)
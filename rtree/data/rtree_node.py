@@ -8,22 +8,24 @@ from rtree.default_config import MINIMUM_NODE_FILL
 
 
 class RTreeNode:
-    """Class represents a single node in the R-tree structure"""
-    max_entries_count = 0
+    """Class represents a single node in the R-tree structure.
+    Capacity of the node depends on the layout of the tree file, it is passed to is_full and has_over_balance."""
 
     @staticmethod
     def create_empty_node(dimensions: int, is_leaf: bool, parent_id: int = None) -> RTreeNode:
         return RTreeNode(parent_id=parent_id, mbb=MBB(tuple(MBBDim(0, 0) for dim in range(dimensions))),
-                         is_leaf=is_leaf)
+                         is_leaf=is_leaf, child_boxes=[])
 
     def __init__(self, mbb: MBB, node_id: Optional[int] = None, parent_id: Optional[int] = None,
-                 child_nodes: List[int] = None, is_leaf: bool = False):
+                 child_nodes: List[int] = None, is_leaf: bool = False, entry_count: int = 0,
+                 child_boxes: Optional[List[Tuple[MBBDim, ...]]] = None):
         if child_nodes is None:
             child_nodes = []
+        if child_boxes is None and len(child_nodes) == 0:
+            child_boxes = []
 
-        if len(child_nodes) > self.max_entries_count:
-            raise ValueError(
-                f"Node cannot have {len(child_nodes)} entries, maximum allowed is: {self.max_entries_count}")
+        if child_boxes is not None and len(child_boxes) != len(child_nodes):
+            raise ValueError(f"Node has {len(child_nodes)} children, but {len(child_boxes)} child boxes")
 
         self.mbb = mbb
         self.id = node_id
@@ -31,17 +33,27 @@ class RTreeNode:
         self.is_leaf = is_leaf
         self.parent_id = parent_id
 
+        # boxes of children in the order of child_nodes (points of entries for leaves), None if they are not known
+        self.child_boxes = child_boxes
+
+        # number of entries in the subtree of inner node
+        self.entry_count = entry_count
+
     def __str__(self):
         return str(self.__dict__)
 
     def child_count(self) -> int:
         return len(self.child_nodes)
 
-    def is_full(self) -> bool:
-        return self.child_count() >= self.max_entries_count
+    def get_entry_count(self) -> int:
+        """Number of database entries in the subtree of this node"""
+        return len(self.child_nodes) if self.is_leaf else self.entry_count
 
-    def has_over_balance(self) -> bool:
-        return self.child_count() >= ((1 - MINIMUM_NODE_FILL) * self.max_entries_count)
+    def is_full(self, max_entries_count: int) -> bool:
+        return self.child_count() >= max_entries_count
+
+    def has_over_balance(self, max_entries_count: int) -> bool:
+        return self.child_count() >= ((1 - MINIMUM_NODE_FILL) * max_entries_count)
 
     def contains_inner(self, inner: RTreeNode):
         return self.mbb.contains_inner(inner.mbb)
@@ -55,6 +67,7 @@ class RTreeNode:
 
         if len(self.child_nodes) == 0:
             self.child_nodes.append(new_node_id)
+            self.child_boxes = [new_box]
             self.mbb = MBB(new_box)
             return True
 
@@ -63,9 +76,12 @@ class RTreeNode:
 
         if new_node_id in self.child_nodes:
             # raise ValueError(f"Entry with ID={new_node_id} is already in node entries")
-            pass
+            if self.child_boxes is not None:
+                self.child_boxes[self.child_nodes.index(new_node_id)] = new_box
         else:
             self.child_nodes.append(new_node_id)
+            if self.child_boxes is not None:
+                self.child_boxes.append(new_box)
 
         # if len(self.child_nodes) + 1 > self.max_entries_count:
         #     return False
@@ -73,6 +89,13 @@ class RTreeNode:
 
         return True
 
+    def remove_child(self, child_id: int):
+        """Removes child node (or entry of leaf) together with its box"""
+        index = self.child_nodes.index(child_id)
+        del self.child_nodes[index]
+        if self.child_boxes is not None:
+            del self.child_boxes[index]
+
     # def insert_node_from_node(self, new_node_id: int, new_node: RTreeNode) -> bool:
     #     return self.insert_box(new_node_id, new_node.mbb.box)
 
@@ -1,7 +1,10 @@
 import os
-from typing import Optional
+import threading
+from typing import Optional, Dict, List, Iterable
 
-from rtree.data.rtree_node import RTreeNode, MBBDim, MBB
+from rtree.data.cache import Cache
+from rtree.data.node_layout import NodeLayout
+from rtree.data.rtree_node import RTreeNode
 from rtree.default_config import *
 
 
@@ -15,7 +18,11 @@ class TreeFileHandler:
                  tree_depth: int = 0,
                  root_id: int = 0,
                  unique_sequence: bytes = DEMO_UNIQUE_SEQUENCE,
-                 config_hash: bytes = DEMO_CONFIG_HASH):
+                 config_hash: bytes = DEMO_CONFIG_HASH,
+                 page_format: int = DEFAULT_PAGE_FORMAT,
+                 read_only: bool = False,
+                 cache: Optional[Cache] = None,
+                 write_buffer_size: int = TREE_WRITE_BUFFER_SIZE):
         # init default values, will be changed when loading from existing file
         self.filename = filename
         self.dimensions = dimensions
@@ -30,6 +37,18 @@ class TreeFileHandler:
         self.root_id = root_id
         self.unique_sequence = unique_sequence
         self.config_hash = config_hash
+        self.page_format = page_format
+        self.read_only = read_only
+
+        # cache of decoded nodes, nodes are invalidated when their pages are written
+        self.cache = cache
+
+        # written pages are kept until commit, repeated writes of one page are merged
+        self.dirty_pages: Dict[int, bytes] = {}
+        self.write_buffer_size = write_buffer_size
+
+        # pages are read by positional reads where possible, so that they can be read from more threads at once
+        self.read_lock = threading.Lock()
 
         if len(self.unique_sequence) != UNIQUE_SEQUENCE_LENGTH:
             raise ValueError(f"Invalid unique sequence length: {len(self.unique_sequence)}")
@@ -39,12 +58,14 @@ class TreeFileHandler:
         # create file if not exists
         save_header_to_file = False
         if not os.path.isfile(self.filename):
+            if self.read_only:
+                raise IOError(f"File cannot be opened as read-only, it does not exist: {self.filename}")
             save_header_to_file = True
             with open(self.filename, 'w+b'):
                 pass
 
         try:
-            self.file = open(self.filename, 'r+b')
+            self.file = open(self.filename, 'rb' if self.read_only else 'r+b')
         except IOError:
             raise IOError(f"File cannot be opened: {self.filename}")
 
@@ -58,17 +79,15 @@ class TreeFileHandler:
         self.__update_file_size()
 
         # calculate remaining attributes
-        self.children_per_node = int(
-            (self.node_size - self.node_flag_size - self.id_size - (
-                    self.dimensions * self.parameters_size * 2)) / self.id_size)
-        self.node_padding = self.node_size - (
-                self.node_flag_size + self.id_size + (self.dimensions * self.parameters_size * 2)
-                + (self.children_per_node * self.id_size))
+        self.layout = NodeLayout(dimensions=self.dimensions, node_size=self.node_size, id_size=self.id_size,
+                                 parameters_size=self.parameters_size, node_flag_size=self.node_flag_size,
+                                 null_node_id=self.null_node_id, page_format=self.page_format)
+        self.children_per_node = self.layout.children_per_node
+        self.leaf_children_per_node = self.layout.leaf_children_per_node
+        self.node_padding = self.layout.node_padding
+        self.max_dirty_pages = max(1, self.write_buffer_size // self.node_size)
 
-        # sets the maximum number of entries in the Node class
-        RTreeNode.max_entries_count = self.children_per_node
-
-        total = self.node_flag_size + self.id_size + self.dimensions * 2 * self.parameters_size + self.children_per_node * self.id_size + self.node_padding
+        total = self.layout.header_size + self.children_per_node * self.layout.child_size + self.node_padding
 
         if total != self.node_size:
             raise Exception(f"total({total}) != self.node_size({self.node_size})")
@@ -87,14 +106,18 @@ class TreeFileHandler:
         self.nodes_written_count = 0
 
     def __del__(self):
-        if not self.file.closed:
-            self.file.flush()
-            self.write_header()
-            self.file.close()
+        self.close()
 
         if DELETE_TREE_INDEX_FILE:
             os.remove(self.filename)
 
+    def close(self):
+        """Writes dirty pages and the header and closes the file"""
+        if not self.file.closed:
+            if not self.read_only:
+                self.write_header()
+            self.file.close()
+
     def __str__(self):
         return str(self.__dict__)
 
@@ -114,6 +137,16 @@ class TreeFileHandler:
             header_size += size
             self.__dict__[attribute] = self.file.read(size)
 
+        # files of another format are not read, their header would be overwritten when the file is closed
+        header_size += len(TREE_FILE_MAGIC) + 2
+        magic = self.file.read(len(TREE_FILE_MAGIC))
+        version = int.from_bytes(self.file.read(2), byteorder=TREE_BYTEORDER, signed=False)
+        if magic != TREE_FILE_MAGIC or version != TREE_FILE_FORMAT_VERSION:
+            self.file.close()
+            found_version = f"version {version}" if magic == TREE_FILE_MAGIC else "without version"
+            raise IOError(f"Unsupported format of tree file {self.filename} ({found_version}, expected version "
+                          f"{TREE_FILE_FORMAT_VERSION}), rebuild the tree")
+
         # read and set size of ids
         header_size += 1
         self.id_size = int.from_bytes(self.file.read(1), byteorder=TREE_BYTEORDER, signed=True)
@@ -128,6 +161,7 @@ class TreeFileHandler:
             ('root_id', self.id_size, True),
             ('parameters_size', 1, False),
             ('tree_depth', 4, False),
+            ('page_format', 1, False),
         )
 
         for attribute, size, signed in header_attributes_int_sizes:
@@ -138,12 +172,17 @@ class TreeFileHandler:
         return header_size
 
     def write_header(self) -> int:
+        self.__check_writable()
+        # highest id in header has to match the file size
+        self.commit()
         self.file.seek(0, 0)
         header_attributes_bytes_sizes = (
             (self.unique_sequence, UNIQUE_SEQUENCE_LENGTH),
-            (self.config_hash, CONFIG_HASH_LENGTH)
+            (self.config_hash, CONFIG_HASH_LENGTH),
+            (TREE_FILE_MAGIC, len(TREE_FILE_MAGIC))
         )
         header_attributes_int_sizes = (
+            (TREE_FILE_FORMAT_VERSION, 2, False),
             (self.id_size, 1, True),
             (self.dimensions, 4, False),
             (self.node_size, 4, False),
@@ -152,6 +191,7 @@ class TreeFileHandler:
             (self.root_id, self.id_size, True),
             (self.parameters_size, 1, False),
             (self.tree_depth, 4, False),
+            (self.page_format, 1, False),
         )
 
         header_size = 0
@@ -168,6 +208,10 @@ class TreeFileHandler:
             raise Exception(f"Headers size != position after writing header")
         return header_size
 
+    def __check_writable(self):
+        if self.read_only:
+            raise IOError(f"Tree file is opened as read-only: {self.filename}")
+
     def __get_node_address(self, node_id: int) -> int:
         # self.current_position = self.offset_size + (node_id * self.node_size)
         # return self.current_position
@@ -178,94 +222,93 @@ class TreeFileHandler:
     #     self.current_position = self.current_position + self.node_size
     #     return old_position
 
-    def __get_node_object(self, node_id: Optional[int]) -> RTreeNode:
-
-        # read flag, that determines whether the node is a leaf
-        is_leaf = bool(bool.from_bytes(self.file.read(self.node_flag_size), byteorder=TREE_BYTEORDER, signed=False))
-        # is_leaf = int.from_bytes(self.file.read(NODE_FLAG_SIZE), byteorder=TREE_BYTEORDER, signed=False) == 1
-
-        parent_id = int.from_bytes(self.file.read(self.id_size), byteorder=TREE_BYTEORDER, signed=True)
-
-        # reads the range in each dimension
-        rectangle = []
-        for _ in range(self.dimensions):
-            low = int.from_bytes(self.file.read(self.parameters_size), byteorder=TREE_BYTEORDER, signed=True)
-            high = int.from_bytes(self.file.read(self.parameters_size), byteorder=TREE_BYTEORDER, signed=True)
-            rectangle.append(MBBDim(low, high))
-
-        # reads the ids of children nodes.
-        child_nodes = []
-        for _ in range(self.children_per_node):
-            child_id = int.from_bytes(self.file.read(self.id_size), byteorder=TREE_BYTEORDER, signed=True)
-            if child_id != self.null_node_id:
-                child_nodes.append(child_id)
-            # else:
-            #     break
-
-        return RTreeNode(node_id=node_id, parent_id=parent_id, mbb=MBB(tuple(rectangle)), child_nodes=child_nodes,
-                         is_leaf=is_leaf)
-
     def get_node(self, node_id: int) -> Optional[RTreeNode]:
         if node_id > self.highest_id:
             return None
-        address = self.__get_node_address(node_id)
-
-        self.file.seek(address, 0)
         self.nodes_read_count += 1
 
-        self.file.flush()
-        return self.__get_node_object(node_id)
-
-    def insert_node(self, node: RTreeNode):
-        """Writes node on the current position of the file head."""
-        if len(node.mbb.box) != self.dimensions:
-            raise Exception(f"Incorrect MBB dimension count")
-
-        flag = int(node.is_leaf)
-        self.file.write(flag.to_bytes(self.node_flag_size, byteorder=TREE_BYTEORDER, signed=False))
-
-        if node.parent_id is None:
-            raise Exception("Parent id cannot be None when saving to file.")
-
-        self.file.write(node.parent_id.to_bytes(self.id_size, byteorder=TREE_BYTEORDER, signed=True))
-
-        for one_dim in node.mbb.box:
-            # for record in one_dimension:
-            #     self.file.write(record.to_bytes(self.parameter_size, byteorder=TREE_BYTEORDER, signed=True))
-            self.file.write(one_dim.low.to_bytes(self.parameters_size, byteorder=TREE_BYTEORDER, signed=True))
-            self.file.write(one_dim.high.to_bytes(self.parameters_size, byteorder=TREE_BYTEORDER, signed=True))
-
-        # write child nodes
-        for child in node.child_nodes:
-            self.file.write(child.to_bytes(self.id_size, byteorder=TREE_BYTEORDER, signed=True))
-
-        # write null child nodes
-        for child in range(self.children_per_node - len(node.child_nodes)):
-            self.file.write(int(self.null_node_id).to_bytes(self.id_size, byteorder=TREE_BYTEORDER, signed=True))
-
-        # writes padding
-        self.file.write(int(0).to_bytes(self.node_padding, byteorder=TREE_BYTEORDER, signed=False))
-
-        self.file.flush()
+        page = self.dirty_pages.get(node_id)
+        if page is None:
+            page = self.__read_page(self.__get_node_address(node_id))
+        return self.layout.decode(node_id, page)
+
+    def get_nodes(self, node_ids: Iterable[int]) -> List[RTreeNode]:
+        """Reads nodes in the order of their ids, pages with consecutive ids are read at once.
+        Nodes are returned ordered by id, missing nodes are skipped"""
+        node_ids = sorted(node_id for node_id in set(node_ids) if 0 <= node_id <= self.highest_id)
+        nodes: List[RTreeNode] = []
+        run_start = 0
+        for index, node_id in enumerate(node_ids):
+            if index + 1 < len(node_ids) and node_ids[index + 1] == node_id + 1:
+                continue
+
+            run = node_ids[run_start:index + 1]
+            pages = self.__read_page(self.__get_node_address(run[0]), len(run) * self.node_size)
+            for run_index, run_node_id in enumerate(run):
+                page = self.dirty_pages.get(run_node_id)
+                if page is None:
+                    page = pages[run_index * self.node_size:(run_index + 1) * self.node_size]
+                nodes.append(self.layout.decode(run_node_id, page))
+            run_start = index + 1
+
+        self.nodes_read_count += len(nodes)
+        return nodes
+
+    def __read_page(self, address: int, size: Optional[int] = None) -> bytes:
+        size = self.node_size if size is None else size
+        if hasattr(os, "pread"):
+            return os.pread(self.file.fileno(), size, address)
+
+        with self.read_lock:
+            self.file.seek(address, 0)
+            return self.file.read(size)
+
+    def __write_page(self, node_id: int, page: bytes):
+        """Stores page in the buffer of dirty pages, buffer is committed when it is full."""
+        self.__check_writable()
+        if len(page) != self.node_size:
+            raise Exception(f"Page has size {len(page)}, but node size is {self.node_size}")
+
+        # node is invalidated after its new page can be read, so that a preload running meanwhile skips it
+        self.dirty_pages[node_id] = page
+        if self.cache is not None:
+            self.cache.invalidate(node_id)
+
+        if len(self.dirty_pages) > self.max_dirty_pages:
+            self.commit()
+
+    def commit(self):
+        """Writes dirty pages in the order of their ids, pages with consecutive ids are written at once."""
+        if not self.dirty_pages:
+            return
+
+        node_ids = sorted(self.dirty_pages)
+        run: List[bytes] = []
+        with self.read_lock:
+            for index, node_id in enumerate(node_ids):
+                if not run:
+                    self.file.seek(self.__get_node_address(node_id), 0)
+                run.append(self.dirty_pages[node_id])
+                if index + 1 == len(node_ids) or node_ids[index + 1] != node_id + 1:
+                    self.file.write(b''.join(run))
+                    run = []
 
+            self.file.flush()
         self.__update_file_size()
         self.current_position = self.file.tell()
 
-        self.nodes_written_count += 1
+        self.nodes_written_count += len(node_ids)
+        self.dirty_pages = {}
 
     def create_node(self, node: RTreeNode) -> int:
-        """Writes node on the current position of the file head."""
-        # moves the file handle to the end of file
-        self.highest_id += 1
-
-        address = self.__get_node_address(self.highest_id)
-        self.file.seek(address, 0)
+        """Writes node as a new node at the end of file."""
+        return self.create_encoded_node(self.layout.encode(node))
 
-        self.insert_node(node)
-        node_id = self.highest_id
-
-        self.file.flush()
-        return node_id
+    def create_encoded_node(self, page: bytes) -> int:
+        """Writes page created by NodeLayout as a new node at the end of file."""
+        self.__write_page(self.highest_id + 1, page)
+        self.highest_id += 1
+        return self.highest_id
 
     def update_depth(self, depth: int):
         self.tree_depth = depth
@@ -275,13 +318,8 @@ class TreeFileHandler:
         # write_header()
 
     def update_node(self, node_id: int, node: RTreeNode):
-        address = self.__get_node_address(node_id)
-        self.file.seek(address, 0)
-        if address != self.file.tell():
+        if node_id > self.highest_id:
             raise Exception(f"Cannot move to such node")
 
-        self.nodes_written_count += 1
-        self.insert_node(node)
-        self.file.flush()
-
+        self.__write_page(node_id, self.layout.encode(node))
         return node_id
@@ -17,9 +17,65 @@ NULL_NODE_ID: Final[int] = -1
 DELETE_TREE_INDEX_FILE = False
 UNIQUE_SEQUENCE_LENGTH: Final[int] = 20
 CONFIG_HASH_LENGTH: Final[int] = 20  # length of hash from SHA1 function
+TREE_FILE_MAGIC: Final[bytes] = b"RTRF"  # follows the config hash, files written before it have no version
+TREE_FILE_FORMAT_VERSION: Final[int] = 1  # increased with every change of the tree file header or pages
 MINIMUM_NODE_FILL: Final[float] = 0.35
 
+# page formats of the tree file, flags can be combined
+PAGE_FORMAT_BASIC: Final[int] = 0  # leaves store only positions of entries in database
+PAGE_FORMAT_LEAF_COORDINATES: Final[int] = 1  # leaves store coordinates of entries next to their positions
+PAGE_FORMAT_CHILD_MBBS: Final[int] = 2  # inner nodes store MBBs of children next to their ids
+DEFAULT_PAGE_FORMAT: Final[int] = PAGE_FORMAT_BASIC
+
+DATABASE_WRITE_BUFFER_SIZE: Final[int] = 4 * 1024 * 1024  # 4MB of entries written at once by bulk inserts
+IMPORT_READ_BUFFER_SIZE: Final[int] = 1024 * 1024  # 1MB of imported file read at once
+IMPORT_JSON: Final[str] = "json"
+IMPORT_CSV: Final[str] = "csv"
+
+QUERY_SEARCH_AREA: Final[str] = "search_area"  # types of queries run by QueryExecutor
+QUERY_SEARCH_KNN: Final[str] = "search_knn"
+QUERY_SEARCH_ENTRY: Final[str] = "search_entry"
+
+PLAN_AUTO: Final[str] = "auto"  # query plans, auto chooses by estimated costs
+PLAN_TREE: Final[str] = "tree"  # traversal of the tree
+PLAN_SCAN: Final[str] = "scan"  # sequential scan of the database file
+DEFAULT_QUERY_PLAN: Final[str] = PLAN_TREE  # PLAN_AUTO is opt-in, scan does not use node cache nor lazy results
+PLANNER_RANDOM_READ_COST: Final[float] = 4.0  # read at random position, relative to sequential read of one record
+PLANNER_NODE_FILL: Final[float] = 0.7  # expected fill of nodes
+HISTOGRAM_BUCKETS: Final[int] = 64  # buckets per dimension of histogram used for estimates of query results
+HISTOGRAM_VALUE_SIZE: Final[int] = 8
+HISTOGRAM_FILE_SUFFIX: Final[str] = ".hist"  # histogram is saved next to the tree file
+
+HASH_INDEX_FILE_SUFFIX: Final[str] = ".hidx"  # hash index of entry coordinates is saved next to the tree file
+HASH_INDEX_PAGE_SIZE: Final[int] = 4096
+HASH_INDEX_POSITION_SIZE: Final[int] = 8  # size of database positions and page ids in hash index
+HASH_INDEX_MIN_BUCKETS: Final[int] = 16
+HASH_INDEX_MAX_LOAD: Final[float] = 0.75  # number of buckets doubles when they are filled more
+
+ASYNC_IO_THREADS: Final[int] = 8  # threads for file reads and writes of AsyncRTree
+
+TREE_WRITE_BUFFER_SIZE: Final[int] = 1024 * 1024  # 1MB of dirty pages of the tree file kept until commit
 CACHE_MEMORY_SIZE: Final[int] = 8 * 1024 * 1024  # 8MB for allocated cache
+CACHE_POLICY_LRU: Final[str] = "lru"  # replacement policies of the node cache, least recently used node is evicted
+CACHE_POLICY_2Q: Final[str] = "2q"  # nodes read once are evicted first, so that scans do not push out hot nodes
+DEFAULT_CACHE_POLICY: Final[str] = CACHE_POLICY_LRU
+CACHE_2Q_IN_FRACTION: Final[float] = 0.25  # part of 2Q cache for nodes read once
+CACHE_2Q_OUT_FRACTION: Final[float] = 0.5  # ids of nodes evicted after one read, relative to 2Q cache size
+CACHE_PINNED_LEVELS: Final[int] = 2  # top levels of the tree never evicted from the cache (root and its children)
+CACHE_FILE_SUFFIX: Final[str] = ".cache"  # ids of cached nodes are saved next to the tree file, to preload them
+CACHE_PRELOAD_NONE: Final[str] = "none"  # saved cached nodes are not loaded when the tree is opened
+CACHE_PRELOAD_SYNC: Final[str] = "sync"  # loaded before the tree is returned
+CACHE_PRELOAD_BACKGROUND: Final[str] = "background"  # loaded by a thread while the tree is used
+DEFAULT_CACHE_PRELOAD: Final[str] = CACHE_PRELOAD_NONE
+CACHE_PRELOAD_CHUNK: Final[int] = 256  # nodes read at once by the preload
+ENTRY_CACHE_MEMORY_SIZE: Final[int] = 4 * 1024 * 1024  # 4MB of database records kept decoded
+
+BULK_LOAD_STR: Final[str] = "str"  # Sort-Tile-Recursive
+BULK_LOAD_HILBERT: Final[str] = "hilbert"  # sorted by position on Hilbert curve
+DEFAULT_BULK_LOAD_METHOD: Final[str] = BULK_LOAD_STR
+HILBERT_CURVE_ORDER: Final[int] = 16  # bits per dimension used for Hilbert values
+BULK_LOAD_MEMORY_SIZE: Final[int] = 256 * 1024 * 1024  # 256MB for sorting entries, larger inputs are sorted on disk
+PARALLEL_BULK_LOAD_MIN_ENTRIES: Final[int] = 100000  # smaller bulk loads are not worth starting a process pool
 
 # Testing
 TESTING_DIRECTORY: Final[str] = "tests/testing_data/"
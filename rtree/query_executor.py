@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple, Any
+
+from psutil import cpu_count
+
+from rtree.data.database_entry import DatabaseEntry
+from rtree.default_config import *
+from rtree.rtree import RTree
+
+FileVersion = Tuple[int, ...]
+
+
+def get_files_version(tree_filename: str, database_filename: str) -> FileVersion:
+    """Identifies the state of tree files, changes with every write or when a file is replaced"""
+    version: FileVersion = ()
+    for filename in (tree_filename, database_filename):
+        file_stat = os.stat(filename)
+        version += (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+    return version
+
+
+class WorkerState:
+    """Read-only tree opened by a worker process, it is reopened when the files change"""
+    tree: Optional[RTree] = None
+    files_version: Optional[FileVersion] = None
+
+    @classmethod
+    def get_tree(cls, tree_filename: str, database_filename: str, files_version: FileVersion) -> RTree:
+        if cls.tree is None or cls.files_version != files_version:
+            if cls.tree is not None:
+                cls.tree.close()
+            cls.tree = RTree(working_directory="", tree_file=tree_filename, database_file=database_filename,
+                             read_only=True)
+            cls.files_version = files_version
+        return cls.tree
+
+
+def run_queries_task(tree_filename: str, database_filename: str, files_version: FileVersion,
+                     query_type: str, queries: List[Any], k: int) -> List[Any]:
+    """Runs a chunk of queries of one type in a worker process. Returns results in the order of queries"""
+    tree = WorkerState.get_tree(tree_filename, database_filename, files_version)
+    if query_type == QUERY_SEARCH_AREA:
+        return tree.search_area_many(queries)
+    if query_type == QUERY_SEARCH_KNN:
+        return tree.search_knn_many(k, queries)
+    if query_type == QUERY_SEARCH_ENTRY:
+        return [tree.search_entry(coordinates) for coordinates in queries]
+    raise ValueError(f"Unknown query type: {query_type}")
+
+
+class QueryExecutor:
+    """Runs batches of queries in a pool of worker processes, so that they are not limited by the GIL.
+    Every worker opens its own read-only handles on the tree and database files of the tree."""
+
+    def __init__(self, tree: RTree, workers: Optional[int] = None, chunk_size: Optional[int] = None):
+        self.tree = tree
+        self.workers = workers if workers is not None else (cpu_count() or 1)
+        if self.workers < 1:
+            raise ValueError(f"Invalid number of workers: {self.workers}")
+
+        # number of queries sent to a worker at once, batch is split evenly between the workers by default
+        self.chunk_size = chunk_size
+        if self.chunk_size is not None and self.chunk_size < 1:
+            raise ValueError(f"Invalid chunk size: {self.chunk_size}")
+
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self) -> QueryExecutor:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Stops the worker processes. The tree stays open, its state and ids of cached nodes are saved"""
+        self.pool.shutdown()
+        if not self.tree.read_only and not self.tree.closed:
+            self.tree.flush()
+
+    def __run(self, query_type: str, queries: List[Any], k: int = 0) -> List[Any]:
+        if not queries:
+            return []
+
+        # workers open the files, so the current state of the tree has to be saved first
+        if not self.tree.read_only:
+            self.tree.flush()
+        files_version = get_files_version(self.tree.tree_filename, self.tree.database_filename)
+
+        chunk_size = self.chunk_size if self.chunk_size is not None else -(-len(queries) // self.workers)
+        tasks = [self.pool.submit(run_queries_task, self.tree.tree_filename, self.tree.database_filename,
+                                  files_version, query_type, queries[chunk_start:chunk_start + chunk_size], k)
+                 for chunk_start in range(0, len(queries), chunk_size)]
+
+        results: List[Any] = []
+        for task in tasks:
+            results.extend(task.result())
+        return results
+
+    def search_area_many(self, areas: List[Tuple[List[int], List[int]]]) -> List[List[DatabaseEntry]]:
+        """Runs area queries given by (coordinates_min, coordinates_max). Returns results per query"""
+        return self.__run(QUERY_SEARCH_AREA, list(areas))
+
+    def search_knn_many(self, k: int, points: List[List[int]]) -> List[List[DatabaseEntry]]:
+        """Finds k nearest entries for every point. Returns results per point"""
+        return self.__run(QUERY_SEARCH_KNN, list(points), k)
+
+    def search_entry_many(self, points: List[List[int]]) -> List[Optional[DatabaseEntry]]:
+        """Looks for entries at the points. Returns entry or None per point"""
+        return self.__run(QUERY_SEARCH_ENTRY, list(points))
@@ -1,10 +1,14 @@
+from __future__ import annotations
+
 import errno
 import secrets
 import sys
-from typing import List, Optional, Tuple
+import threading
+from typing import List, Optional, Tuple, Iterable, Iterator, Union, Callable, Dict, Set
 import os
 import math
 from hashlib import sha1
+from itertools import islice, chain
 from psutil import cpu_count
 from sys import maxsize
 
@@ -16,6 +20,14 @@ from rtree.data.database_entry import DatabaseEntry
 from rtree.data.rtree_node import RTreeNode
 from rtree.data.cache import Cache
 from rtree.data.tree_file_handler import TreeFileHandler
+from rtree.data.bulk_loader import BulkLoader, LeafItem
+from rtree.data.external_sorter import ExternalSorter
+from rtree.data.importer import Importer
+from rtree.data.entry_handle import EntryHandle, SearchResult
+from rtree.data.histogram import Histogram
+from rtree.data.hash_index import HashIndex, IndexRecord
+from rtree.data.nearest_heap import NearestHeap
+from rtree.data.query_planner import QueryPlanner, QueryPlan
 
 
 class RTree:
@@ -52,10 +64,11 @@ class RTree:
         return True
 
     @staticmethod
-    def check_files_load_existing_rtree(tree_file: str, database_file: str, override: bool) -> bool:
+    def check_files_load_existing_rtree(tree_file: str, database_file: str, override: bool,
+                                        create_directory: bool = True) -> bool:
         """Checks files if they can be used and if an existing tree is supposed to be loaded"""
         try:
-            if not os.path.isdir(WORKING_DIRECTORY):
+            if create_directory and not os.path.isdir(WORKING_DIRECTORY):
                 os.mkdir(WORKING_DIRECTORY)
         except OSError:
             raise OSError(f"Cannot open or create working directory: {WORKING_DIRECTORY}")
@@ -96,16 +109,51 @@ class RTree:
                  parameters_size: int = PARAMETER_RECORD_SIZE,
                  id_size: int = NODE_ID_SIZE,
                  node_size: int = DEFAULT_NODE_SIZE,
-                 max_threads: int = None):
+                 max_threads: int = None,
+                 bulk_load_memory: int = BULK_LOAD_MEMORY_SIZE,
+                 page_format: int = DEFAULT_PAGE_FORMAT,
+                 read_only: bool = False,
+                 hash_index: bool = False,
+                 cache_memory: int = CACHE_MEMORY_SIZE,
+                 cache_pinned_levels: int = CACHE_PINNED_LEVELS,
+                 cache_policy: str = DEFAULT_CACHE_POLICY,
+                 cache_preload: str = DEFAULT_CACHE_PRELOAD,
+                 entry_cache_memory: int = ENTRY_CACHE_MEMORY_SIZE):
+
+        # directory for saved files and temporary files of bulk loading
+        self.working_directory = working_directory
+
+        # read-only tree opens existing files without locking them for writing, e.g. in query worker processes
+        self.read_only = read_only
+        if self.read_only and override_file:
+            raise ValueError("Read-only tree cannot override its files")
 
         # path to binary file with saved tree / already opened file object
         self.tree_filename = working_directory + tree_file
         self.database_filename = working_directory + database_file
 
+        # histogram of entries used by the query planner, saved next to the tree file
+        self.histogram_filename = self.tree_filename + HISTOGRAM_FILE_SUFFIX
+        if override_file and not self.try_delete_file(self.histogram_filename):
+            raise OSError(f"Error: Couldn't delete file: {self.histogram_filename}")
+
+        # ids of cached nodes, saved next to the tree file when it is closed
+        self.cache_filename = self.tree_filename + CACHE_FILE_SUFFIX
+        if override_file and not self.try_delete_file(self.cache_filename):
+            raise OSError(f"Error: Couldn't delete file: {self.cache_filename}")
+
+        # optional hash index of entry coordinates, saved next to the tree file
+        self.hash_index_filename = self.tree_filename + HASH_INDEX_FILE_SUFFIX
+        if override_file and not self.try_delete_file(self.hash_index_filename):
+            raise OSError(f"Error: Couldn't delete file: {self.hash_index_filename}")
+
         # checks if files exists and are valid.
         load_from_files = self.check_files_load_existing_rtree(tree_file=self.tree_filename,
                                                                database_file=self.database_filename,
-                                                               override=override_file)
+                                                               override=override_file,
+                                                               create_directory=not self.read_only)
+        if self.read_only and not load_from_files:
+            raise ValueError(f"Read-only tree requires existing files: {self.tree_filename}, {self.database_filename}")
 
         # number of parameters used to index entries
         self.dimensions = dimensions
@@ -119,6 +167,28 @@ class RTree:
         # size of memory in Bytes to store one tree node
         self.node_size = node_size
 
+        # what is stored in node pages besides ids of children (PAGE_FORMAT_* flags)
+        self.page_format = page_format
+
+        # number of processes used for bulk loading
+        self.max_threads = max_threads if max_threads is not None else (cpu_count() or 1)
+        if self.max_threads < 1:
+            raise ValueError(f"Invalid number of threads: {self.max_threads}")
+
+        # size of memory in Bytes for sorting entries during bulk loading, larger inputs are sorted on disk
+        self.bulk_load_memory = bulk_load_memory
+
+        # number of top levels of the tree which are never evicted from the cache
+        self.cache_pinned_levels = cache_pinned_levels
+        if self.cache_pinned_levels < 0:
+            raise ValueError(f"Invalid number of pinned levels: {self.cache_pinned_levels}")
+
+        # how nodes cached before the tree was closed are loaded (CACHE_PRELOAD_*)
+        if cache_preload not in (CACHE_PRELOAD_NONE, CACHE_PRELOAD_SYNC, CACHE_PRELOAD_BACKGROUND):
+            raise ValueError(f"Unknown cache preload: {cache_preload}")
+        self.preload_thread: Optional[threading.Thread] = None
+        self.preload_stop = threading.Event()
+
         # id of root node
         self.root_id = 0
 
@@ -134,12 +204,10 @@ class RTree:
             [self.dimensions, self.node_size, self.id_size, self.parameters_size])
 
         # object that directly interacts with a file where the rtree is stored
-        self.tree_handler = TreeFileHandler(filename=self.tree_filename, dimensions=self.dimensions,
-                                            node_size=self.node_size, id_size=self.id_size, tree_depth=0,
-                                            parameters_size=self.parameters_size, root_id=self.root_id,
-                                            unique_sequence=self.unique_sequence, config_hash=self.config_hash)
+        self.tree_handler = self.__create_tree_handler()
 
         self.children_per_node = self.tree_handler.children_per_node
+        self.leaf_children_per_node = self.tree_handler.leaf_children_per_node
 
         if load_from_files:
             # override attributes by values from tree_handler and database
@@ -153,164 +221,632 @@ class RTree:
             self.root_id = self.tree_handler.root_id
             # self.tree_depth = self.tree_handler.tree_depth
             self.parameters_size = self.tree_handler.parameters_size
+            self.page_format = self.tree_handler.page_format
         else:
             root_node_new = RTreeNode.create_empty_node(self.dimensions, is_leaf=True, parent_id=0)
             self.root_id = self.tree_handler.create_node(root_node_new)
             if self.root_id != 0:
                 raise Exception(f"Root id in new file is {self.root_id}, but should be 0")
+            self.tree_handler.commit()
 
         # creates database file handler
         self.database = Database(filename=self.database_filename, dimensions=self.dimensions,
                                  parameters_size=self.parameters_size,
-                                 unique_sequence=self.unique_sequence, config_hash=self.config_hash)
+                                 unique_sequence=self.unique_sequence, config_hash=self.config_hash,
+                                 read_only=self.read_only, entry_cache_memory=entry_cache_memory)
+
+        # cache of nodes (cache.py), it is created when node size is known
+        self.cache = Cache(node_size=self.node_size, cache_memory=cache_memory, policy=cache_policy)
+        self.tree_handler.cache = self.cache
+
+        # pinned nodes whose children are pinned too, pinned nodes are chosen again when their children change
+        self.pinned_parent_ids: Set[int] = set()
+        self.pinned_levels_outdated = False
+        self.__pin_top_levels()
+
+        # histogram of a loaded tree is read from its file, missing or outdated one is built again by rebuild(),
+        # bulk_load() or rebuild_histogram(), until then PLAN_AUTO uses the tree
+        self.histogram: Optional[Histogram] = self.__load_histogram() if load_from_files else Histogram(self.dimensions)
+
+        # plan chosen for the last planned query
+        self.last_plan: Optional[QueryPlan] = None
+
+        self.hash_index: Optional[HashIndex] = None
+        if hash_index:
+            self.__open_hash_index()
+        elif not self.read_only and not self.try_delete_file(self.hash_index_filename):
+            # index would not follow changes of the tree made without it
+            raise OSError(f"Error: Couldn't delete file: {self.hash_index_filename}")
+
+        if load_from_files and cache_preload != CACHE_PRELOAD_NONE:
+            preloaded_ids = Cache.load_ids(self.cache_filename, self.unique_sequence)[:self.cache.cache_size]
+            if cache_preload == CACHE_PRELOAD_SYNC:
+                self.__preload_cache(preloaded_ids)
+            else:
+                self.preload_thread = threading.Thread(target=self.__preload_cache, args=(preloaded_ids,),
+                                                       daemon=True)
+                self.preload_thread.start()
 
-        # cache object (cache.py)
-        self.cache = Cache(node_size=self.node_size, child_size=self.tree_handler.children_per_node,
-                           cache_memory=CACHE_MEMORY_SIZE)
+        # set by close(), files of a closed tree are not used anymore
+        self.closed = False
 
     def __del__(self):
-        pass
+        # object may be only partly initialized, its file handlers save themselves
+        if not getattr(self, "closed", True):
+            self.close()
+
+    def close(self):
+        """Stops preloading of the cache, writes dirty pages and the header of the tree file
+        and saves the histogram and ids of cached nodes. Files are closed, the tree cannot be used afterwards"""
+        if self.closed:
+            return
+        self.closed = True
+
+        self.__stop_preload()
+        if not self.read_only:
+            if sys.is_finalizing():
+                # files cannot be opened at interpreter shutdown, outdated histogram and cached ids are ignored
+                self.tree_handler.write_header()
+            else:
+                self.flush()
+
+        self.tree_handler.close()
+        self.database.close()
+        if self.hash_index is not None:
+            self.hash_index.close()
+
+    def flush(self):
+        """Writes dirty pages and the header of the tree file,
+        so that the files can be opened by another tree object or process.
+        Ids of cached nodes are saved, so that they can be preloaded"""
+        self.__write_header()
+        self.database.file.flush()
+        if not self.read_only:
+            Cache.save_ids(self.cache_filename, self.unique_sequence, self.cache.get_resident_ids())
+
+    def __preload_cache(self, node_ids: List[int]):
+        """Loads nodes into the cache, pages are read in the order of their ids by large reads.
+        Nodes changed while their chunk was read are not stored, the rest of the chunk is"""
+        node_ids = sorted(node_ids)
+        for start in range(0, len(node_ids), CACHE_PRELOAD_CHUNK):
+            if self.preload_stop.is_set():
+                return
+            self.cache.start_preload()
+            nodes = self.tree_handler.get_nodes(node_ids[start:start + CACHE_PRELOAD_CHUNK])
+            self.cache.store_preloaded(nodes)
+
+    def __stop_preload(self):
+        """Stops the thread preloading the cache and waits for it"""
+        if self.preload_thread is not None:
+            self.preload_stop.set()
+            self.preload_thread.join()
+            self.preload_thread = None
+
+    def __open_hash_index(self):
+        """Opens hash index of the tree, the index is built again if it does not count the same entries as the tree.
+        Read-only tree does not use missing or outdated index"""
+        try:
+            self.hash_index = HashIndex(self.hash_index_filename, self.dimensions, self.parameters_size, self.id_size,
+                                        self.unique_sequence, self.read_only)
+        except IOError:
+            self.hash_index = None
+            return
+
+        entry_count = self.__get_node(self.root_id).get_entry_count()
+        if self.hash_index.entry_count != entry_count:
+            if self.read_only:
+                self.hash_index = None
+            else:
+                self.hash_index.build(self.__iter_index_records(), entry_count)
+
+    def __iter_index_records(self) -> Iterator[IndexRecord]:
+        """Yields (coordinates, position, leaf id) of every entry in the tree"""
+        for leaf in self.__iter_leaves():
+            if leaf.id is None:
+                raise Exception("Leaf id cannot be None")
+            for entry_position, entry_coordinates in self.iter_leaf_entries(leaf):
+                yield entry_coordinates, entry_position, leaf.id
+
+    def __write_header(self):
+        """Writes dirty pages and the header of the tree file, histogram is saved with it"""
+        self.tree_handler.write_header()
+        if self.histogram is not None:
+            self.histogram.save(self.histogram_filename, self.unique_sequence)
+
+    def __load_histogram(self) -> Optional[Histogram]:
+        """Reads saved histogram, it is used only when it counts the same number of entries as the tree"""
+        histogram = Histogram.load(self.histogram_filename, self.dimensions, self.unique_sequence)
+        if histogram is None or histogram.total != self.__get_node(self.root_id).get_entry_count():
+            return None
+        return histogram
+
+    def rebuild_histogram(self):
+        """Builds histogram of entries from the leaves of the tree"""
+        histogram = Histogram(self.dimensions)
+        for entry_coordinates, _ in self.__iter_leaf_items():
+            histogram.add(entry_coordinates)
+        # records of deleted entries are known only to the old histogram
+        histogram.deleted = self.histogram.deleted if self.histogram is not None else 0
+        self.histogram = histogram
+
+    def __plan_query(self, estimate: Callable[[Histogram], float], plan: str, lazy: bool) -> QueryPlan:
+        if plan not in (PLAN_AUTO, PLAN_TREE, PLAN_SCAN):
+            raise ValueError(f"Unknown query plan: {plan}")
+
+        histogram = self.histogram
+        if plan == PLAN_AUTO and (lazy or histogram is None):
+            # scan unpickles every entry, which lazy queries avoid, without histogram nothing is estimated
+            plan = PLAN_TREE
+        if histogram is None:
+            self.last_plan = QueryPlan(plan, math.nan, math.nan, math.nan, forced=True)
+            return self.last_plan
+
+        planner = QueryPlanner(histogram)
+        self.last_plan = planner.choose(estimate(histogram), self.tree_handler.tree_depth,
+                                        self.leaf_children_per_node, self.tree_handler.layout.leaf_coordinates, plan)
+        return self.last_plan
+
+    def explain_area(self, coordinates_min: List[int], coordinates_max: List[int]) -> QueryPlan:
+        """Returns plan which would be chosen for the area query, the query is not run"""
+        if len(coordinates_min) != self.dimensions or len(coordinates_max) != self.dimensions:
+            raise Exception("coordinates have incorrect number of dimensions")
+        return self.__plan_query(lambda histogram: histogram.estimate_count(coordinates_min, coordinates_max),
+                                 PLAN_AUTO, False)
+
+    def explain_knn(self, k: int) -> QueryPlan:
+        """Returns plan which would be chosen for the query of k nearest entries, the query is not run"""
+        return self.__plan_query(lambda histogram: float(min(k, histogram.total)), PLAN_AUTO, False)
+
+    def __create_tree_handler(self, cache: Optional[Cache] = None) -> TreeFileHandler:
+        return TreeFileHandler(filename=self.tree_filename, dimensions=self.dimensions,
+                               node_size=self.node_size, id_size=self.id_size, tree_depth=0,
+                               parameters_size=self.parameters_size, root_id=self.root_id,
+                               unique_sequence=self.unique_sequence, config_hash=self.config_hash,
+                               page_format=self.page_format, read_only=self.read_only, cache=cache)
+
+    def __reset_tree_file(self):
+        """Deletes the tree file and opens a new empty one (without root node)"""
+        self.__stop_preload()
+        self.tree_handler.file.close()
+        del self.tree_handler
+        os.remove(self.tree_filename)
+
+        self.root_id = 0
+        self.cache.clear()
+        self.tree_handler = self.__create_tree_handler(self.cache)
 
     # gets node directly from file, based on id
-    def __get_node(self, node_id: int) -> Optional[RTreeNode]:
+    def __get_node(self, node_id: int) -> RTreeNode:
         node = self.tree_handler.get_node(node_id)
         if node is None:
             raise Exception(f"Node {node_id} not found in tree file")
         return node
 
-    # gets node from cached memory
-    def __get_node_fastread(self, node_id: int, permanent_cache: bool = False) -> Optional[RTreeNode]:
-        cached_node = self.cache.search(node_id, permanent_cache)
+    # gets node from cached memory, nodes read for changes are read by __get_node, so that cached nodes are not modified
+    # nodes read by a walk of the whole tree are not stored (cache_node=False), so that they do not evict hot nodes
+    def read_node(self, node_id: int, cache_node: bool = True) -> RTreeNode:
+        """Reads node through the node cache, returned node may be the cached one and must not be modified"""
+        cached_node = self.cache.search(node_id)
         if cached_node is not None:
-           return cached_node
+            return cached_node
 
         node = self.tree_handler.get_node(node_id)
         if node is None:
             raise Exception(f"Node {node_id} not found in tree file")
 
-        self.cache.store(node, permanent_cache)
+        if cache_node:
+            self.cache.store(node)
         return node
 
-    def __rec_search_entry(self, coordinates: MBB, node: RTreeNode, permanent_cache: bool = False) -> Optional[Tuple[DatabaseEntry, int, int]]:
-        """Return entry, entry_position and id for node containing entry"""
+    def __pin_top_levels(self):
+        """Pins nodes of the top cache_pinned_levels levels of the tree in the cache, they are loaded on first read"""
+        pinned_ids: List[int] = []
+        parent_ids: List[int] = []
+        level = [self.root_id]
+        for level_number in range(self.cache_pinned_levels):
+            pinned_ids.extend(level)
+            if level_number + 1 == self.cache_pinned_levels or len(pinned_ids) >= self.cache.cache_size:
+                break
+
+            parent_ids.extend(level)
+            next_level: List[int] = []
+            for node_id in level:
+                node = self.__get_node(node_id)
+                if not node.is_leaf:
+                    next_level.extend(node.child_nodes)
+            level = next_level
+
+        self.cache.pin(pinned_ids)
+        self.pinned_parent_ids = set(parent_ids)
+        self.pinned_levels_outdated = False
+
+    def warm_up(self, levels: Optional[int] = None) -> int:
+        """Loads nodes of the top levels (pinned levels by default) into the cache, pages of one level are read
+        in the order of their ids. Stops when the cache is full, returns the number of loaded nodes"""
+        levels = self.cache_pinned_levels if levels is None else levels
+        loaded_count = 0
+        level = [self.root_id]
+        for _ in range(levels):
+            level = level[:self.cache.cache_size - loaded_count]
+            if not level:
+                break
+
+            nodes = self.tree_handler.get_nodes(level)
+            for node in nodes:
+                self.cache.store(node)
+            loaded_count += len(nodes)
+            level = [child_id for node in nodes if not node.is_leaf for child_id in node.child_nodes]
+
+        return loaded_count
+
+    def iter_leaf_entries(self, node: RTreeNode, get_coordinates: Optional[Callable[[int], List[int]]] = None
+                          ) -> Iterator[Tuple[int, List[int]]]:
+        """Yields (position, coordinates) of entries in the leaf.
+        Coordinates are read from the database only when the leaf page does not store them"""
+        if node.child_boxes is not None:
+            for entry_position, box in zip(node.child_nodes, node.child_boxes):
+                yield entry_position, [dim.low for dim in box]
+            return
+
+        if get_coordinates is None:
+            get_coordinates = self.database.search_coordinates
+        for entry_position in node.child_nodes:
+            yield entry_position, get_coordinates(entry_position)
+
+    def __get_child_mbbs(self, node: RTreeNode) -> Optional[List[Tuple[MBBDim, ...]]]:
+        """Returns MBBs of children if they are stored in the page of the inner node, None otherwise"""
+        if node.is_leaf or not self.tree_handler.layout.child_mbbs:
+            return None
+        return node.child_boxes
+
+    def iter_child_nodes(self, node: RTreeNode, is_candidate: Callable[[MBB], bool],
+                         cache_nodes: bool = True) -> Iterator[RTreeNode]:
+        """Yields children of the inner node whose MBB satisfies is_candidate, in their order in the node.
+        When the node stores MBBs of its children, the other children are skipped without reading their pages"""
+        child_mbbs = self.__get_child_mbbs(node)
+        if child_mbbs is not None:
+            for child_id, box in zip(node.child_nodes, child_mbbs):
+                if is_candidate(MBB(box)):
+                    yield self.read_node(child_id, cache_nodes)
+            return
+
+        for child_id in node.child_nodes:
+            child_node = self.read_node(child_id, cache_nodes)
+            if child_node is None:
+                raise Exception("Child node cannot be None")
+            if is_candidate(child_node.mbb):
+                yield child_node
+
+    def __rec_search_entry(self, coordinates: MBB, node: RTreeNode) -> Optional[Tuple[int, int]]:
+        """Return entry_position and id for node containing entry, only coordinates of entries are read"""
         if node.id is None:
             raise Exception("node.id cannot be None")
 
         if node.is_leaf:
-            for entry_position in node.child_nodes:
-                entry = self.database.search(entry_position)
-                if coordinates.contains_inner(entry.get_mbb()):
-                    return entry, entry_position, node.id
+            for entry_position, entry_coordinates in self.iter_leaf_entries(node):
+                if coordinates.contains_point(entry_coordinates):
+                    return entry_position, node.id
         else:
-            for child_id in node.child_nodes:
-                child_node = self.__get_node_fastread(child_id, permanent_cache)
-                if child_node is None:
-                    raise Exception("Child node cannot be None")
-                if child_node.mbb.contains_inner(coordinates):
-                    rec_search = self.__rec_search_entry(coordinates, child_node, permanent_cache=False)
-                    if rec_search is not None:
-                        return rec_search
+            for child_node in self.iter_child_nodes(node, lambda child_mbb: child_mbb.contains_inner(coordinates)):
+                rec_search = self.__rec_search_entry(coordinates, child_node)
+                if rec_search is not None:
+                    return rec_search
         return None
 
-    def __search_entry_and_position(self, coordinates: List[int]) -> Optional[Tuple[DatabaseEntry, int, int]]:
+    def search_entry_position(self, coordinates: List[int]) -> Optional[Tuple[int, int]]:
+        """Returns position of the entry at the point and id of its leaf, hash index is used when the tree has it"""
+        if self.hash_index is not None:
+            # one bucket of the hash index is read instead of all the leaves whose MBB contains the point
+            found = self.hash_index.search(coordinates)
+            return found[0] if found else None
+
         check_mbb = MBB.create_box_from_entry_list(coordinates)
-        root_node = self.__get_node_fastread(self.root_id, permanent_cache=True)
+        root_node = self.read_node(self.root_id)
         if root_node is None:
             raise Exception("Root node cannot be None")
 
         # recursively check all children from root down for matching coordinates
-        return self.__rec_search_entry(check_mbb, root_node, permanent_cache=True)
+        return self.__rec_search_entry(check_mbb, root_node)
+
+    def materialize(self, entry_position: int, coordinates: List[int], lazy: bool = False) -> SearchResult:
+        """Returns entry with unpickled data, or only a handle when lazy, data of handle are read on first access"""
+        if lazy:
+            return EntryHandle(self.database, entry_position, coordinates)
+        return self.database.search(entry_position)
+
+    def __scan_result(self, entry_position: int, entry: DatabaseEntry, lazy: bool) -> SearchResult:
+        """Returns entry found by a scan of the database, or its handle when lazy, as the tree would.
+        Data were already unpickled by the scan, so the handle is loaded with them"""
+        if lazy:
+            handle = EntryHandle(self.database, entry_position, entry.coordinates)
+            handle.set_entry(entry)
+            return handle
+        return entry
 
     # look for entry at specific point
-    def search_entry(self, coordinates: List[int]) -> Optional[DatabaseEntry]:
+    def search_entry(self, coordinates: List[int], lazy: bool = False) -> Optional[SearchResult]:
         if len(coordinates) != self.dimensions:
             raise Exception("coordinates have incorrect number of dimensions")
 
-        entry = self.__search_entry_and_position(coordinates)
-        if entry is None:
-            return None
-
-        return entry[0]
-
-    def __search_entry_position_parent_position(self, coordinates: List[int]) -> Optional[Tuple[int, int]]:
-        entry = self.__search_entry_and_position(coordinates)
-        if entry is None:
+        response = self.search_entry_position(coordinates)
+        if response is None:
             return None
 
-        return entry[1], entry[2]
-
-    def __rec_search_area(self, coordinates: MBB, node: RTreeNode, carry: List[DatabaseEntry], permanent_cache: bool = False):
-        if node.is_leaf:
-            for entry_position in node.child_nodes:
-                entry = self.database.search(entry_position)
-                if coordinates.contains_inner(entry.get_mbb()):
-                    carry.append(entry)
-        else:
-            for child in node.child_nodes:
-                child_node = self.__get_node_fastread(child, permanent_cache)
-                if child_node is None:
-                    raise Exception("Child node cannot be None")
-                if child_node.mbb.overlaps(coordinates):
-                    self.__rec_search_area(coordinates, child_node, carry, permanent_cache=False)
+        return self.materialize(response[0], list(coordinates), lazy)
 
-    # area defined by two points in N dimensions
-    def search_area(self, coordinates_min: List[int], coordinates_max: List[int]) -> List[DatabaseEntry]:
-        if len(coordinates_min) != len(coordinates_max) != self.dimensions:
+    def search_area_iter(self, coordinates_min: List[int], coordinates_max: List[int],
+                         lazy: bool = False, cache_nodes: bool = True) -> Iterator[SearchResult]:
+        """Yields entries inside the area as the leaves are visited, nodes waiting for a visit are kept on a stack.
+        When lazy, EntryHandles are yielded instead and data are unpickled only when accessed.
+        Wide areas visiting most of the tree can pass cache_nodes=False, then cached nodes are used,
+        but the read ones are not stored"""
+        if len(coordinates_min) != self.dimensions or len(coordinates_max) != self.dimensions:
             raise Exception("coordinates have incorrect number of dimensions")
 
         check_mbb = MBB.create_box_from_entry_list(coordinates_min)
         max_mbb = MBB.create_box_from_entry_list(coordinates_max)
         check_mbb.insert_mbb(max_mbb.box)
 
-        root_node = self.__get_node_fastread(self.root_id, permanent_cache=True)
+        root_node = self.read_node(self.root_id)
         if root_node is None:
             raise Exception("Root node cannot be None")
 
-        # recursively check all children from root down for matching coordinates
-        matching: List[DatabaseEntry] = []
-        self.__rec_search_area(check_mbb, root_node, matching, permanent_cache=True)
-        return matching
+        stack: List[RTreeNode] = [root_node]
+        while stack:
+            node = stack.pop()
+            if node.is_leaf:
+                # data are unpickled only for matching entries
+                for entry_position, entry_coordinates in self.iter_leaf_entries(node):
+                    if check_mbb.contains_point(entry_coordinates):
+                        yield self.materialize(entry_position, entry_coordinates, lazy)
+            else:
+                # children are pushed in reverse, so that they are visited in their order in the node
+                stack.extend(reversed(list(self.iter_child_nodes(node, check_mbb.overlaps, cache_nodes))))
 
-    # find k entries closest to given point
-    def search_knn(self, k: int, coordinates: List[int]) -> List[DatabaseEntry]:
+    # area defined by two points in N dimensions
+    def search_area(self, coordinates_min: List[int], coordinates_max: List[int],
+                    lazy: bool = False, plan: str = DEFAULT_QUERY_PLAN, cache_nodes: bool = True) -> List[SearchResult]:
+        """Returns entries inside the area. Plan PLAN_AUTO chooses between the tree and a scan of the database
+        by the estimated number of results, PLAN_TREE or PLAN_SCAN force it. Chosen plan is kept in last_plan.
+        With cache_nodes=False the read nodes are not stored in the cache"""
+        if len(coordinates_min) != self.dimensions or len(coordinates_max) != self.dimensions:
+            raise Exception("coordinates have incorrect number of dimensions")
 
+        query_plan = self.__plan_query(lambda histogram: histogram.estimate_count(coordinates_min, coordinates_max),
+                                       plan, lazy)
+        if query_plan.plan == PLAN_SCAN:
+            found = self.database.linear_search_area_positions(
+                [min(dims) for dims in zip(coordinates_min, coordinates_max)],
+                [max(dims) for dims in zip(coordinates_min, coordinates_max)])
+            return [self.__scan_result(position, entry, lazy) for position, entry in found]
+        return list(self.search_area_iter(coordinates_min, coordinates_max, lazy, cache_nodes))
+
+    def search_radius_iter(self, coordinates: List[int], radius: float, lazy: bool = False) -> Iterator[SearchResult]:
+        """Yields entries within Euclidean distance radius from the point.
+        Nodes farther than radius (by MINDIST of their MBB) are skipped, entries are unpickled only when they match"""
         if len(coordinates) != self.dimensions:
             raise Exception("coordinates have incorrect number of dimensions")
+        if radius < 0:
+            raise ValueError(f"Radius cannot be negative: {radius}")
 
-        root_node = self.__get_node_fastread(self.root_id, permanent_cache=True)
+        root_node = self.read_node(self.root_id)
         if root_node is None:
             raise Exception("Root node cannot be None")
 
-        # at every step, increase the searchbox one percent of root area
-        size_increments = []
-        for dim in root_node.mbb.box:
-            size_increments.append(math.ceil(dim.get_diff() * 0.01))
+        stack: List[RTreeNode] = [root_node]
+        while stack:
+            node = stack.pop()
+            if node.is_leaf:
+                for entry_position, entry_coordinates in self.iter_leaf_entries(node):
+                    if math.dist(entry_coordinates, coordinates) <= radius:
+                        yield self.materialize(entry_position, entry_coordinates, lazy)
+            else:
+                stack.extend(reversed(list(
+                    self.iter_child_nodes(node, lambda child_mbb: child_mbb.min_distance(coordinates) <= radius))))
+
+    # entries in the ball with given radius around the point
+    def search_radius(self, coordinates: List[int], radius: float, lazy: bool = False) -> List[SearchResult]:
+        return list(self.search_radius_iter(coordinates, radius, lazy))
+
+    def join(self, other: RTree, predicate: Optional[Callable[[List[int], List[int]], bool]] = None,
+             distance: float = 0) -> Iterator[Tuple[int, int]]:
+        """Yields (position in this tree, position in other tree) of entries within Euclidean distance from each other
+        and satisfying the optional predicate of their coordinates. Both trees are descended together,
+        only pairs of nodes whose MBBs (enlarged by distance) overlap are expanded."""
+        if other.dimensions != self.dimensions:
+            raise Exception("Joined trees have different number of dimensions")
+        if distance < 0:
+            raise ValueError(f"Distance cannot be negative: {distance}")
+
+        def is_near(mbb_a: MBB, mbb_b: MBB) -> bool:
+            if distance == 0:
+                return mbb_a.overlaps(mbb_b)
+            return mbb_a.min_distance_from_mbb(mbb_b) <= distance
+
+        def get_children(tree: RTree, node: RTreeNode, other_node: RTreeNode) -> List[RTreeNode]:
+            # children far from the other node cannot form any pair
+            return list(tree.iter_child_nodes(node, lambda child_mbb: is_near(child_mbb, other_node.mbb)))
+
+        root_a = self.read_node(self.root_id)
+        root_b = other.read_node(other.root_id)
+        if root_a is None or root_b is None:
+            raise Exception("Root node cannot be None")
 
-        search_mbb = MBB.create_box_from_entry_list(coordinates)
+        stack: List[Tuple[RTreeNode, RTreeNode]] = [(root_a, root_b)]
+        while stack:
+            node_a, node_b = stack.pop()
+
+            if node_a.is_leaf and node_b.is_leaf:
+                entries_b = list(other.iter_leaf_entries(node_b))
+                for position_a, coordinates_a in self.iter_leaf_entries(node_a):
+                    for position_b, coordinates_b in entries_b:
+                        if math.dist(coordinates_a, coordinates_b) <= distance and \
+                                (predicate is None or predicate(coordinates_a, coordinates_b)):
+                            yield position_a, position_b
+                continue
+
+            # inner nodes are expanded, both of them at once if possible
+            children_a = [node_a] if node_a.is_leaf else get_children(self, node_a, node_b)
+            children_b = [node_b] if node_b.is_leaf else get_children(other, node_b, node_a)
+            for child_a in reversed(children_a):
+                for child_b in reversed(children_b):
+                    if is_near(child_a.mbb, child_b.mbb):
+                        stack.append((child_a, child_b))
+
+    def count_area(self, coordinates_min: List[int], coordinates_max: List[int]) -> int:
+        """Counts entries inside the area without reading their data.
+        Subtrees of nodes lying completely inside the area are counted from entry counts stored in the nodes."""
+        if len(coordinates_min) != self.dimensions or len(coordinates_max) != self.dimensions:
+            raise Exception("coordinates have incorrect number of dimensions")
 
-        while True:
-            # increase
-            new_box: List[MBBDim] = []
-            for increment, dimension in zip(size_increments, search_mbb.box):
-                new_low = dimension.low - increment
-                new_high = dimension.high + increment
-                new_box.append(MBBDim(new_low, new_high))
-            search_mbb.box = tuple(new_box)
+        check_mbb = MBB.create_box_from_entry_list(coordinates_min)
+        check_mbb.insert_mbb(MBB.create_box_from_entry_list(coordinates_max).box)
+
+        root_node = self.read_node(self.root_id)
+        if root_node is None:
+            raise Exception("Root node cannot be None")
+
+        count = 0
+        stack: List[RTreeNode] = [root_node]
+        while stack:
+            node = stack.pop()
+            if check_mbb.contains_inner(node.mbb):
+                count += node.get_entry_count()
+            elif node.is_leaf:
+                for _, entry_coordinates in self.iter_leaf_entries(node):
+                    if check_mbb.contains_point(entry_coordinates):
+                        count += 1
+            else:
+                stack.extend(self.iter_child_nodes(node, check_mbb.overlaps))
+
+        return count
+
+    def nearest_iter(self, coordinates: List[int], lazy: bool = False) -> Iterator[SearchResult]:
+        """Yields entries ordered by their distance from given point, nearest first.
+        Best-first search, nodes and entries wait in one heap ordered by their smallest possible distance,
+        so only nodes closer than the last yielded entry are ever read."""
+        return self.__nearest_iter(coordinates, self.read_node, self.database.search_coordinates,
+                                   lambda position, entry_coordinates:
+                                   self.materialize(position, entry_coordinates, lazy))
+
+    def __nearest_iter(self, coordinates: List[int], get_node: Callable[[int], RTreeNode],
+                       get_coordinates: Callable[[int], List[int]],
+                       get_entry: Callable[[int, List[int]], SearchResult]) -> Iterator[SearchResult]:
+        if len(coordinates) != self.dimensions:
+            raise Exception("coordinates have incorrect number of dimensions")
 
-            # search
-            nearest_neighbors: List[DatabaseEntry] = []
-            self.__rec_search_area(search_mbb, root_node, nearest_neighbors, permanent_cache=True)
+        heap = NearestHeap(coordinates, self.root_id)
+        while heap:
+            found = self.nearest_step(heap, get_node, get_coordinates)
+            if found is not None:
+                yield get_entry(*found)
 
-            # is it k or more?
-            if len(nearest_neighbors) == k:
-                return nearest_neighbors
+    def nearest_step(self, heap: NearestHeap, get_node: Optional[Callable[[int], RTreeNode]] = None,
+                     get_coordinates: Optional[Callable[[int], List[int]]] = None) -> Optional[Tuple[int, List[int]]]:
+        """One step of the best-first search, pops the nearest item of the heap.
+        Returns (position, coordinates) of a popped entry, popped node is expanded into the heap and None returned"""
+        if get_node is None:
+            get_node = self.read_node
 
-            if len(nearest_neighbors) > k:
-                nearest_neighbors.sort(key=lambda x: x.distance_from(coordinates))
-                return nearest_neighbors[0:k]
+        item = heap.pop()
+        if isinstance(item, tuple):
+            return item
 
-            if search_mbb.contains_inner(root_node.mbb):
-                return nearest_neighbors
+        # child pushed by the distance of its MBB stored in the parent is read only now
+        node = item if isinstance(item, RTreeNode) else get_node(item)
+
+        child_mbbs = self.__get_child_mbbs(node)
+        if node.is_leaf:
+            # only coordinates are needed for the ordering, data are unpickled when the entry is returned
+            for entry_position, entry_coordinates in self.iter_leaf_entries(node, get_coordinates):
+                heap.push(math.dist(entry_coordinates, heap.coordinates), (entry_position, entry_coordinates))
+        elif child_mbbs is not None:
+            for child, box in zip(node.child_nodes, child_mbbs):
+                heap.push(MBB(box).min_distance(heap.coordinates), child)
+        else:
+            for child in node.child_nodes:
+                child_node = get_node(child)
+                heap.push(child_node.mbb.min_distance(heap.coordinates), child_node)
+        return None
+
+    # find k entries closest to given point
+    def search_knn(self, k: int, coordinates: List[int], lazy: bool = False,
+                   plan: str = DEFAULT_QUERY_PLAN) -> List[SearchResult]:
+        """Returns k entries nearest to the point, plan is chosen in the same way as by search_area"""
+        if len(coordinates) != self.dimensions:
+            raise Exception("coordinates have incorrect number of dimensions")
+
+        query_plan = self.__plan_query(lambda histogram: float(min(k, histogram.total)), plan, lazy)
+        if query_plan.plan == PLAN_SCAN:
+            return [self.__scan_result(position, entry, lazy)
+                    for position, entry in self.database.linear_search_knn_positions(k, coordinates)]
+        return list(islice(self.nearest_iter(coordinates, lazy), k))
+
+    def search_area_many(self, areas: List[Tuple[List[int], List[int]]],
+                         lazy: bool = False) -> List[List[SearchResult]]:
+        """Runs area queries given by (coordinates_min, coordinates_max) in one traversal of the tree.
+        Every node is read once and tested against all the queries which reached it. Returns results per query"""
+        check_mbbs: List[MBB] = []
+        for coordinates_min, coordinates_max in areas:
+            if len(coordinates_min) != self.dimensions or len(coordinates_max) != self.dimensions:
+                raise Exception("coordinates have incorrect number of dimensions")
+            check_mbb = MBB.create_box_from_entry_list(coordinates_min)
+            check_mbb.insert_mbb(MBB.create_box_from_entry_list(coordinates_max).box)
+            check_mbbs.append(check_mbb)
+
+        results: List[List[SearchResult]] = [[] for _ in areas]
+        if not areas:
+            return results
+
+        root_node = self.read_node(self.root_id)
+        if root_node is None:
+            raise Exception("Root node cannot be None")
+
+        # node with indexes of queries overlapping it
+        stack: List[Tuple[RTreeNode, List[int]]] = [(root_node, list(range(len(areas))))]
+        while stack:
+            node, queries = stack.pop()
+            if node.is_leaf:
+                for entry_position, entry_coordinates in self.iter_leaf_entries(node):
+                    matching = [query for query in queries if check_mbbs[query].contains_point(entry_coordinates)]
+                    if matching:
+                        # entry is unpickled once and shared by all matching queries
+                        entry = self.materialize(entry_position, entry_coordinates, lazy)
+                        for query in matching:
+                            results[query].append(entry)
+            else:
+                children: List[Tuple[RTreeNode, List[int]]] = []
+                for child_node in self.iter_child_nodes(
+                        node, lambda child_mbb: any(child_mbb.overlaps(check_mbbs[query]) for query in queries)):
+                    children.append((child_node, [query for query in queries
+                                                  if child_node.mbb.overlaps(check_mbbs[query])]))
+                stack.extend(reversed(children))
+
+        return results
+
+    def search_knn_many(self, k: int, points: List[List[int]], lazy: bool = False) -> List[List[SearchResult]]:
+        """Finds k nearest entries for every point. Nodes, coordinates and entries read by one query
+        are kept for the other queries of the batch, so every page is read once. Returns results per point"""
+        nodes: Dict[int, RTreeNode] = {}
+        coordinates_memo: Dict[int, List[int]] = {}
+        entries: Dict[int, SearchResult] = {}
+
+        def get_node(node_id: int) -> RTreeNode:
+            if node_id not in nodes:
+                nodes[node_id] = self.read_node(node_id)
+            return nodes[node_id]
+
+        def get_coordinates(entry_position: int) -> List[int]:
+            if entry_position not in coordinates_memo:
+                coordinates_memo[entry_position] = self.database.search_coordinates(entry_position)
+            return coordinates_memo[entry_position]
+
+        def get_entry(entry_position: int, entry_coordinates: List[int]) -> SearchResult:
+            if entry_position not in entries:
+                entries[entry_position] = self.materialize(entry_position, entry_coordinates, lazy)
+            return entries[entry_position]
+
+        return [list(islice(self.__nearest_iter(point, get_node, get_coordinates, get_entry), k)) for point in points]
 
     def __rec_search_desired(self, entry_mmb: MBB, node: RTreeNode) -> int:
         if node.is_leaf:
@@ -318,38 +854,45 @@ class RTree:
                 raise Exception("Node id cannot be None")
             return node.id
 
-        minimum_size_node: Optional[RTreeNode] = None
-        minimum_size_value: Optional[int] = maxsize
+        # MBB of every child with the child node, or only with its id when the MBB is stored in this node
+        children: List[Tuple[MBB, Union[RTreeNode, int]]] = []
+        child_mbbs = self.__get_child_mbbs(node)
+        if child_mbbs is not None:
+            children = [(MBB(box), child_id) for child_id, box in zip(node.child_nodes, child_mbbs)]
+        else:
+            for child_id in node.child_nodes:
+                child_node = self.__get_node(child_id)
+                if child_node is None:
+                    raise Exception("Node cannot be None")
+                children.append((child_node.mbb, child_node))
 
-        for child_id in node.child_nodes:
-            child = self.__get_node(child_id)
-            if child is None:
-                raise Exception("Node cannot be None")
-            if child.mbb.contains_inner(entry_mmb):
-                size = child.mbb.size
+        minimum_size_node: Optional[Union[RTreeNode, int]] = None
+        minimum_size_value: Optional[int] = maxsize
+        for child_mbb, child in children:
+            if child_mbb.contains_inner(entry_mmb):
+                size = child_mbb.size
                 if size < minimum_size_value:
                     minimum_size_value = size
                     minimum_size_node = child
 
-        if minimum_size_node is not None:
-            return self.__rec_search_desired(entry_mmb, minimum_size_node)
-
-        minimum_expansion_node: Optional[RTreeNode] = None
-        minimum_expansion_value: Optional[int] = maxsize
-        for child_id in node.child_nodes:
-            child = self.__get_node(child_id)
-            if child is None:
-                raise Exception("Child node cannot be None")
-
-            expansion = child.mbb.size_increase_insert(entry_mmb.box)
-            if expansion < minimum_expansion_value:
-                minimum_expansion_value = expansion
-                minimum_expansion_node = child
-
-        if minimum_expansion_node is None:
-            raise Exception("RTree insert error, minimum_expansion_node is None")
-
-        return self.__rec_search_desired(entry_mmb, minimum_expansion_node)
+        desired_child = minimum_size_node
+        if desired_child is None:
+            minimum_expansion_node: Optional[Union[RTreeNode, int]] = None
+            minimum_expansion_value: Optional[int] = maxsize
+            for child_mbb, child in children:
+                expansion = child_mbb.size_increase_insert(entry_mmb.box)
+                if expansion < minimum_expansion_value:
+                    minimum_expansion_value = expansion
+                    minimum_expansion_node = child
+
+            if minimum_expansion_node is None:
+                raise Exception("RTree insert error, minimum_expansion_node is None")
+            desired_child = minimum_expansion_node
+
+        # only the chosen child is read, when MBBs of children are stored in this node
+        if not isinstance(desired_child, RTreeNode):
+            desired_child = self.__get_node(desired_child)
+        return self.__rec_search_desired(entry_mmb, desired_child)
 
     def __execute_split(self, node: RTreeNode):
         seed_node_1, seed_node_2 = node.get_seed_split_nodes()
@@ -359,16 +902,18 @@ class RTree:
         if node.id is None:
             raise Exception("Node id cannot be None")
 
+        max_entries_count = self.tree_handler.layout.get_children_per_node(node.is_leaf)
         for child_node_id in node.child_nodes:
             child_mbb_box: Tuple[MBBDim, ...] = ()
+            child_entry_count = 0
 
             if node.is_leaf:
-                database_entry = self.database.search(child_node_id)
-
-                if database_entry is None:
-                    raise Exception("Child node [of leaf, actually DBEntry] cannot be None")
-
-                child_mbb_box = database_entry.get_mbb().box
+                # only coordinates are needed for the split, data of the entry are not unpickled
+                if node.child_boxes is not None:
+                    child_mbb_box = node.child_boxes[node.child_nodes.index(child_node_id)]
+                else:
+                    entry_coordinates = self.database.search_coordinates(child_node_id)
+                    child_mbb_box = MBB.create_box_from_entry_list(entry_coordinates).box
 
             else:
                 child_node = self.__get_node(child_node_id)
@@ -379,30 +924,40 @@ class RTree:
                     raise Exception("Child node id cannot be None")
 
                 child_mbb_box = child_node.mbb.box
+                child_entry_count = child_node.get_entry_count()
 
             seed_1_increase = seed_node_1.mbb.size_increase_insert(child_mbb_box)
             seed_2_increase = seed_node_2.mbb.size_increase_insert(child_mbb_box)
 
-            if seed_node_1.has_over_balance():
-                seed_node_2.insert_box(child_node_id, child_mbb_box)
+            if seed_node_1.has_over_balance(max_entries_count):
+                target_node = seed_node_2
 
-            elif seed_node_2.has_over_balance():
-                seed_node_1.insert_box(child_node_id, child_mbb_box)
+            elif seed_node_2.has_over_balance(max_entries_count):
+                target_node = seed_node_1
 
             elif seed_1_increase > seed_2_increase:
-                seed_node_2.insert_box(child_node_id, child_mbb_box)
+                target_node = seed_node_2
 
             elif seed_2_increase > seed_1_increase:
-                seed_node_1.insert_box(child_node_id, child_mbb_box)
+                target_node = seed_node_1
 
             elif seed_node_2.mbb.size > seed_node_1.mbb.size:
-                seed_node_1.insert_box(child_node_id, child_mbb_box)
+                target_node = seed_node_1
             else:
-                seed_node_2.insert_box(child_node_id, child_mbb_box)
+                target_node = seed_node_2
+
+            target_node.insert_box(child_node_id, child_mbb_box)
+            target_node.entry_count += child_entry_count
 
         return seed_node_1, seed_node_2
 
     def __update_parent_reference(self, parent_node: RTreeNode):
+        if parent_node.id is None:
+            raise Exception("Node id cannot be None")
+        if parent_node.is_leaf and self.hash_index is not None:
+            # entries moved to the new leaf of a split
+            for entry_position, entry_coordinates in self.iter_leaf_entries(parent_node):
+                self.hash_index.update_leaf(entry_coordinates, entry_position, parent_node.id)
         if not parent_node.is_leaf:
             for child_id in parent_node.child_nodes:
                 child_node = self.__get_node(child_id)
@@ -410,7 +965,6 @@ class RTree:
                     raise Exception("Child Node not found")
                 child_node.parent_id = parent_node.id
                 self.tree_handler.update_node(child_id, child_node)
-                self.cache.store(child_node, child_node.parent_id == self.root_id)
 
     def __propagate_stretch(self, node: RTreeNode):
         if node.parent_id is None:
@@ -420,15 +974,22 @@ class RTree:
         if parent_node is None or parent_node.id is None:
             raise Exception("Parent_node cannot be none")
 
-        if not parent_node.contains_inner(node):
+        # MBB of the child stored in the parent has to follow the MBB of the child
+        child_mbbs = self.__get_child_mbbs(parent_node)
+        stored_mbb_changed = child_mbbs is not None and node.id in parent_node.child_nodes and \
+            child_mbbs[parent_node.child_nodes.index(node.id)] != node.mbb.box
+
+        if not parent_node.contains_inner(node) or stored_mbb_changed:
 
             if len(parent_node.child_nodes) == 0:
                 raise Exception("Parent_node cannot have 0 children")
 
-            contained_id = parent_node.child_nodes[0]
-            parent_node.insert_box(contained_id, node.mbb.box)
+            if not parent_node.is_leaf and node.id in parent_node.child_nodes:
+                # box of the child is updated together with the box of the parent
+                parent_node.insert_box(node.id, node.mbb.box)
+            else:
+                parent_node.mbb.insert_mbb(node.mbb.box)
             self.tree_handler.update_node(parent_node.id, parent_node)
-            self.cache.store(parent_node, parent_node.parent_id == self.root_id)
             self.__propagate_stretch(parent_node)
 
     def __update_root_id(self, root_id: int):
@@ -451,7 +1012,7 @@ class RTree:
         if parent_node.id is None:
             raise Exception("parent_node id cannot be none")
 
-        if parent_node.is_full():
+        if parent_node.is_full(self.tree_handler.layout.get_children_per_node(parent_node.is_leaf)):
             if parent_node.id == desired_node.id == self.root_id:
 
                 new_root = RTreeNode.create_empty_node(self.dimensions, is_leaf=False)
@@ -469,6 +1030,7 @@ class RTree:
 
                 new_root.insert_box(smaller_split_node.id, smaller_split_node.mbb.box)
                 new_root.insert_box(bigger_split_node.id, bigger_split_node.mbb.box)
+                new_root.entry_count = smaller_split_node.get_entry_count() + bigger_split_node.get_entry_count()
 
                 self.tree_handler.tree_depth += 1
 
@@ -477,14 +1039,11 @@ class RTree:
                 new_root.parent_id = self.root_id
                 self.tree_handler.update_node(self.root_id, new_root)
                 new_root.id = new_root_id
-                self.cache.store(new_root, permanent=True)
 
                 smaller_split_node.parent_id = self.root_id
                 bigger_split_node.parent_id = self.root_id
                 self.tree_handler.update_node(smaller_split_node.id, smaller_split_node)
-                self.cache.store(smaller_split_node, permanent=True)
                 self.tree_handler.update_node(bigger_split_node.id, bigger_split_node)
-                self.cache.store(bigger_split_node, permanent=True)
 
                 self.__propagate_stretch(smaller_split_node)
                 self.__propagate_stretch(bigger_split_node)
@@ -499,13 +1058,10 @@ class RTree:
                 bigger_split_node.id = self.tree_handler.update_node(desired_node.id, bigger_split_node)
 
                 self.__update_parent_reference(smaller_split_node)
-                self.cache.store(smaller_split_node, smaller_split_node.parent_id == self.root_id)
-                self.cache.store(bigger_split_node, bigger_split_node.parent_id == self.root_id)
 
                 # parent_node.insert_box(smaller_split_node.id, smaller_split_node.mbb.box)
                 parent_node.insert_box(bigger_split_node.id, bigger_split_node.mbb.box)
                 self.tree_handler.update_node(parent_node.id, parent_node)
-                self.cache.store(parent_node, parent_node.parent_id == self.root_id)
 
                 # if their parent is full, split it too -> recursively
                 self.__handle_full_node(parent_node, smaller_split_node.id, smaller_split_node.mbb.box)
@@ -522,13 +1078,32 @@ class RTree:
 
             parent_node.insert_box(bigger_split_node.id, bigger_split_node.mbb.box)
             parent_node.insert_box(smaller_split_node.id, smaller_split_node.mbb.box)
+            if parent_node.id in self.pinned_parent_ids:
+                self.pinned_levels_outdated = True
 
             self.tree_handler.update_node(parent_node.id, parent_node)
-            self.cache.store(parent_node, parent_node.parent_id == self.root_id)
 
             self.__propagate_stretch(smaller_split_node)
             self.__propagate_stretch(bigger_split_node)
 
+            # split nodes count their own entries, the new entry is added to the nodes above them
+            self.__propagate_count(parent_node.id, 1)
+
+    def __propagate_count(self, node_id: int, delta: int):
+        """Adds delta to entry counts of the inner node and all its ancestors, leaves count their entries directly"""
+        while True:
+            node = self.__get_node(node_id)
+            if node is None or node.id is None or node.parent_id is None:
+                raise Exception("Node cannot be None")
+
+            if not node.is_leaf:
+                node.entry_count += delta
+                self.tree_handler.update_node(node.id, node)
+
+            if node.id == self.root_id:
+                break
+            node_id = node.parent_id
+
     def insert_entry(self, new_entry: DatabaseEntry, given_position: int = -1):
         if given_position == -1:
             new_entry_position = self.database.create(new_entry)
@@ -538,6 +1113,7 @@ class RTree:
         root_node = self.__get_node(self.root_id)
         if root_node is None:
             raise Exception("root node cannot be None")
+        old_root_id = self.root_id
 
         desired_node_id = self.__rec_search_desired(new_entry.get_mbb(), root_node)
         desired_node = self.__get_node(desired_node_id)
@@ -547,15 +1123,28 @@ class RTree:
         if desired_node.parent_id is None:
             raise Exception("desired_node parent_id cannot be None")
 
-        if desired_node.is_full():
+        if self.hash_index is not None:
+            # leaf is updated if the entry is moved by a split
+            self.hash_index.insert(new_entry.coordinates, new_entry_position, desired_node_id)
+
+        if desired_node.is_full(self.tree_handler.layout.get_children_per_node(desired_node.is_leaf)):
             self.__handle_full_node(desired_node, new_entry_position, new_entry.get_mbb().box)
-            self.cache.store(desired_node, desired_node.parent_id == self.root_id)
             self.__propagate_stretch(desired_node)
         else:
             desired_node.insert_box(new_entry_position, new_entry.get_mbb().box)
             self.tree_handler.update_node(desired_node_id, desired_node)
-            self.cache.store(desired_node, desired_node.parent_id == self.root_id)
             self.__propagate_stretch(desired_node)
+            self.__propagate_count(desired_node_id, 1)
+
+        if self.histogram is not None:
+            self.histogram.add(new_entry.coordinates)
+
+        # every page changed by the insert is written once
+        self.tree_handler.commit()
+
+        # tree grew by a new root or a pinned node got a new child
+        if self.root_id != old_root_id or self.pinned_levels_outdated:
+            self.__pin_top_levels()
 
     def __too_many_deleted_entries(self) -> bool:
         depth = self.tree_handler.tree_depth
@@ -571,7 +1160,7 @@ class RTree:
             self.deleted_db_entries_counter = 0
             self.rebuild()
 
-        response = self.__search_entry_position_parent_position(coordinates)
+        response = self.search_entry_position(coordinates)
         if response is None:
             return False
         entry_position, node_id = response
@@ -595,60 +1184,119 @@ class RTree:
                 raise Exception("Parent_nodes parent id cannot be None")
 
             if parent_node.is_leaf:
-                parent_node.child_nodes.remove(entry_position)
+                parent_node.remove_child(entry_position)
             else:
-                parent_node.child_nodes.remove(node_id)
+                parent_node.remove_child(node_id)
 
             self.tree_handler.update_node(node.parent_id, parent_node)
-            self.cache.store(parent_node, parent_node.parent_id == self.root_id)
+            self.__propagate_count(node.parent_id, -1)
+            if not parent_node.is_leaf and parent_node.id in self.pinned_parent_ids:
+                self.pinned_levels_outdated = True
         else:
-            node.child_nodes.remove(entry_position)
+            node.remove_child(entry_position)
             self.tree_handler.update_node(node_id, node)
-            self.cache.store(node, node.parent_id == self.root_id)
+            self.__propagate_count(node_id, -1)
+        self.tree_handler.commit()
+        if self.pinned_levels_outdated:
+            self.__pin_top_levels()
 
         self.database.mark_to_delete(byte_position=entry_position)
         self.deleted_db_entries_counter += 1
+        if self.histogram is not None:
+            self.histogram.remove(coordinates)
+        if self.hash_index is not None:
+            self.hash_index.remove(coordinates, entry_position)
         return True
 
-    def __rec_rebuild(self, node: RTreeNode, carry: List[int], permanent_cache: bool = False):
-        if node.is_leaf:
-            for entry_position in node.child_nodes:
-                carry.append(entry_position)
+    def __iter_leaves(self) -> Iterator[RTreeNode]:
+        stack = [self.root_id]
+        while stack:
+            node = self.__get_node(stack.pop())
+            if node.is_leaf:
+                yield node
+            else:
+                stack.extend(reversed(node.child_nodes))
+
+    def __iter_leaf_items(self) -> Iterator[LeafItem]:
+        """Yields (coordinates, position) of every entry in the tree, payloads are not unpickled"""
+        for leaf in self.__iter_leaves():
+            for entry_position, entry_coordinates in self.iter_leaf_entries(leaf):
+                yield entry_coordinates, entry_position
+
+    def rebuild(self, method: str = DEFAULT_BULK_LOAD_METHOD):
+        """Packs a new tree from all entries of the current one"""
+        self.__pack(self.__iter_leaf_items(), method)
+
+    def __pack(self, items: Iterable[LeafItem], method: str):
+        """Replaces the tree file by a packed tree built from the given (coordinates, position) items.
+        Items which do not fit into bulk_load_memory are sorted externally in the working directory."""
+        if method not in (BULK_LOAD_STR, BULK_LOAD_HILBERT):
+            raise ValueError(f"Unknown bulk load method: {method}")
+
+        sorter = ExternalSorter(self.working_directory, self.dimensions, self.bulk_load_memory)
+        # items are all entries of the new tree, so the histogram is built again from them,
+        # records of deleted entries stay in the database file
+        histogram = Histogram(self.dimensions)
+        histogram.deleted = self.histogram.deleted if self.histogram is not None else 0
+        items_iter = self.__add_to_histogram(items, histogram)
+        buffered_items = list(islice(items_iter, sorter.run_length + 1))
+
+        if sorter.fits_in_memory(len(buffered_items)):
+            # ordering and packing of large trees is split between processes
+            workers = self.max_threads if len(buffered_items) >= PARALLEL_BULK_LOAD_MIN_ENTRIES else 1
+
+            self.__reset_tree_file()
+            loader = BulkLoader(self.tree_handler, self.dimensions, self.children_per_node, workers,
+                                self.leaf_children_per_node)
+            root_id, depth = loader.load(buffered_items, method)
         else:
-            for child in node.child_nodes:
-                child_node = self.__get_node_fastread(child, permanent_cache)
-                if child_node is None:
-                    raise Exception("Child node cannot be None")
-                self.__rec_rebuild(child_node, carry, permanent_cache=False)
-
-    def rebuild(self):
-        root_node = self.__get_node_fastread(self.root_id, True)
-        if root_node is None:
-            raise Exception("Root node cannot be None")
-
-        all_positions: List[int] = []
-        self.__rec_rebuild(root_node, all_positions, True)
-
-        # remove old tree and build a new one
-        self.tree_handler.file.close()
-        del self.tree_handler
-        os.remove(self.tree_filename)
+            # all items have to be read before the old tree file is removed,
+            # buffer is emptied as it is spilled, so that it is not kept in memory together with the next blocks
+            item_file, box = sorter.spill(chain(ExternalSorter.drain(buffered_items), items_iter))
+
+            ordered_items = BulkLoader.sort_items_external(sorter, item_file, box, self.dimensions,
+                                                           self.leaf_children_per_node, method)
+            self.__reset_tree_file()
+            loader = BulkLoader(self.tree_handler, self.dimensions, self.children_per_node,
+                                leaf_capacity=self.leaf_children_per_node)
+            root_id, depth = loader.pack(ordered_items, item_file.count)
+            item_file.close()
+
+        self.__update_root_id(root_id)
+        self.tree_handler.update_depth(depth)
+        self.histogram = histogram
+        self.__write_header()
+        self.__pin_top_levels()
+
+        # all entries are in new leaves
+        if self.hash_index is not None:
+            self.hash_index.build(self.__iter_index_records(), self.__get_node(self.root_id).get_entry_count())
+
+    def bulk_load(self, entries: Iterable[DatabaseEntry], method: str = DEFAULT_BULK_LOAD_METHOD):
+        """Saves all entries into database and packs the tree bottom-up.
+        Leaves are ordered using Sort-Tile-Recursive (BULK_LOAD_STR) or Hilbert curve (BULK_LOAD_HILBERT).
+        Entries already stored in the tree are packed together with the new ones."""
+        new_items = self.database.create_many(entries)
+        try:
+            self.__pack(chain(self.__iter_leaf_items(), new_items), method)
+        except BaseException:
+            # entries already written to the database are removed by create_many
+            new_items.close()
+            raise
 
-        self.root_id = 0
-        self.tree_handler = TreeFileHandler(filename=self.tree_filename, dimensions=self.dimensions,
-                                            node_size=self.node_size, id_size=self.id_size, tree_depth=0,
-                                            parameters_size=self.parameters_size, root_id=self.root_id,
-                                            unique_sequence=self.unique_sequence, config_hash=self.config_hash)
-        root_node_new = RTreeNode.create_empty_node(self.dimensions, is_leaf=True, parent_id=0)
-        self.root_id = self.tree_handler.create_node(root_node_new)
-        self.__update_root_id(self.root_id)
-
-        # del self.cache
-        self.cache = Cache(node_size=self.node_size, child_size=self.children_per_node, cache_memory=CACHE_MEMORY_SIZE)
-
-        for entry_position in all_positions:
-            entry = self.database.search(entry_position)
-            self.insert_entry(entry, entry_position)
+    @staticmethod
+    def __add_to_histogram(items: Iterable[LeafItem], histogram: Histogram) -> Iterator[LeafItem]:
+        for entry_coordinates, entry_position in items:
+            histogram.add(entry_coordinates)
+            yield entry_coordinates, entry_position
+
+    def import_file(self, filename: str, file_format: Optional[str] = None, scale: Union[int, float] = 1,
+                    method: str = DEFAULT_BULK_LOAD_METHOD) -> int:
+        """Bulk loads records of a JSON (IMPORT_JSON) or CSV (IMPORT_CSV) file, format is given by file extension
+        by default. Values of records are multiplied by scale. Returns number of imported records"""
+        importer = Importer(self.dimensions, scale)
+        self.bulk_load(importer.read_file(filename, file_format), method)
+        return importer.imported_count
 
     def __rec_get_all_nodes(self, node: RTreeNode, depth: int) -> List[Tuple[RTreeNode, int]]:
 
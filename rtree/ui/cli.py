@@ -141,6 +141,7 @@ class CLI:
               "3> Search for Point\n"
               "4> Search for points in Range\n"
               "5> Search for Nearest neighbours\n"
+              "6> Import from JSON or CSV file\n"
               "8> Rebuild Tree\n"
               "9> Delete Tree and Database\n"
               "?> Help\n"
@@ -181,6 +182,10 @@ class CLI:
 
             self.__search_knn()
 
+        elif matches(action, ["i", "6"]):
+
+            self.__import_file()
+
         elif matches(action, ["rt", "8"]):
 
             print(f"This will delete and rebuild '{self.tree_file}'\n"
@@ -226,6 +231,28 @@ class CLI:
         self.tree.insert_entry(entry)
         print(f"\nEntry '{entry.data}' saved, at position {coord}")
 
+    def __import_file(self):
+        print("Set path to the file  [.json or .csv]")
+        while True:
+            file_name = get_input()
+            if os.path.isfile(file_name):
+                break
+            print("File not found, try again")
+
+        print("Multiply values by  [number, 1 for integer values]")
+        while True:
+            try:
+                scale = float(get_input())
+                break
+            except ValueError:
+                print("Try again")
+
+        try:
+            count = self.tree.import_file(file_name, scale=int(scale) if scale.is_integer() else scale)
+            print(f"\n{count} entries imported, tree has been rebuilt")
+        except ValueError as e:
+            print(f"Import failed: {e}")
+
     def __remove_entry(self):
         coord: List[int] = []
         for n in range(self.dimensions):
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import random
+
+import pytest
+
+from rtree.async_rtree import AsyncRTree, ReadWriteLock
+from rtree.data.database_entry import DatabaseEntry
+from rtree.rtree import RTree
+from rtree.default_config import *
+from tests.test_bulk_loader import generate_unique_coordinates, remove_testing_files
+
+
+def get_coordinates_lists(results):
+    return [sorted(entry.coordinates for entry in entries) for entries in results]
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, queries, page_format, hash_index', [
+    (1, 100, 0, 1000, 10, PAGE_FORMAT_BASIC, False),
+    (2, 1000, -500, 500, 30, PAGE_FORMAT_BASIC, False),
+    (2, 1000, -500, 500, 30, PAGE_FORMAT_BASIC, True),
+    (2, 1000, 0, 2000, 30, PAGE_FORMAT_LEAF_COORDINATES | PAGE_FORMAT_CHILD_MBBS, False),
+    (3, 1500, 0, 5000, 20, PAGE_FORMAT_CHILD_MBBS, False),
+])
+def test_async_rtree(dimensions: int, count: int, low: int, high: int, queries: int, page_format: int,
+                     hash_index: bool):
+    random.seed(17)
+    remove_testing_files()
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 page_format=page_format,
+                 hash_index=hash_index,
+                 override_file=True)
+    all_coordinates = generate_unique_coordinates(dimensions, count, low, high)
+    for coordinates in all_coordinates[:count // 2]:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    areas = [([random.randint(low, high) for _ in range(dimensions)],
+              [random.randint(low, high) for _ in range(dimensions)]) for _ in range(queries)]
+    points = [[random.randint(low, high) for _ in range(dimensions)] for _ in range(queries)]
+
+    async def run_queries(async_tree: AsyncRTree):
+        # queries run concurrently with each other
+        area_results = await asyncio.gather(*(async_tree.search_area(*area) for area in areas))
+        assert get_coordinates_lists(area_results) == get_coordinates_lists(tree.search_area_many(areas))
+
+        knn_results = await asyncio.gather(*(async_tree.search_knn(5, point) for point in points))
+        assert [[entry.distance_from(point) for entry in entries] for point, entries in zip(points, knn_results)] \
+               == [[entry.distance_from(point) for entry in tree.search_knn(5, point)] for point in points]
+
+        # inserts and deletes interleaved with queries
+        inserted_coordinates = all_coordinates[count // 2:]
+        deleted_coordinates = all_coordinates[:count // 4]
+        await asyncio.gather(
+            *(async_tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+              for coordinates in inserted_coordinates),
+            *(async_tree.delete_entry(coordinates) for coordinates in deleted_coordinates),
+            *(async_tree.search_area(*area) for area in areas))
+
+        found_entries = await asyncio.gather(*(async_tree.search_entry(coordinates)
+                                               for coordinates in all_coordinates))
+        assert [entry is None for entry in found_entries[:count // 4]] == [True] * (count // 4)
+        assert [entry.data for entry in found_entries[count // 4:]] == all_coordinates[count // 4:]
+
+        area_results = await asyncio.gather(*(async_tree.search_area(*area) for area in areas))
+        assert get_coordinates_lists(area_results) == get_coordinates_lists(tree.search_area_many(areas))
+
+        # nodes are read through the cache of the tree
+        read_count = tree.tree_handler.nodes_read_count
+        await async_tree.search_entry(all_coordinates[-1])
+        assert tree.cache.search(tree.root_id) is not None
+        assert tree.tree_handler.nodes_read_count == read_count
+
+        if hash_index:
+            # point lookups read the hash index instead of the tree
+            tree.cache.clear()
+            assert (await async_tree.search_entry(all_coordinates[-1])).data == all_coordinates[-1]
+            assert tree.tree_handler.nodes_read_count == read_count
+
+        assert await async_tree.search_knn(0, points[0]) == []
+        with pytest.raises(Exception):
+            await async_tree.search_entry(points[0] + [0])
+
+    async def run():
+        async with AsyncRTree(tree, io_threads=4) as async_tree:
+            await run_queries(async_tree)
+
+    asyncio.run(run())
+
+    # facade does not close the tree it did not open, ids of cached nodes are saved
+    assert not tree.closed
+    assert os.path.isfile(tree.cache_filename)
+    assert tree.search_entry(all_coordinates[-1]).data == all_coordinates[-1]
+
+    del tree
+    remove_testing_files()
+
+
+def test_read_write_lock():
+    events = []
+
+    async def reader(lock: ReadWriteLock, name: str):
+        async with lock.read():
+            events.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} end")
+
+    async def writer(lock: ReadWriteLock, name: str):
+        async with lock.write():
+            events.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} end")
+
+    async def run():
+        lock = ReadWriteLock()
+        first_readers = [asyncio.ensure_future(reader(lock, f"reader {i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        # waiting writer blocks readers that come after it
+        await asyncio.gather(writer(lock, "writer"), reader(lock, "reader 2"), *first_readers)
+
+    asyncio.run(run())
+
+    assert events[:2] == ["reader 0 start", "reader 1 start"]
+    assert events[4:] == ["writer start", "writer end", "reader 2 start", "reader 2 end"]
+
+    with pytest.raises(ValueError):
+        AsyncRTree(None, io_threads=0)
@@ -0,0 +1,250 @@
+import os
+import random
+
+import pytest
+
+from rtree.data.bulk_loader import BulkLoader
+from rtree.data.database_entry import DatabaseEntry
+from rtree.rtree import RTree
+from rtree.default_config import *
+from tests.test_rtree import check_entry_counts
+
+
+def remove_testing_files():
+    for file in (TREE_FILE_TEST, DATABASE_FILE_TEST, TREE_FILE_TEST + HISTOGRAM_FILE_SUFFIX,
+                 TREE_FILE_TEST + HASH_INDEX_FILE_SUFFIX, TREE_FILE_TEST + CACHE_FILE_SUFFIX):
+        try:
+            os.remove(TESTING_DIRECTORY + file)
+        except FileNotFoundError:
+            pass
+
+
+def generate_unique_coordinates(dimensions: int, count: int, low: int, high: int):
+    coordinates_all = []
+    for _ in range(dimensions):
+        coords_dim = list(range(low, high))
+        random.shuffle(coords_dim)
+        coordinates_all.append(coords_dim[0:count])
+
+    return [[coordinates_all[d][c] for d in range(dimensions)] for c in range(count)]
+
+
+@pytest.mark.parametrize('count, capacity, level_sizes', [
+    (0, 10, [1]),
+    (1, 10, [1]),
+    (10, 10, [1]),
+    (11, 10, [2, 1]),
+    (100, 10, [10, 1]),
+    (101, 10, [11, 2, 1]),
+    (1000, 50, [20, 1]),
+])
+def test_get_level_sizes(count: int, capacity: int, level_sizes):
+    assert BulkLoader.get_level_sizes(count, capacity) == level_sizes
+
+
+@pytest.mark.parametrize('dimensions, count, capacity', [
+    (1, 100, 10),
+    (2, 1000, 10),
+    (3, 1000, 7),
+    (6, 500, 5),
+])
+def test_str_sort(dimensions: int, count: int, capacity: int):
+    random.seed(3)
+    items = [(coordinates, position) for position, coordinates in
+             enumerate(generate_unique_coordinates(dimensions, count, 0, 2000))]
+
+    ordered = BulkLoader.str_sort(items, dimensions, capacity)
+
+    assert sorted(ordered, key=lambda item: item[1]) == items
+    # leaves of the first slab are sorted by the first dimension against the rest
+    first_slab_max = max(coordinates[0] for coordinates, _ in ordered[:capacity])
+    assert all(coordinates[0] >= first_slab_max for coordinates, _ in ordered[-capacity:])
+
+
+@pytest.mark.parametrize('dimensions, count', [
+    (1, 100),
+    (2, 1000),
+    (3, 1000),
+    (16, 200),
+])
+def test_hilbert_sort(dimensions: int, count: int):
+    random.seed(3)
+    items = [(coordinates, position) for position, coordinates in
+             enumerate(generate_unique_coordinates(dimensions, count, -500, 2000))]
+
+    ordered = BulkLoader.hilbert_sort(items, dimensions)
+
+    assert sorted(ordered, key=lambda item: item[1]) == items
+    if dimensions == 1:
+        assert ordered == sorted(items)
+
+
+@pytest.mark.parametrize('method', [BULK_LOAD_STR, BULK_LOAD_HILBERT])
+@pytest.mark.parametrize('dimensions, count, low, high', [
+    (1, 100, 0, 100),
+    (2, 0, 0, 100),
+    (2, 1, 0, 100),
+    (2, 50, 0, 100),
+    (2, 1000, -1000, 5000),
+    (3, 1000, -1000, 5000),
+    (6, 300, 0, 1000),
+    (16, 300, 0, 1000),
+])
+def test_bulk_load(dimensions: int, count: int, low: int, high: int, method: str):
+    random.seed(1)
+    remove_testing_files()
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 override_file=True)
+
+    all_coordinates = generate_unique_coordinates(dimensions, count, low, high)
+    tree.bulk_load((DatabaseEntry(coordinates=coordinates, data=f"c: {c}")
+                    for c, coordinates in enumerate(all_coordinates)), method=method)
+
+    # every node is written exactly once
+    level_sizes = BulkLoader.get_level_sizes(count, tree.children_per_node)
+    assert tree.tree_handler.nodes_written_count == sum(level_sizes)
+    assert tree.tree_handler.tree_depth == len(level_sizes) - 1
+    assert tree.root_id == sum(level_sizes) - 1
+    assert check_entry_counts(tree, tree.root_id) == count
+
+    for c, coordinates in enumerate(all_coordinates):
+        found_entry = tree.search_entry(coordinates)
+        assert found_entry is not None
+        assert found_entry.data == f"c: {c}"
+
+    coordinates_min = [low] * dimensions
+    coordinates_max = [(low + high) // 2] * dimensions
+    found_coordinates = sorted(entry.coordinates for entry in tree.search_area(coordinates_min, coordinates_max))
+    linear_coordinates = sorted(entry.coordinates for entry in
+                                tree.database.linear_search_area(coordinates_min, coordinates_max))
+    assert found_coordinates == linear_coordinates
+
+    del tree
+    remove_testing_files()
+
+
+@pytest.mark.parametrize('method', [BULK_LOAD_STR, BULK_LOAD_HILBERT])
+@pytest.mark.parametrize('dimensions, inserted_count, loaded_count', [
+    (2, 100, 500),
+    (3, 300, 300),
+])
+def test_bulk_load_insert_delete(dimensions: int, inserted_count: int, loaded_count: int, method: str):
+    random.seed(2)
+    remove_testing_files()
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 override_file=True)
+
+    all_coordinates = generate_unique_coordinates(dimensions, inserted_count + loaded_count, 0, 5000)
+    inserted_coordinates = all_coordinates[:inserted_count // 2]
+    loaded_coordinates = all_coordinates[inserted_count // 2:inserted_count // 2 + loaded_count]
+    later_coordinates = all_coordinates[inserted_count // 2 + loaded_count:]
+
+    # existing entries are packed together with the new ones
+    for coordinates in inserted_coordinates:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+    tree.bulk_load((DatabaseEntry(coordinates=coordinates, data=coordinates) for coordinates in loaded_coordinates),
+                   method=method)
+
+    # packed tree still supports the dynamic operations
+    for coordinates in later_coordinates:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    for coordinates in all_coordinates:
+        found_entry = tree.search_entry(coordinates)
+        assert found_entry is not None
+        assert found_entry.data == coordinates
+
+    for coordinates in all_coordinates:
+        assert tree.delete_entry(coordinates)
+        assert tree.search_entry(coordinates) is None
+
+    del tree
+    remove_testing_files()
+
+
+def test_bulk_load_reopen():
+    random.seed(4)
+    remove_testing_files()
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 override_file=True)
+
+    all_coordinates = generate_unique_coordinates(2, 500, 0, 1000)
+    tree.bulk_load(DatabaseEntry(coordinates=coordinates, data=None) for coordinates in all_coordinates)
+    root_id = tree.root_id
+    del tree
+
+    loaded_tree = RTree(working_directory=TESTING_DIRECTORY,
+                        tree_file=TREE_FILE_TEST,
+                        database_file=DATABASE_FILE_TEST)
+    assert loaded_tree.root_id == root_id
+    for coordinates in all_coordinates:
+        assert loaded_tree.search_entry(coordinates) is not None
+
+    del loaded_tree
+    remove_testing_files()
+
+
+@pytest.mark.parametrize('method', [BULK_LOAD_STR, BULK_LOAD_HILBERT])
+@pytest.mark.parametrize('dimensions, count, node_size, workers', [
+    (2, 1000, 128, 2),
+    (2, 1000, 128, 3),
+    (3, 5000, 256, 4),
+    (2, 30, 128, 4),
+    (1, 3000, 512, 8),
+])
+def test_bulk_load_parallel(monkeypatch, dimensions: int, count: int, node_size: int, workers: int, method: str):
+    random.seed(6)
+    remove_testing_files()
+    monkeypatch.setattr("rtree.rtree.PARALLEL_BULK_LOAD_MIN_ENTRIES", 0)
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 node_size=node_size,
+                 max_threads=workers,
+                 override_file=True)
+
+    all_coordinates = generate_unique_coordinates(dimensions, count, -50000, 50000)
+    tree.bulk_load(DatabaseEntry(coordinates=coordinates, data=c) for c, coordinates in enumerate(all_coordinates))
+
+    # subtrees of the slabs are joined into one balanced tree, every node is written once
+    handler = tree.tree_handler
+    assert handler.nodes_written_count == handler.highest_id + 1
+    assert tree.root_id == handler.highest_id
+
+    leaf_depths = set()
+    stack = [(tree.root_id, 0)]
+    while stack:
+        node_id, depth = stack.pop()
+        node = handler.get_node(node_id)
+        if node.is_leaf:
+            leaf_depths.add(depth)
+            continue
+        for child_id in node.child_nodes:
+            child = handler.get_node(child_id)
+            assert child.parent_id == node_id
+            assert all(node.mbb.box[d].low <= child.mbb.box[d].low and child.mbb.box[d].high <= node.mbb.box[d].high
+                       for d in range(dimensions))
+            stack.append((child_id, depth + 1))
+    assert leaf_depths == {handler.tree_depth}
+    assert check_entry_counts(tree, tree.root_id) == count
+
+    for c, coordinates in enumerate(all_coordinates):
+        found_entry = tree.search_entry(coordinates)
+        assert found_entry is not None
+        assert found_entry.data == c
+
+    del tree
+    remove_testing_files()
@@ -0,0 +1,156 @@
+import os
+import pytest
+
+from rtree.data.cache import Cache
+from rtree.data.mbb import MBB, MBBDim
+from rtree.data.rtree_node import RTreeNode
+from rtree.default_config import *
+
+
+def create_node(node_id: int) -> RTreeNode:
+    return RTreeNode(mbb=MBB((MBBDim(node_id, node_id),)), node_id=node_id, is_leaf=True)
+
+
+def test_cache_lru():
+    cache = Cache(node_size=100, cache_memory=400)
+    assert cache.cache_size == 4
+
+    for node_id in range(4):
+        cache.store(create_node(node_id))
+    assert len(cache) == 4
+
+    # least recently used node is evicted
+    assert cache.search(0).id == 0
+    cache.store(create_node(4))
+    assert cache.search(1) is None
+    assert [cache.search(node_id).id for node_id in (0, 2, 3, 4)] == [0, 2, 3, 4]
+
+    # written node is invalidated
+    cache.invalidate(2)
+    assert cache.search(2) is None
+    assert len(cache) == 3
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.search(0) is None
+
+
+def test_cache_pinned():
+    cache = Cache(node_size=100, cache_memory=400)
+    for node_id in range(4):
+        cache.store(create_node(node_id))
+
+    # cached nodes become pinned, pinned nodes are not evicted
+    cache.pin([3, 10])
+    assert cache.get_pinned_ids() == [3, 10]
+    assert cache.search(10) is None
+    cache.store(create_node(10))
+    for node_id in range(20, 30):
+        cache.store(create_node(node_id))
+    assert cache.search(3).id == 3
+    assert cache.search(10).id == 10
+    assert cache.search(0) is None
+    assert len(cache) == 4
+
+    # invalidated pinned node stays pinned
+    cache.invalidate(3)
+    assert cache.search(3) is None
+    assert cache.get_pinned_ids() == [3, 10]
+    cache.store(create_node(3))
+    assert cache.search(3).id == 3
+
+    # only nodes fitting into the cache are pinned, unpinned nodes can be evicted
+    cache.pin(range(100, 110))
+    assert cache.get_pinned_ids() == [100, 101, 102, 103]
+    cache.store(create_node(50))
+    assert cache.search(50) is None
+    assert cache.search(3) is None
+
+    # cache without memory does not store anything
+    cache = Cache(node_size=100, cache_memory=0)
+    cache.pin([0])
+    cache.store(create_node(1))
+    assert cache.get_pinned_ids() == []
+    assert len(cache) == 0
+
+
+def test_cache_statistics():
+    cache = Cache(node_size=100, cache_memory=300)
+    cache.start_recording()
+
+    for node_id in (0, 1, 2, 0, 3, 1):
+        if cache.search(node_id) is None:
+            cache.store(create_node(node_id))
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 5, 2)
+    assert cache.hit_ratio == 1 / 6
+    assert cache.resident_bytes == 300
+
+    assert cache.stop_recording() == [0, 1, 2, 0, 3, 1]
+    cache.search(0)
+    assert cache.stop_recording() == []
+
+    cache.reset_statistics()
+    assert (cache.hits, cache.misses, cache.evictions) == (0, 0, 0)
+    assert cache.hit_ratio == 0.0
+
+
+def test_cache_2q():
+    cache = Cache(node_size=100, cache_memory=800, policy=CACHE_POLICY_2Q)
+
+    # nodes read twice get into the LRU part
+    for node_id in (0, 1, 2, 3):
+        cache.store(create_node(node_id))
+    for node_id in range(10, 18):
+        cache.store(create_node(node_id))
+    assert len(cache) == 8
+    assert [cache.search(node_id) for node_id in (0, 1, 2, 3)] == [None] * 4
+    for node_id in (0, 1):
+        cache.store(create_node(node_id))
+
+    # scan evicts only nodes read once
+    for node_id in range(100, 200):
+        if cache.search(node_id) is None:
+            cache.store(create_node(node_id))
+    assert cache.search(0).id == 0
+    assert cache.search(1).id == 1
+    assert len(cache) == 8
+
+    cache.invalidate(0)
+    assert cache.search(0) is None
+    cache.clear()
+    assert len(cache) == 0
+
+    with pytest.raises(ValueError):
+        Cache(node_size=100, cache_memory=800, policy="fifo")
+
+
+def test_cache_preloaded():
+    cache = Cache(node_size=100, cache_memory=400)
+    cache.pin([0])
+    cache.store(create_node(1))
+
+    # nodes invalidated while the chunk was read are skipped, the rest of the chunk is stored
+    cache.start_preload()
+    cache.invalidate(2)
+    assert cache.store_preloaded([create_node(node_id) for node_id in (0, 1, 2)]) == 1
+    assert cache.get_resident_ids() == [0, 1]
+
+    # nothing is stored without start_preload or after the cache was cleared
+    assert cache.store_preloaded([create_node(2)]) == 0
+    cache.start_preload()
+    cache.clear()
+    cache.pin([0])
+    cache.store(create_node(1))
+    assert cache.store_preloaded([create_node(2)]) == 0
+
+    cache.start_preload()
+    assert cache.store_preloaded([create_node(node_id) for node_id in (0, 2, 3)]) == 3
+    assert cache.get_resident_ids() == [0, 1, 2, 3]
+
+    # saved ids belong to one tree
+    filename = TESTING_DIRECTORY + TREE_FILE_TEST + CACHE_FILE_SUFFIX
+    Cache.save_ids(filename, DEMO_UNIQUE_SEQUENCE, cache.get_resident_ids())
+    assert Cache.load_ids(filename, DEMO_UNIQUE_SEQUENCE) == [0, 1, 2, 3]
+    assert Cache.load_ids(filename, DEMO_CONFIG_HASH) == []
+    os.remove(filename)
+    assert Cache.load_ids(filename, DEMO_UNIQUE_SEQUENCE) == []
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from rtree.data.cache import Cache
+from rtree.data.cache_simulator import CacheSimulator
+from rtree.data.mbb import MBB, MBBDim
+from rtree.data.rtree_node import RTreeNode
+
+
+def replay(accesses, cache_memory: int, pinned_ids) -> int:
+    cache = Cache(node_size=100, cache_memory=cache_memory)
+    cache.pin(pinned_ids)
+    for node_id in accesses:
+        if cache.search(node_id) is None:
+            cache.store(RTreeNode(mbb=MBB((MBBDim(0, 0),)), node_id=node_id, is_leaf=True))
+    return cache.misses
+
+
+@pytest.mark.parametrize('count, nodes, pinned_count', [
+    (0, 10, 0),
+    (500, 10, 0),
+    (2000, 100, 0),
+    (2000, 300, 5),
+])
+def test_cache_simulator(count: int, nodes: int, pinned_count: int):
+    random.seed(23)
+    # skewed accesses, as the top of the tree is read by most queries
+    accesses = [min(int(random.expovariate(10 / nodes)), nodes) for _ in range(count)]
+    pinned_ids = list(range(pinned_count))
+
+    simulator = CacheSimulator(accesses, node_size=100, pinned_ids=pinned_ids)
+    cache_memories = [0, 100, 300, 1000, 5000, 20000, 100000]
+    for cache_memory in cache_memories:
+        assert simulator.misses(cache_memory) == replay(accesses, cache_memory, pinned_ids)
+
+    report = simulator.report(cache_memories)
+    assert [cache_memory for cache_memory, _ in report] == cache_memories
+    ratios = [ratio for _, ratio in report]
+    assert ratios == sorted(ratios, reverse=True) or pinned_count > 0
+    if count:
+        assert ratios[0] == 1.0
+        assert ratios[-1] == len(set(accesses)) / count
+
+
+def test_stack_distances():
+    distance_counts, cold_misses = CacheSimulator.get_stack_distances([1, 2, 1, 3, 2, 2, 1])
+    assert cold_misses == 3
+    # 1 after 2; 2 after 1, 3; 2 after nothing; 1 after 3, 2
+    assert distance_counts == [1, 1, 2]
@@ -171,3 +171,41 @@ def test_rtree_create_entry_read_lin(dimensions: int, count: int, low: int, high
 
     del database
     os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+
+
+@pytest.mark.parametrize('dimensions, count, cache_memory', [
+    (1, 100, 0),
+    (2, 300, 2000),
+    (3, 300, 1024 * 1024),
+])
+def test_database_entry_cache(dimensions: int, count: int, cache_memory: int):
+    random.seed(22)
+    try:
+        os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    except FileNotFoundError:
+        pass
+
+    database = Database(filename=TESTING_DIRECTORY + DATABASE_FILE_TEST, dimensions=dimensions,
+                        entry_cache_memory=cache_memory)
+    positions = [database.create(DatabaseEntry(coordinates=[random.randint(-100, 100) for _ in range(dimensions)],
+                                               data={'c': c})) for c in range(count)]
+
+    # repeated reads are answered from the cache while the entries fit
+    for _ in range(2):
+        for c, position in enumerate(positions[:20]):
+            assert database.search(position).data == {'c': c}
+    assert database.entry_cache.misses == 20 if cache_memory >= 2000 else 40
+    assert database.entry_cache.hits == 40 - database.entry_cache.misses
+    assert database.entry_cache.memory_used <= cache_memory
+
+    # changes of coordinates of returned entries do not change the cached ones
+    database.search(positions[0]).coordinates.append(0)
+    assert len(database.search(positions[0]).coordinates) == dimensions
+
+    # deleted entry is read again
+    database.mark_to_delete(positions[1])
+    assert not database.search(positions[1]).is_present
+    assert [entry.data['c'] for entry in database.search_many(positions)] == list(range(count))
+
+    del database
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
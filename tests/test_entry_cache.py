@@ -0,0 +1,40 @@
+from rtree.data.database_entry import DatabaseEntry
+from rtree.data.entry_cache import EntryCache
+
+
+def test_entry_cache():
+    cache = EntryCache(cache_memory=100)
+
+    for position in range(0, 100, 20):
+        cache.store(position, DatabaseEntry([position], data=str(position)), 20)
+    assert len(cache) == 5
+    assert cache.memory_used == 100
+
+    # least recently used entry is evicted
+    assert cache.search(0).data == "0"
+    cache.store(100, DatabaseEntry([100], data="100"), 30)
+    assert cache.search(20) is None
+    assert cache.search(40) is None
+    assert [cache.search(position).data for position in (0, 60, 80, 100)] == ["0", "60", "80", "100"]
+    assert cache.memory_used == 90
+    assert (cache.hits, cache.misses) == (5, 2)
+
+    # returned entries are copies, their data included
+    cache.search(0).coordinates.append(1)
+    assert cache.search(0).coordinates == [0]
+    cache.store(60, DatabaseEntry([60], data={"values": [60]}), 20)
+    cache.search(60).data["values"].append(61)
+    assert cache.search(60).data == {"values": [60]}
+
+    cache.invalidate(0)
+    assert cache.search(0) is None
+    assert cache.memory_used == 70
+
+    # entry larger than the cache is not stored
+    cache.store(200, DatabaseEntry([200]), 101)
+    assert cache.search(200) is None
+    assert len(cache) == 3
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.memory_used == 0
@@ -0,0 +1,128 @@
+import os
+import random
+
+import pytest
+
+from rtree.data.bulk_loader import BulkLoader
+from rtree.data.database_entry import DatabaseEntry
+from rtree.data.external_sorter import ExternalSorter, ItemFile
+from rtree.rtree import RTree
+from rtree.default_config import *
+from tests.test_bulk_loader import generate_unique_coordinates, remove_testing_files
+
+
+def generate_items(dimensions: int, count: int):
+    return [(coordinates, position) for position, coordinates in
+            enumerate(generate_unique_coordinates(dimensions, count, -5000, 5000))]
+
+
+@pytest.mark.parametrize('dimensions, count', [
+    (1, 100),
+    (3, 1000),
+])
+def test_item_file(dimensions: int, count: int):
+    random.seed(7)
+    items = generate_items(dimensions, count)
+
+    item_file = ItemFile(TESTING_DIRECTORY, dimensions)
+    item_file.write(items)
+    assert item_file.count == count
+    assert list(item_file.read(7)) == items
+    # file can be read repeatedly
+    assert list(item_file.read(count)) == items
+    item_file.close()
+
+
+@pytest.mark.parametrize('dimensions, count, memory_size', [
+    (2, 0, 1000),
+    (2, 10, 100000),
+    (2, 1000, 5000),
+    (3, 3000, 20000),
+])
+def test_sort(dimensions: int, count: int, memory_size: int):
+    random.seed(8)
+    items = generate_items(dimensions, count)
+    sorter = ExternalSorter(TESTING_DIRECTORY, dimensions, memory_size)
+
+    for dim in range(dimensions):
+        assert list(sorter.sort(iter(items), key=lambda item: item[0][dim])) == \
+               sorted(items, key=lambda item: item[0][dim])
+
+
+def test_split_and_drain():
+    sorter = ExternalSorter(TESTING_DIRECTORY, 3, 30000)
+    # nested sorts share the memory budget
+    assert sorter.split(3).memory_size == 10000
+    assert sorter.split(3).run_length <= sorter.run_length // 3 + 1
+
+    items = generate_items(2, 10)
+    buffer = list(items)
+    drained = ExternalSorter.drain(buffer)
+    assert next(drained) == items[0]
+    assert len(buffer) == 9
+    assert list(drained) == items[1:]
+    assert buffer == []
+
+
+@pytest.mark.parametrize('dimensions, count, capacity, memory_size', [
+    (2, 1000, 10, 5000),
+    (3, 3000, 7, 20000),
+    (4, 2000, 5, 10000),
+])
+def test_sort_items_external(dimensions: int, count: int, capacity: int, memory_size: int):
+    random.seed(9)
+    items = generate_items(dimensions, count)
+    sorter = ExternalSorter(TESTING_DIRECTORY, dimensions, memory_size)
+    assert not sorter.fits_in_memory(count)
+
+    item_file, box = sorter.spill(iter(items))
+    assert item_file.count == count
+    assert box == BulkLoader.get_items_box(coordinates for coordinates, _ in items)
+
+    # items sorted on disk are in the same order as the ones sorted in memory
+    assert list(BulkLoader.sort_items_external(sorter, item_file, box, dimensions, capacity, BULK_LOAD_STR)) == \
+           BulkLoader.str_sort(items, dimensions, capacity)
+    assert list(BulkLoader.sort_items_external(sorter, item_file, box, dimensions, capacity,
+                                               BULK_LOAD_HILBERT)) == \
+           BulkLoader.hilbert_sort(items, dimensions)
+    item_file.close()
+
+
+@pytest.mark.parametrize('method', [BULK_LOAD_STR, BULK_LOAD_HILBERT])
+@pytest.mark.parametrize('dimensions, count', [
+    (2, 2000),
+    (3, 1000),
+])
+def test_bulk_load_external(dimensions: int, count: int, method: str):
+    random.seed(10)
+    remove_testing_files()
+    temporary_files = set(os.listdir(TESTING_DIRECTORY))
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 bulk_load_memory=10000,
+                 override_file=True)
+
+    all_coordinates = generate_unique_coordinates(dimensions, count, 0, 5000)
+    tree.bulk_load((DatabaseEntry(coordinates=coordinates, data=c) for c, coordinates in enumerate(all_coordinates)),
+                   method=method)
+
+    level_sizes = BulkLoader.get_level_sizes(count, tree.children_per_node)
+    assert tree.tree_handler.nodes_written_count == sum(level_sizes)
+    assert tree.root_id == sum(level_sizes) - 1
+
+    for c, coordinates in enumerate(all_coordinates):
+        found_entry = tree.search_entry(coordinates)
+        assert found_entry is not None
+        assert found_entry.data == c
+
+    # packing existing entries again goes through the same path
+    tree.rebuild(method)
+    for coordinates in all_coordinates:
+        assert tree.search_entry(coordinates) is not None
+
+    del tree
+    remove_testing_files()
+    assert set(os.listdir(TESTING_DIRECTORY)) == temporary_files
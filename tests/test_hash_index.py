@@ -0,0 +1,83 @@
+import os
+import random
+
+import pytest
+
+from rtree.data.hash_index import HashIndex
+from rtree.default_config import *
+
+HASH_INDEX_FILE_TEST = TESTING_DIRECTORY + TREE_FILE_TEST + HASH_INDEX_FILE_SUFFIX
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, page_size', [
+    (1, 100, 0, 50, 64),
+    (2, 3000, -1000, 1000, 256),
+    (3, 2000, 0, 100000, HASH_INDEX_PAGE_SIZE),
+])
+def test_hash_index(dimensions: int, count: int, low: int, high: int, page_size: int):
+    random.seed(19)
+    try:
+        os.remove(HASH_INDEX_FILE_TEST)
+    except FileNotFoundError:
+        pass
+
+    index = HashIndex(HASH_INDEX_FILE_TEST, dimensions, PARAMETER_RECORD_SIZE, NODE_ID_SIZE, DEMO_UNIQUE_SEQUENCE,
+                      page_size=page_size)
+    records = [([random.randint(low, high) for _ in range(dimensions)], position, position % 7)
+               for position in range(count)]
+    for coordinates, position, leaf_id in records:
+        index.insert(coordinates, position, leaf_id)
+
+    assert index.entry_count == count
+    assert index.bucket_count > HASH_INDEX_MIN_BUCKETS or count < index.records_per_page * HASH_INDEX_MIN_BUCKETS
+    assert sorted(index.iter_records()) == sorted(records)
+
+    def expected(coordinates):
+        return sorted((position, leaf_id) for record_coordinates, position, leaf_id in records
+                      if record_coordinates == coordinates)
+
+    for coordinates, _, _ in records[:100]:
+        assert sorted(index.search(coordinates)) == expected(coordinates)
+    assert index.search([high + 1] * dimensions) == []
+
+    # removed and moved entries
+    for coordinates, position, leaf_id in records[:count // 2]:
+        assert index.remove(coordinates, position)
+    assert not index.remove(records[0][0], records[0][1])
+    for coordinates, position, leaf_id in records[count // 2:count * 3 // 4]:
+        assert index.update_leaf(coordinates, position, leaf_id + 100)
+    moved_records = [(coordinates, position, leaf_id + 100)
+                     for coordinates, position, leaf_id in records[count // 2:count * 3 // 4]]
+    records = moved_records + records[count * 3 // 4:]
+    assert index.entry_count == len(records)
+
+    # index is persistent
+    del index
+    index = HashIndex(HASH_INDEX_FILE_TEST, dimensions, PARAMETER_RECORD_SIZE, NODE_ID_SIZE, DEMO_UNIQUE_SEQUENCE,
+                      read_only=True, page_size=page_size)
+    assert index.entry_count == len(records)
+    assert sorted(index.iter_records()) == sorted(records)
+    # only the bucket of the coordinates is read
+    pages_read_count = index.pages_read_count
+    for coordinates, _, _ in records[:100]:
+        assert sorted(index.search(coordinates)) == expected(coordinates)
+    assert index.pages_read_count - pages_read_count <= 100 * 3
+    with pytest.raises(IOError):
+        index.insert(records[0][0], count, 0)
+
+    # index of another tree is replaced by an empty one
+    del index
+    index = HashIndex(HASH_INDEX_FILE_TEST, dimensions, PARAMETER_RECORD_SIZE, NODE_ID_SIZE, DEMO_CONFIG_HASH,
+                      page_size=page_size)
+    assert index.entry_count == 0
+    assert index.search(records[0][0]) == []
+
+    index.build(iter(records), len(records))
+    assert sorted(index.iter_records()) == sorted(records)
+
+    del index
+    os.remove(HASH_INDEX_FILE_TEST)
+
+    with pytest.raises(ValueError):
+        HashIndex(HASH_INDEX_FILE_TEST, dimensions, PARAMETER_RECORD_SIZE, NODE_ID_SIZE, DEMO_UNIQUE_SEQUENCE,
+                  page_size=16)
@@ -0,0 +1,26 @@
+import itertools
+
+import pytest
+
+from rtree.data.hilbert_curve import HilbertCurve
+
+
+@pytest.mark.parametrize('dimensions, order', [
+    (1, 4),
+    (2, 1),
+    (2, 3),
+    (3, 2),
+    (4, 2),
+    (16, 1),
+])
+def test_hilbert_curve_walk(dimensions: int, order: int):
+    points = {}
+    for point in itertools.product(range(2 ** order), repeat=dimensions):
+        points[HilbertCurve.get_index(list(point), order)] = point
+
+    # every cell of the grid is visited exactly once
+    assert sorted(points.keys()) == list(range(2 ** (order * dimensions)))
+
+    # consecutive cells on the curve are neighbours
+    for index in range(len(points) - 1):
+        assert sum(abs(a - b) for a, b in zip(points[index], points[index + 1])) == 1
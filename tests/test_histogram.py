@@ -0,0 +1,63 @@
+import os
+import random
+
+import pytest
+
+from rtree.data.histogram import Histogram
+from rtree.default_config import *
+
+HISTOGRAM_FILE_TEST = TESTING_DIRECTORY + TREE_FILE_TEST + HISTOGRAM_FILE_SUFFIX
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, buckets', [
+    (1, 100, 0, 100, 8),
+    (2, 1000, -500, 500, 16),
+    (3, 2000, -100000, 100000, 64),
+])
+def test_histogram(dimensions: int, count: int, low: int, high: int, buckets: int):
+    random.seed(18)
+    all_coordinates = [[random.randint(low, high) for _ in range(dimensions)] for _ in range(count)]
+
+    histogram = Histogram(dimensions, buckets)
+    for coordinates in all_coordinates:
+        histogram.add(coordinates)
+
+    assert histogram.total == count
+    for dim in range(dimensions):
+        assert sum(histogram.counts[dim]) == count
+        assert histogram.lows[dim] <= min(coordinates[dim] for coordinates in all_coordinates)
+        assert histogram.lows[dim] + histogram.widths[dim] * buckets > max(coordinates[dim]
+                                                                           for coordinates in all_coordinates)
+
+    # range covered by buckets and empty range are estimated exactly
+    covered_min = histogram.lows
+    covered_max = [histogram.lows[dim] + histogram.widths[dim] * buckets - 1 for dim in range(dimensions)]
+    assert histogram.estimate_count(covered_min, covered_max) == pytest.approx(count)
+    assert histogram.estimate_count([value + 1 for value in covered_max], [value * 2 + 1 for value in covered_max]) == 0
+
+    # uniform data are estimated within a few percent of all entries
+    middle = (low + high) // 2
+    inside = sum(all(coordinate <= middle for coordinate in coordinates) for coordinates in all_coordinates)
+    assert abs(histogram.estimate_count([middle] * dimensions, [low] * dimensions) - inside) <= count * 0.1
+
+    for coordinates in all_coordinates[:count // 2]:
+        histogram.remove(coordinates)
+    assert histogram.total == count - count // 2
+    assert histogram.deleted == count // 2
+    assert histogram.estimate_count(covered_min, covered_max) == pytest.approx(count - count // 2)
+
+    histogram.save(HISTOGRAM_FILE_TEST, DEMO_UNIQUE_SEQUENCE)
+    loaded_histogram = Histogram.load(HISTOGRAM_FILE_TEST, dimensions, DEMO_UNIQUE_SEQUENCE)
+    assert loaded_histogram.__dict__ == histogram.__dict__
+    assert Histogram.load(HISTOGRAM_FILE_TEST, dimensions, DEMO_CONFIG_HASH) is None
+    assert Histogram.load(HISTOGRAM_FILE_TEST, dimensions + 1, DEMO_UNIQUE_SEQUENCE) is None
+
+    os.remove(HISTOGRAM_FILE_TEST)
+    assert Histogram.load(HISTOGRAM_FILE_TEST, dimensions, DEMO_UNIQUE_SEQUENCE) is None
+
+
+def test_histogram_invalid():
+    with pytest.raises(ValueError):
+        Histogram(2, 3)
+    with pytest.raises(ValueError):
+        Histogram(2, 0)
@@ -0,0 +1,184 @@
+import io
+import json
+import os
+import random
+
+import pytest
+
+from rtree.data.database import Database
+from rtree.data.database_entry import DatabaseEntry
+from rtree.data.importer import Importer, JsonRecordReader
+from rtree.rtree import RTree
+from rtree.default_config import *
+from tests.test_bulk_loader import generate_unique_coordinates, remove_testing_files
+
+IMPORT_FILE_TEST = "test_import"
+
+
+def generate_document(dimensions: int, count: int):
+    return {
+        "dimensions": dimensions,
+        "labels": [f"l{d}" for d in range(dimensions)],
+        "data": [{"name": f"Record {c}", "values": coordinates} for c, coordinates in
+                 enumerate(generate_unique_coordinates(dimensions, count, -1000, 1000))],
+    }
+
+
+@pytest.mark.parametrize('dimensions, count, buffer_size, indent', [
+    (2, 0, 16, None),
+    (2, 1, 16, None),
+    (2, 100, 7, 2),
+    (3, 500, 1, None),
+    (5, 500, 1024, 4),
+])
+def test_json_record_reader(dimensions: int, count: int, buffer_size: int, indent):
+    random.seed(11)
+    document = generate_document(dimensions, count)
+
+    reader = JsonRecordReader(io.StringIO(json.dumps(document, indent=indent)), buffer_size)
+    assert list(reader.read()) == document["data"]
+    assert reader.header == {"dimensions": dimensions, "labels": document["labels"]}
+
+
+def test_json_record_reader_sample():
+    with open("sample/basic.json") as file:
+        reader = JsonRecordReader(file, 8)
+        assert [record["values"] for record in reader.read()] == [[14.5, 47], [15, 24]]
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    '{"data": [{"values": [1, 2]}',
+    '{"data": [{"values": [1, 2]} {"values": [3, 4]}]}',
+    '[]',
+])
+def test_json_record_reader_invalid(text: str):
+    with pytest.raises(ValueError):
+        list(JsonRecordReader(io.StringIO(text), 4).read())
+
+
+@pytest.mark.parametrize('value, scale, coordinate', [
+    (5, 1, 5),
+    ("-12", 1, -12),
+    (14.5, 1, 14),
+    ("2.25", 100, 225),
+    (-1.5, 10, -15),
+])
+def test_to_coordinate(value, scale, coordinate: int):
+    assert Importer.to_coordinate(value, scale) == coordinate
+
+
+def test_read_csv():
+    text = "x,y,name\n1,2,first\n-3,4.6,second\n"
+    entries = list(Importer(2).read_csv(io.StringIO(text)))
+    assert [entry.coordinates for entry in entries] == [[1, 2], [-3, 5]]
+    assert entries[1].data == {"x": "-3", "y": "4.6", "name": "second"}
+
+    entries = list(Importer(1, scale=10).read_csv(io.StringIO(text), coordinate_columns=["y"]))
+    assert [entry.coordinates for entry in entries] == [[20], [46]]
+
+    with pytest.raises(ValueError):
+        list(Importer(3).read_csv(io.StringIO("x,y\n1,2\n")))
+
+
+@pytest.mark.parametrize('count, buffer_size', [
+    (0, 10),
+    (100, 1),
+    (500, 1000),
+])
+def test_database_create_many(count: int, buffer_size: int):
+    random.seed(12)
+    remove_testing_files()
+    database = Database(filename=TESTING_DIRECTORY + DATABASE_FILE_TEST, dimensions=3)
+
+    all_coordinates = generate_unique_coordinates(3, count, -1000, 1000)
+    first_position = database.create(DatabaseEntry(coordinates=[0, 0, 0], data="first"))
+    created = list(database.create_many((DatabaseEntry(coordinates=coordinates, data=c)
+                                         for c, coordinates in enumerate(all_coordinates)), buffer_size))
+    last_position = database.create(DatabaseEntry(coordinates=[1, 1, 1], data="last"))
+
+    assert [coordinates for coordinates, _ in created] == all_coordinates
+    for c, (coordinates, position) in enumerate(created):
+        found_entry = database.search(position)
+        assert found_entry.coordinates == coordinates
+        assert found_entry.data == c
+    assert database.search(first_position).data == "first"
+    assert database.search(last_position).data == "last"
+
+    del database
+    remove_testing_files()
+
+
+@pytest.mark.parametrize('file_format', [IMPORT_JSON, IMPORT_CSV])
+@pytest.mark.parametrize('dimensions, count', [
+    (2, 1000),
+    (4, 300),
+])
+def test_import_file(dimensions: int, count: int, file_format: str):
+    random.seed(13)
+    remove_testing_files()
+    import_file = TESTING_DIRECTORY + IMPORT_FILE_TEST + "." + file_format
+
+    document = generate_document(dimensions, count)
+    with open(import_file, 'w') as file:
+        if file_format == IMPORT_JSON:
+            json.dump(document, file)
+        else:
+            file.write(",".join(document["labels"] + ["name"]) + "\n")
+            for record in document["data"]:
+                file.write(",".join([str(value) for value in record["values"]] + [record["name"]]) + "\n")
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 override_file=True)
+    assert tree.import_file(import_file) == count
+
+    for record in document["data"]:
+        found_entry = tree.search_entry(record["values"])
+        assert found_entry is not None
+        assert found_entry.data["name"] == record["name"]
+
+    del tree
+    os.remove(import_file)
+    remove_testing_files()
+
+
+@pytest.mark.parametrize('buffer_size', [1, DATABASE_WRITE_BUFFER_SIZE])
+def test_import_file_invalid(monkeypatch, buffer_size: int):
+    remove_testing_files()
+    monkeypatch.setattr("rtree.data.database.DATABASE_WRITE_BUFFER_SIZE", buffer_size)
+    import_file = TESTING_DIRECTORY + IMPORT_FILE_TEST + "." + IMPORT_JSON
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=2,
+                 override_file=True)
+    for c in range(20):
+        tree.insert_entry(DatabaseEntry(coordinates=[c, c], data=c))
+    database_size = os.path.getsize(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+
+    # second record has wrong dimension, nothing of the import is kept
+    with open(import_file, 'w') as file:
+        json.dump({"dimensions": 2, "data": [{"name": "a", "values": [500, 500]}, {"name": "b", "values": [1]}]},
+                  file)
+    with pytest.raises(ValueError):
+        tree.import_file(import_file)
+
+    assert os.path.getsize(TESTING_DIRECTORY + DATABASE_FILE_TEST) == database_size
+    assert tree.explain_area([-1000, -1000], [1000, 1000]).estimated_count == 20
+    for plan in (PLAN_TREE, PLAN_SCAN, PLAN_AUTO):
+        assert len(tree.search_area([-1000, -1000], [1000, 1000], plan=plan)) == 20
+        assert tree.search_knn(1, [500, 500], plan=plan)[0].coordinates == [19, 19]
+
+    # import of valid file works afterwards
+    with open(import_file, 'w') as file:
+        json.dump({"dimensions": 2, "data": [{"name": "a", "values": [500, 500]}]}, file)
+    assert tree.import_file(import_file) == 1
+    assert len(tree.search_area([-1000, -1000], [1000, 1000], plan=PLAN_SCAN)) == 21
+
+    del tree
+    os.remove(import_file)
+    remove_testing_files()
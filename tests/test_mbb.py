@@ -83,3 +83,35 @@ def test_mbb_insert(mbb_old, box_new, mbb_new):
     assert mbb_old == mbb_new
     mbb_new.insert_mbb(new_mbb=box_new)
     assert mbb_old == mbb_new
+
+
+@pytest.mark.parametrize('box, coordinates, distance', [
+    ((MBBDim(0, 10), MBBDim(0, 10)), [5, 5], 0),
+    ((MBBDim(0, 10), MBBDim(0, 10)), [10, 0], 0),
+    ((MBBDim(0, 10), MBBDim(0, 10)), [13, 5], 3),
+    ((MBBDim(0, 10), MBBDim(0, 10)), [-3, 14], 5),
+    ((MBBDim(2, 2),), [-1], 3),
+])
+def test_mbb_min_distance(box, coordinates, distance):
+    assert MBB(box).min_distance(coordinates) == distance
+
+
+@pytest.mark.parametrize('box, coordinates, inside', [
+    ((MBBDim(0, 10), MBBDim(0, 10)), [5, 5], True),
+    ((MBBDim(0, 10), MBBDim(0, 10)), [10, 0], True),
+    ((MBBDim(0, 10), MBBDim(0, 10)), [11, 5], False),
+    ((MBBDim(2, 2),), [2], True),
+    ((MBBDim(2, 2),), [1], False),
+])
+def test_mbb_contains_point(box, coordinates, inside):
+    assert MBB(box).contains_point(coordinates) == inside
+
+
+@pytest.mark.parametrize('box1, box2, distance', [
+    ((MBBDim(0, 10), MBBDim(0, 10)), (MBBDim(5, 15), MBBDim(5, 15)), 0),
+    ((MBBDim(0, 10), MBBDim(0, 10)), (MBBDim(13, 15), MBBDim(14, 20)), 5),
+    ((MBBDim(0, 10),), (MBBDim(-5, -2),), 2),
+])
+def test_mbb_min_distance_from_mbb(box1, box2, distance):
+    assert MBB(box1).min_distance_from_mbb(MBB(box2)) == distance
+    assert MBB(box2).min_distance_from_mbb(MBB(box1)) == distance
@@ -0,0 +1,106 @@
+import os
+import random
+
+import pytest
+
+from rtree.data.database_entry import DatabaseEntry
+from rtree.query_executor import QueryExecutor
+from rtree.rtree import RTree
+from rtree.default_config import *
+from tests.test_bulk_loader import generate_unique_coordinates, remove_testing_files
+
+
+def get_coordinates_lists(results):
+    return [sorted(entry.coordinates for entry in entries) for entries in results]
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, queries, workers, chunk_size', [
+    (1, 100, 0, 1000, 10, 1, None),
+    (2, 1000, -500, 500, 40, 2, None),
+    (3, 2000, 0, 5000, 25, 3, 4),
+])
+def test_query_executor(dimensions: int, count: int, low: int, high: int, queries: int, workers: int,
+                        chunk_size: int):
+    random.seed(22)
+    remove_testing_files()
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 override_file=True)
+    all_coordinates = generate_unique_coordinates(dimensions, count, low, high)
+    for coordinates in all_coordinates[:count // 2]:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    areas = [([random.randint(low, high) for _ in range(dimensions)],
+              [random.randint(low, high) for _ in range(dimensions)]) for _ in range(queries)]
+    points = [[random.randint(low, high) for _ in range(dimensions)] for _ in range(queries)]
+
+    with QueryExecutor(tree, workers, chunk_size) as executor:
+        assert get_coordinates_lists(executor.search_area_many(areas)) == \
+               get_coordinates_lists(tree.search_area_many(areas))
+        assert [[entry.distance_from(point) for entry in entries]
+                for point, entries in zip(points, executor.search_knn_many(5, points))] == \
+               [[entry.distance_from(point) for entry in tree.search_knn(5, point)] for point in points]
+
+        # workers see entries added after the previous batch
+        tree.bulk_load(DatabaseEntry(coordinates=coordinates, data=coordinates)
+                       for coordinates in all_coordinates[count // 2:])
+        found_entries = executor.search_entry_many(all_coordinates + points)
+        assert [entry.data for entry in found_entries[:count]] == all_coordinates
+        assert [entry is None for entry in found_entries[count:]] == \
+               [tree.search_entry(point) is None for point in points]
+        assert get_coordinates_lists(executor.search_area_many(areas)) == \
+               get_coordinates_lists(tree.search_area_many(areas))
+
+        assert executor.search_area_many([]) == []
+
+    # executor does not close the tree it did not open, ids of cached nodes are saved
+    assert not tree.closed
+    assert os.path.isfile(tree.cache_filename)
+    assert tree.search_entry(all_coordinates[0]).data == all_coordinates[0]
+
+    del tree
+    remove_testing_files()
+
+
+def test_read_only_tree(monkeypatch, tmp_path):
+    remove_testing_files()
+
+    with pytest.raises(Exception):
+        RTree(working_directory=TESTING_DIRECTORY, tree_file=TREE_FILE_TEST, database_file=DATABASE_FILE_TEST,
+              read_only=True)
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 override_file=True)
+    tree.insert_entry(DatabaseEntry(coordinates=[1, 2], data="first"))
+    tree.flush()
+
+    read_only_tree = RTree(working_directory=TESTING_DIRECTORY, tree_file=TREE_FILE_TEST,
+                           database_file=DATABASE_FILE_TEST, read_only=True)
+    assert read_only_tree.search_entry([1, 2]).data == "first"
+    with pytest.raises(IOError):
+        read_only_tree.insert_entry(DatabaseEntry(coordinates=[3, 4], data="second"))
+    with pytest.raises(IOError):
+        read_only_tree.delete_entry([1, 2])
+
+    tree_size = os.path.getsize(TESTING_DIRECTORY + TREE_FILE_TEST)
+    del read_only_tree
+
+    # read-only tree does not create the working directory in the current directory
+    testing_directory = os.path.abspath(TESTING_DIRECTORY) + os.sep
+    monkeypatch.chdir(tmp_path)
+    read_only_tree = RTree(working_directory=testing_directory, tree_file=TREE_FILE_TEST,
+                           database_file=DATABASE_FILE_TEST, read_only=True)
+    assert read_only_tree.search_entry([1, 2]).data == "first"
+    assert os.listdir(tmp_path) == []
+    monkeypatch.undo()
+    del read_only_tree
+    assert os.path.getsize(TESTING_DIRECTORY + TREE_FILE_TEST) == tree_size
+    assert tree.search_entry([1, 2]).data == "first"
+
+    del tree
+    remove_testing_files()
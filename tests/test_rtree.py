@@ -5,12 +5,23 @@ from typing import Tuple
 
 import pytest
 
+from rtree.data.cache_simulator import CacheSimulator
 from rtree.data.database_entry import DatabaseEntry
+from rtree.data.entry_handle import EntryHandle
+from rtree.data.mbb import MBB
+from rtree.data.rtree_node import RTreeNode
 from rtree.rtree import RTree
 from rtree.default_config import *
 from rtree.ui.visualiser import visualize
 
 
+def remove_sidecar_files(tree_file: str = TREE_FILE_TEST):
+    """Removes files saved beside the tree file, they exist only for some configurations of the tree"""
+    for suffix in (HISTOGRAM_FILE_SUFFIX, HASH_INDEX_FILE_SUFFIX, CACHE_FILE_SUFFIX):
+        if os.path.isfile(TESTING_DIRECTORY + tree_file + suffix):
+            os.remove(TESTING_DIRECTORY + tree_file + suffix)
+
+
 @pytest.mark.parametrize('rtree_args', [
     {"dimensions": -5},
     {"dimensions": 10000000000},
@@ -24,6 +35,12 @@ from rtree.ui.visualiser import visualize
         "node_size": 128,
         "parameters_size": 100
     },
+    {"page_format": 8},
+    {
+        "node_size": 128,
+        "dimensions": 6,
+        "page_format": PAGE_FORMAT_LEAF_COORDINATES
+    },
 ])
 @pytest.mark.filterwarnings("ignore:")
 def test_tree_create_invalid(rtree_args):
@@ -81,6 +98,7 @@ def test_tree_create(rtree_args):
     del tree
     os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
     os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
 
 
 @pytest.mark.parametrize('rtree_args', [
@@ -98,7 +116,8 @@ def test_tree_create(rtree_args):
         "dimensions": 5,
         "parameters_size": 5,
         "id_size": 10
-    }
+    },
+    {"page_format": PAGE_FORMAT_LEAF_COORDINATES},
 ])
 def test_tree_create_save_load(rtree_args):
     try:
@@ -123,6 +142,7 @@ def test_tree_create_save_load(rtree_args):
     del loaded_tree
     os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
     os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
 
 
 @pytest.mark.parametrize('rtree_args', [
@@ -168,6 +188,7 @@ def test_tree_create_save_override(rtree_args):
     del loaded_tree
     os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
     os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
 
 
 @pytest.mark.parametrize('dimensions, count, low, high', [
@@ -228,6 +249,7 @@ def test_rtree_create_entry(dimensions: int, count: int, low: int, high: int):
     del tree
     os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
     os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
 
 
 @pytest.mark.parametrize('dimensions, count, low, high', [
@@ -302,4 +324,998 @@ def test_rtree_delete_entry(dimensions: int, count: int, low: int, high: int):
     del tree
     os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
     os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, low, high', [
+    (1, 100, 0, 100),
+    (2, 300, 0, 300),
+    (3, 500, -1000, 5000),
+])
+def test_rtree_rebuild(dimensions: int, count: int, low: int, high: int):
+    random.seed(5)
+
+    try:
+        os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+        os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    except FileNotFoundError:
+        pass
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 override_file=True)
+
+    coordinates_all = []
+    for _ in range(dimensions):
+        coords_dim = list(range(low, high))
+        random.shuffle(coords_dim)
+        coordinates_all.append(coords_dim[0:count])
+    all_coordinates = [[coordinates_all[d][c] for d in range(dimensions)] for c in range(count)]
+
+    for coordinates in all_coordinates:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    deleted_coordinates = all_coordinates[:count // 3]
+    for coordinates in deleted_coordinates:
+        assert tree.delete_entry(coordinates)
+
+    # rebuild packs the tree from leaf coordinates, payloads are never unpickled
+    database_search = tree.database.search
+    tree.database.search = None
+    tree.rebuild()
+    tree.database.search = database_search
+
+    for coordinates in deleted_coordinates:
+        assert tree.search_entry(coordinates) is None
+
+    for coordinates in all_coordinates[count // 3:]:
+        found_entry = tree.search_entry(coordinates)
+        assert found_entry is not None
+        assert found_entry.data == coordinates
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, k', [
+    (1, 100, 0, 100, 5),
+    (2, 0, 0, 100, 3),
+    (2, 300, 0, 300, 1),
+    (2, 300, 0, 300, 20),
+    (3, 500, -1000, 5000, 10),
+    (2, 50, 0, 100, 100),
+])
+def test_rtree_search_knn(dimensions: int, count: int, low: int, high: int, k: int):
+    random.seed(14)
+
+    try:
+        os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+        os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    except FileNotFoundError:
+        pass
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 override_file=True)
+
+    for _ in range(count):
+        coordinates = [random.randint(low, high) for _ in range(dimensions)]
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    for _ in range(5):
+        point = [random.randint(low * 2, high * 2) for _ in range(dimensions)]
+
+        found_distances = [entry.distance_from(point) for entry in tree.search_knn(k, point)]
+        linear_distances = [entry.distance_from(point) for entry in tree.database.linear_search_knn(k, point)]
+        assert found_distances == linear_distances
+
+        # incremental search yields all entries ordered by distance
+        all_distances = [entry.distance_from(point) for entry in tree.nearest_iter(point)]
+        assert len(all_distances) == count
+        assert all_distances == sorted(all_distances)
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, low, high', [
+    (1, 100, 0, 100),
+    (2, 0, 0, 100),
+    (2, 500, 0, 500),
+    (3, 500, -1000, 5000),
+])
+def test_rtree_search_area_iter(dimensions: int, count: int, low: int, high: int):
+    random.seed(15)
+
+    try:
+        os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+        os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    except FileNotFoundError:
+        pass
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 override_file=True)
+
+    for _ in range(count):
+        coordinates = [random.randint(low, high) for _ in range(dimensions)]
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    for _ in range(5):
+        coordinates_min = [random.randint(low, high) for _ in range(dimensions)]
+        coordinates_max = [random.randint(low, high) for _ in range(dimensions)]
+
+        found_coordinates = sorted(entry.coordinates for entry in
+                                   tree.search_area_iter(coordinates_min, coordinates_max))
+        linear_coordinates = sorted(entry.coordinates for entry in tree.database.linear_search_area(
+            [min(a, b) for a, b in zip(coordinates_min, coordinates_max)],
+            [max(a, b) for a, b in zip(coordinates_min, coordinates_max)]))
+        assert found_coordinates == linear_coordinates
+
+    # first entry is yielded before the other ones are read
+    if count > 0:
+        database_search = tree.database.search
+        searched_positions = []
+        tree.database.search = lambda position: searched_positions.append(position) or database_search(position)
+        next(tree.search_area_iter([low] * dimensions, [high] * dimensions))
+        tree.database.search = database_search
+        assert len(searched_positions) == 1
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, queries, k', [
+    (1, 100, 0, 100, 10, 3),
+    (2, 0, 0, 100, 5, 3),
+    (2, 500, 0, 500, 30, 10),
+    (3, 500, -1000, 5000, 20, 5),
+])
+def test_rtree_search_many(dimensions: int, count: int, low: int, high: int, queries: int, k: int):
+    random.seed(16)
+
+    try:
+        os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+        os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    except FileNotFoundError:
+        pass
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 override_file=True)
+
+    for _ in range(count):
+        coordinates = [random.randint(low, high) for _ in range(dimensions)]
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    areas = [([random.randint(low, high) for _ in range(dimensions)],
+              [random.randint(low, high) for _ in range(dimensions)]) for _ in range(queries)]
+    points = [[random.randint(low, high) for _ in range(dimensions)] for _ in range(queries)]
+
+    # every node is read at most once for the whole batch
+    read_count = tree.tree_handler.nodes_read_count
+    area_results = tree.search_area_many(areas)
+    assert tree.tree_handler.nodes_read_count - read_count <= tree.tree_handler.highest_id + 1
+
+    read_count = tree.tree_handler.nodes_read_count
+    knn_results = tree.search_knn_many(k, points)
+    assert tree.tree_handler.nodes_read_count - read_count <= tree.tree_handler.highest_id + 1
+
+    assert len(area_results) == len(knn_results) == queries
+    for (coordinates_min, coordinates_max), found_entries in zip(areas, area_results):
+        assert sorted(entry.coordinates for entry in found_entries) == \
+               sorted(entry.coordinates for entry in tree.search_area(coordinates_min, coordinates_max))
+    for point, found_entries in zip(points, knn_results):
+        assert [entry.distance_from(point) for entry in found_entries] == \
+               [entry.distance_from(point) for entry in tree.search_knn(k, point)]
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+def check_entry_counts(tree: RTree, node_id: int) -> int:
+    """Checks entry counts stored in the subtree, returns number of entries in it"""
+    node = tree.tree_handler.get_node(node_id)
+    if node.is_leaf:
+        return len(node.child_nodes)
+
+    count = sum(check_entry_counts(tree, child_id) for child_id in node.child_nodes)
+    assert node.entry_count == count
+    return count
+
+
+@pytest.mark.parametrize('dimensions, count, low, high', [
+    (1, 200, 0, 200),
+    (2, 1000, 0, 1000),
+    (3, 500, -1000, 5000),
+])
+def test_rtree_count_area(dimensions: int, count: int, low: int, high: int):
+    random.seed(17)
+
+    try:
+        os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+        os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    except FileNotFoundError:
+        pass
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 node_size=256,
+                 override_file=True)
+
+    all_coordinates = []
+    for _ in range(count):
+        coordinates = [random.randint(low, high) for _ in range(dimensions)]
+        all_coordinates.append(coordinates)
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    def check_counts(entries_count: int):
+        assert check_entry_counts(tree, tree.root_id) == entries_count
+        for _ in range(5):
+            coordinates_min = [random.randint(low, high) for _ in range(dimensions)]
+            coordinates_max = [random.randint(low, high) for _ in range(dimensions)]
+            assert tree.count_area(coordinates_min, coordinates_max) == \
+                   len(tree.search_area(coordinates_min, coordinates_max))
+        assert tree.count_area([low] * dimensions, [high] * dimensions) == entries_count
+
+    # counts are maintained by inserts with splits, deletes and rebuild
+    check_counts(count)
+
+    for coordinates in all_coordinates[:count // 4]:
+        assert tree.delete_entry(coordinates)
+    check_counts(count - count // 4)
+
+    tree.rebuild()
+    check_counts(count - count // 4)
+
+    for coordinates in all_coordinates[:count // 4]:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+    check_counts(count)
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, radius', [
+    (1, 100, 0, 100, 5),
+    (2, 0, 0, 100, 10),
+    (2, 500, 0, 500, 0),
+    (2, 500, 0, 500, 40.5),
+    (3, 500, -1000, 5000, 1000),
+])
+def test_rtree_search_radius(dimensions: int, count: int, low: int, high: int, radius: float):
+    random.seed(18)
+
+    try:
+        os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+        os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    except FileNotFoundError:
+        pass
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 override_file=True)
+
+    all_coordinates = [[random.randint(low, high) for _ in range(dimensions)] for _ in range(count)]
+    for coordinates in all_coordinates:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    for _ in range(5):
+        point = all_coordinates[0] if count > 0 else [low] * dimensions
+        found_coordinates = sorted(entry.coordinates for entry in tree.search_radius(point, radius))
+        linear_coordinates = sorted(coordinates for coordinates in all_coordinates
+                                    if DatabaseEntry(coordinates).distance_from(point) <= radius)
+        assert found_coordinates == linear_coordinates
+        all_coordinates = all_coordinates[1:] + all_coordinates[:1]
+
+    with pytest.raises(ValueError):
+        tree.search_radius([low] * dimensions, -1)
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count_a, count_b, low, high, distance, other_config', [
+    (1, 100, 50, 0, 100, 0, {}),
+    (2, 0, 100, 0, 100, 5, {}),
+    (2, 500, 300, 0, 300, 0, {}),
+    (2, 500, 300, 0, 300, 7.5, {}),
+    (3, 300, 400, 0, 100, 10, {}),
+    (2, 500, 300, 0, 300, 7.5, {"node_size": 256}),
+    (2, 500, 300, 0, 300, 0, {"node_size": 2048, "page_format": PAGE_FORMAT_LEAF_COORDINATES}),
+    (3, 300, 400, 0, 100, 10, {"node_size": 256, "page_format": PAGE_FORMAT_CHILD_MBBS}),
+])
+def test_rtree_join(dimensions: int, count_a: int, count_b: int, low: int, high: int, distance: float,
+                    other_config: dict):
+    random.seed(19)
+    other_tree_file = "other_" + TREE_FILE_TEST
+    other_database_file = "other_" + DATABASE_FILE_TEST
+
+    # both trees are opened before they are filled, each of them keeps capacity of its own nodes
+    trees = [RTree(working_directory=TESTING_DIRECTORY,
+                   tree_file=tree_file,
+                   database_file=database_file,
+                   dimensions=dimensions,
+                   override_file=True,
+                   **config) for tree_file, database_file, config in ((TREE_FILE_TEST, DATABASE_FILE_TEST, {}),
+                                                                      (other_tree_file, other_database_file,
+                                                                       other_config))]
+    all_items = []
+    for tree, count in zip(trees, (count_a, count_b)):
+        items = []
+        for _ in range(count):
+            coordinates = [random.randint(low, high) for _ in range(dimensions)]
+            tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+        for entry in tree.search_area([low] * dimensions, [high] * dimensions):
+            items.append(entry.coordinates)
+        assert len(items) == count
+        all_items.append(items)
+    tree_a, tree_b = trees
+
+    pairs = list(tree_a.join(tree_b, distance=distance))
+    found_pairs = sorted((tree_a.database.search(position_a).coordinates,
+                          tree_b.database.search(position_b).coordinates) for position_a, position_b in pairs)
+    linear_pairs = sorted((coordinates_a, coordinates_b) for coordinates_a in all_items[0]
+                          for coordinates_b in all_items[1]
+                          if DatabaseEntry(coordinates_a).distance_from(coordinates_b) <= distance)
+    assert found_pairs == linear_pairs
+    assert sorted((position_b, position_a) for position_a, position_b in pairs) == \
+           sorted(tree_b.join(tree_a, distance=distance))
+
+    # predicate filters the pairs further
+    def predicate(coordinates_a, coordinates_b):
+        return coordinates_a[0] <= coordinates_b[0]
+
+    assert sorted(tree_a.join(tree_b, predicate, distance)) == \
+           sorted(pair for pair in pairs if predicate(tree_a.database.search_coordinates(pair[0]),
+                                                      tree_b.database.search_coordinates(pair[1])))
+
+    del tree, tree_a, tree_b, trees
+    for file in (TREE_FILE_TEST, DATABASE_FILE_TEST, other_tree_file, other_database_file):
+        os.remove(TESTING_DIRECTORY + file)
+    remove_sidecar_files()
+    remove_sidecar_files(other_tree_file)
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, k', [
+    (1, 100, 0, 100, 5),
+    (2, 500, 0, 300, 10),
+    (3, 400, -500, 500, 7),
+])
+def test_rtree_lazy_search(dimensions: int, count: int, low: int, high: int, k: int):
+    random.seed(20)
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 override_file=True)
+
+    for c in range(count):
+        coordinates = [random.randint(low, high) for _ in range(dimensions)]
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data={"id": c, "coordinates": coordinates}))
+
+    coordinates_min = [random.randint(low, high) for _ in range(dimensions)]
+    coordinates_max = [random.randint(low, high) for _ in range(dimensions)]
+    point = [random.randint(low, high) for _ in range(dimensions)]
+    eager_area = tree.search_area(coordinates_min, coordinates_max)
+    eager_knn = tree.search_knn(k, point)
+    eager_radius = tree.search_radius(point, (high - low) / 5)
+
+    # lazy queries do not unpickle any data
+    search = tree.database.search
+    tree.database.search = None
+    lazy_area = tree.search_area(coordinates_min, coordinates_max, lazy=True)
+    lazy_knn = tree.search_knn(k, point, lazy=True)
+    lazy_radius = tree.search_radius(point, (high - low) / 5, lazy=True)
+    lazy_many = tree.search_area_many([(coordinates_min, coordinates_max)], lazy=True)[0]
+    lazy_entry = tree.search_entry(eager_knn[0].coordinates, lazy=True)
+    tree.database.search = search
+
+    assert [handle.coordinates for handle in lazy_area] == [entry.coordinates for entry in eager_area]
+    assert [handle.coordinates for handle in lazy_many] == [entry.coordinates for entry in eager_area]
+    assert [handle.distance_from(point) for handle in lazy_knn] == [entry.distance_from(point) for entry in eager_knn]
+    assert [handle.coordinates for handle in lazy_radius] == [entry.coordinates for entry in eager_radius]
+    assert lazy_entry.coordinates == eager_knn[0].coordinates
+    assert all(not handle.is_loaded() for handle in lazy_area + lazy_knn + lazy_radius)
+
+    # data are unpickled on first access
+    for handle, entry in zip(lazy_area, eager_area):
+        assert handle.data == entry.data
+        assert handle.is_loaded()
+        assert handle.get_entry().coordinates == entry.coordinates
+
+    # or all at once
+    EntryHandle.fetch_all(lazy_radius)
+    assert all(handle.is_loaded() for handle in lazy_radius)
+    tree.database.search = None
+    assert [handle.data for handle in lazy_radius] == [entry.data for entry in eager_radius]
+    tree.database.search = search
+
+    positions = [handle.position for handle in reversed(lazy_knn)]
+    assert [entry.data for entry in tree.database.search_many(positions)] == \
+           [entry.data for entry in reversed(eager_knn)]
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('page_format', [
+    PAGE_FORMAT_LEAF_COORDINATES,
+    PAGE_FORMAT_CHILD_MBBS,
+    PAGE_FORMAT_LEAF_COORDINATES | PAGE_FORMAT_CHILD_MBBS,
+])
+@pytest.mark.parametrize('dimensions, count, low, high, node_size', [
+    (1, 200, 0, 100, 256),
+    (2, 1000, 0, 500, 512),
+    (3, 600, -1000, 1000, DEFAULT_NODE_SIZE),
+])
+def test_rtree_page_formats(dimensions: int, count: int, low: int, high: int, node_size: int, page_format: int):
+    random.seed(21)
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 node_size=node_size,
+                 page_format=page_format,
+                 override_file=True)
+    leaf_coordinates = bool(page_format & PAGE_FORMAT_LEAF_COORDINATES)
+    child_mbbs = bool(page_format & PAGE_FORMAT_CHILD_MBBS)
+    assert (tree.leaf_children_per_node < tree.children_per_node) == (leaf_coordinates and not child_mbbs)
+
+    # half of entries is inserted one by one, the rest is bulk loaded
+    all_coordinates = [[random.randint(low, high) for _ in range(dimensions)] for _ in range(count)]
+    for coordinates in all_coordinates[:count // 2]:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+    tree.bulk_load(DatabaseEntry(coordinates=coordinates, data=coordinates)
+                   for coordinates in all_coordinates[count // 2:])
+    for coordinates in all_coordinates[:count // 10]:
+        assert tree.delete_entry(coordinates)
+    for coordinates in all_coordinates[:count // 10]:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    for node, _ in tree.get_all_nodes():
+        if node.is_leaf:
+            assert len(node.child_nodes) <= tree.leaf_children_per_node
+            if leaf_coordinates:
+                assert [[dim.low for dim in box] for box in node.child_boxes] == \
+                       [tree.database.search_coordinates(position) for position in node.child_nodes]
+        else:
+            assert len(node.child_nodes) <= tree.children_per_node
+            if child_mbbs:
+                for child_id, box in zip(node.child_nodes, node.child_boxes):
+                    assert MBB(box).contains_inner(tree.tree_handler.get_node(child_id).mbb)
+    check_entry_counts(tree, tree.root_id)
+
+    # children outside the area are not read, when the root stores their MBBs
+    read_count = tree.tree_handler.nodes_read_count
+    assert tree.search_area([high + 10] * dimensions, [high + 20] * dimensions) == []
+    assert (tree.tree_handler.nodes_read_count - read_count == 1) == (child_mbbs or tree.tree_handler.highest_id == 0)
+
+    # entries are compared by coordinates stored in leaves, database is read only for the results
+    if leaf_coordinates:
+        tree.database.search_coordinates = None
+    for _ in range(10):
+        coordinates_min = [random.randint(low, high) for _ in range(dimensions)]
+        coordinates_max = [random.randint(low, high) for _ in range(dimensions)]
+        area = MBB.create_box_from_entry_list(coordinates_min)
+        area.insert_mbb(MBB.create_box_from_entry_list(coordinates_max).box)
+        point = [random.randint(low, high) for _ in range(dimensions)]
+        radius = (high - low) / 10
+
+        inside = sorted(coordinates for coordinates in all_coordinates if area.contains_point(coordinates))
+        assert sorted(entry.coordinates for entry in tree.search_area(coordinates_min, coordinates_max)) == inside
+        assert tree.count_area(coordinates_min, coordinates_max) == len(inside)
+        assert [entry.distance_from(point) for entry in tree.search_knn(5, point)] == \
+               sorted(DatabaseEntry(coordinates).distance_from(point) for coordinates in all_coordinates)[:5]
+        assert sorted(entry.coordinates for entry in tree.search_radius(point, radius)) == \
+               sorted(coordinates for coordinates in all_coordinates
+                      if DatabaseEntry(coordinates).distance_from(point) <= radius)
+    for coordinates in all_coordinates:
+        assert tree.search_entry(coordinates).data == coordinates
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, page_format', [
+    (1, 1000, 0, 1000, PAGE_FORMAT_BASIC),
+    (2, 1000, -500, 500, PAGE_FORMAT_BASIC),
+    (3, 1000, 0, 5000, PAGE_FORMAT_LEAF_COORDINATES),
+])
+def test_rtree_query_planner(dimensions: int, count: int, low: int, high: int, page_format: int):
+    random.seed(18)
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 page_format=page_format,
+                 override_file=True)
+    all_coordinates = [[random.randint(low, high) for _ in range(dimensions)] for _ in range(count)]
+    for coordinates in all_coordinates[:count // 2]:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+    tree.bulk_load(DatabaseEntry(coordinates=coordinates, data=coordinates)
+                   for coordinates in all_coordinates[count // 2:])
+    for coordinates in all_coordinates[:count // 10]:
+        assert tree.delete_entry(coordinates)
+    remaining_coordinates = all_coordinates[count // 10:]
+    assert tree.histogram.total == len(remaining_coordinates)
+
+    # wide area is scanned, small area is searched in the tree
+    wide_plan = tree.explain_area([low] * dimensions, [high] * dimensions)
+    assert wide_plan.plan == PLAN_SCAN
+    # records of deleted entries are read by the scan too
+    assert wide_plan.scan_cost == count
+    assert wide_plan.estimated_count == pytest.approx(len(remaining_coordinates), rel=0.2)
+    assert tree.explain_area(remaining_coordinates[0], remaining_coordinates[0]).plan == PLAN_TREE
+    assert tree.explain_knn(5).plan == PLAN_TREE
+    assert tree.explain_knn(count).plan == PLAN_SCAN
+
+    point = [random.randint(low, high) for _ in range(dimensions)]
+    for plan in (PLAN_AUTO, PLAN_TREE, PLAN_SCAN):
+        for coordinates_min, coordinates_max in [([low] * dimensions, [high] * dimensions),
+                                                 (remaining_coordinates[0], remaining_coordinates[0]),
+                                                 ([high] * dimensions, [(low + high) // 2] * dimensions)]:
+            area = MBB.create_box_from_entry_list(coordinates_min)
+            area.insert_mbb(MBB.create_box_from_entry_list(coordinates_max).box)
+            found_entries = tree.search_area(coordinates_min, coordinates_max, plan=plan)
+            assert sorted(entry.coordinates for entry in found_entries) == \
+                   sorted(coordinates for coordinates in remaining_coordinates if area.contains_point(coordinates))
+            assert tree.last_plan.forced == (plan != PLAN_AUTO)
+            assert tree.last_plan.plan == (plan if plan != PLAN_AUTO else
+                                           tree.explain_area(coordinates_min, coordinates_max).plan)
+
+        for k in (1, 5, count):
+            assert [entry.distance_from(point) for entry in tree.search_knn(k, point, plan=plan)] == \
+                   sorted(DatabaseEntry(coordinates).distance_from(point) for coordinates in remaining_coordinates)[:k]
+
+    # lazy query is not scanned unless forced, forced scan returns handles as well
+    assert all(isinstance(handle, EntryHandle)
+               for handle in tree.search_area([low] * dimensions, [high] * dimensions, lazy=True))
+    assert tree.last_plan.plan == PLAN_TREE
+    scanned_handles = tree.search_area([low] * dimensions, [high] * dimensions, lazy=True, plan=PLAN_SCAN)
+    assert all(isinstance(handle, EntryHandle) and handle.is_loaded() for handle in scanned_handles)
+    assert sorted(handle.data for handle in scanned_handles) == sorted(remaining_coordinates)
+    knn_handles = tree.search_knn(5, point, lazy=True, plan=PLAN_SCAN)
+    assert [handle.distance_from(point) for handle in knn_handles] == \
+           [entry.distance_from(point) for entry in tree.search_knn(5, point, plan=PLAN_TREE)]
+    assert all(isinstance(handle, EntryHandle) for handle in knn_handles)
+    assert tree.search_knn(0, point, plan=PLAN_SCAN) == []
+
+    with pytest.raises(ValueError):
+        tree.search_area([low] * dimensions, [high] * dimensions, plan="index")
+
+    # default plan is the tree
+    tree.search_area([low] * dimensions, [high] * dimensions)
+    assert tree.last_plan.plan == PLAN_TREE
+
+    # histogram is saved with the tree
+    tree.close()
+    histogram = tree.histogram
+    del tree
+    tree = RTree(working_directory=TESTING_DIRECTORY, tree_file=TREE_FILE_TEST, database_file=DATABASE_FILE_TEST)
+    assert tree.histogram.__dict__ == histogram.__dict__
+    assert tree.explain_area([low] * dimensions, [high] * dimensions).plan == PLAN_SCAN
+
+    # outdated histogram (e.g. of a tree that was not closed) is not used, queries use the tree until it is built
+    with open(TESTING_DIRECTORY + TREE_FILE_TEST + HISTOGRAM_FILE_SUFFIX, 'rb') as file:
+        saved_histogram = file.read()
+    tree.insert_entry(DatabaseEntry(coordinates=[high + 1] * dimensions, data="new"))
+    tree.close()
+    with open(TESTING_DIRECTORY + TREE_FILE_TEST + HISTOGRAM_FILE_SUFFIX, 'wb') as file:
+        file.write(saved_histogram)
+    del tree
+    tree = RTree(working_directory=TESTING_DIRECTORY, tree_file=TREE_FILE_TEST, database_file=DATABASE_FILE_TEST)
+    assert tree.histogram is None
+    read_count = tree.tree_handler.nodes_read_count
+    assert tree.explain_area([low] * dimensions, [high] * dimensions).plan == PLAN_TREE
+    assert tree.tree_handler.nodes_read_count == read_count
+    assert len(tree.search_area([low] * dimensions, [high] * dimensions, plan=PLAN_AUTO)) == \
+           len(remaining_coordinates)
+    tree.rebuild_histogram()
+    assert tree.histogram.total == len(remaining_coordinates) + 1
+    assert tree.explain_area([low] * dimensions, [high] * dimensions).plan == PLAN_SCAN
 
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST + HISTOGRAM_FILE_SUFFIX)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, page_format', [
+    (1, 200, 0, 100, PAGE_FORMAT_BASIC),
+    (2, 1500, -500, 500, PAGE_FORMAT_BASIC),
+    (3, 1000, 0, 5000, PAGE_FORMAT_LEAF_COORDINATES | PAGE_FORMAT_CHILD_MBBS),
+])
+def test_rtree_hash_index(dimensions: int, count: int, low: int, high: int, page_format: int):
+    random.seed(19)
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 page_format=page_format,
+                 override_file=True,
+                 hash_index=True)
+    all_coordinates = [[random.randint(low, high) for _ in range(dimensions)] for _ in range(count)]
+    for coordinates in all_coordinates[:count // 2]:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+
+    def check_index(remaining_coordinates):
+        # every entry is indexed with its database position and its leaf
+        records = sorted(tree.hash_index.iter_records())
+        assert [coordinates for coordinates, _, _ in records] == sorted(remaining_coordinates)
+        for coordinates, position, leaf_id in records:
+            assert position in tree.tree_handler.get_node(leaf_id).child_nodes
+            assert tree.database.search_coordinates(position) == coordinates
+
+    check_index(all_coordinates[:count // 2])
+    tree.bulk_load(DatabaseEntry(coordinates=coordinates, data=coordinates)
+                   for coordinates in all_coordinates[count // 2:])
+    check_index(all_coordinates)
+
+    # lookups read the index instead of the tree, missing points are found without reading the tree
+    read_count = tree.tree_handler.nodes_read_count
+    for coordinates in all_coordinates:
+        assert tree.search_entry(coordinates).data == coordinates
+    assert tree.search_entry([high + 1] * dimensions) is None
+    assert tree.tree_handler.nodes_read_count == read_count
+
+    for coordinates in all_coordinates[:count // 4]:
+        assert tree.delete_entry(coordinates)
+    assert not tree.delete_entry([high + 1] * dimensions)
+    for coordinates in all_coordinates[:count // 4]:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+    check_index(all_coordinates)
+    check_entry_counts(tree, tree.root_id)
+
+    tree.rebuild()
+    check_index(all_coordinates)
+
+    # index is persistent, index left behind by changes made without it is not used
+    del tree
+    tree = RTree(working_directory=TESTING_DIRECTORY, tree_file=TREE_FILE_TEST, database_file=DATABASE_FILE_TEST,
+                 hash_index=True)
+    assert tree.hash_index.entry_count == count
+    assert tree.search_entry(all_coordinates[0]).data == all_coordinates[0]
+
+    del tree
+    tree = RTree(working_directory=TESTING_DIRECTORY, tree_file=TREE_FILE_TEST, database_file=DATABASE_FILE_TEST)
+    assert tree.hash_index is None
+    assert tree.delete_entry(all_coordinates[0])
+    del tree
+    tree = RTree(working_directory=TESTING_DIRECTORY, tree_file=TREE_FILE_TEST, database_file=DATABASE_FILE_TEST,
+                 hash_index=True)
+    check_index(all_coordinates[1:])
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST + HASH_INDEX_FILE_SUFFIX)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, low, high, cache_nodes, pinned_levels, cache_policy', [
+    (1, 300, 0, 1000, 4, 1, CACHE_POLICY_LRU),
+    (2, 1500, -500, 500, 20, 2, CACHE_POLICY_LRU),
+    (3, 1500, 0, 5000, 1000, 3, CACHE_POLICY_LRU),
+    (1, 300, 0, 1000, 4, 1, CACHE_POLICY_2Q),
+    (2, 1500, -500, 500, 50, 1, CACHE_POLICY_2Q),
+    (2, 6000, -5000, 5000, 100, 2, CACHE_POLICY_LRU),
+])
+def test_rtree_cache(dimensions: int, count: int, low: int, high: int, cache_nodes: int, pinned_levels: int,
+                     cache_policy: str):
+    random.seed(20)
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 node_size=256,
+                 override_file=True,
+                 cache_memory=cache_nodes * 256,
+                 cache_pinned_levels=pinned_levels,
+                 cache_policy=cache_policy)
+    all_coordinates = [[random.randint(low, high) for _ in range(dimensions)] for _ in range(count)]
+    stored_coordinates = []
+
+    def check_queries():
+        assert len(tree.cache) <= cache_nodes
+        for _ in range(3):
+            coordinates_min = [random.randint(low, high) for _ in range(dimensions)]
+            coordinates_max = [random.randint(low, high) for _ in range(dimensions)]
+            area = MBB.create_box_from_entry_list(coordinates_min)
+            area.insert_mbb(MBB.create_box_from_entry_list(coordinates_max).box)
+            assert sorted(entry.coordinates for entry in tree.search_area(coordinates_min, coordinates_max)) == \
+                   sorted(coordinates for coordinates in stored_coordinates if area.contains_point(coordinates))
+        for coordinates in stored_coordinates[-5:]:
+            assert tree.search_entry(coordinates) is not None
+
+    def check_pinned():
+        # top levels are pinned
+        pinned_ids = tree.cache.get_pinned_ids()
+        assert pinned_ids[0] == tree.root_id
+        assert len(pinned_ids) <= cache_nodes
+        level = [tree.root_id]
+        expected_ids = []
+        for _ in range(pinned_levels):
+            expected_ids += level
+            level = [child_id for node_id in level if not tree.tree_handler.get_node(node_id).is_leaf
+                     for child_id in tree.tree_handler.get_node(node_id).child_nodes]
+        assert pinned_ids == expected_ids[:cache_nodes]
+
+    # cached nodes follow inserts, deletes and rebuilds of the tree
+    for coordinates in all_coordinates[:count // 2]:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+        stored_coordinates.append(coordinates)
+        if len(stored_coordinates) % 100 == 0:
+            check_queries()
+    check_entry_counts(tree, tree.root_id)
+    check_pinned()
+
+    tree.bulk_load(DatabaseEntry(coordinates=coordinates, data=coordinates)
+                   for coordinates in all_coordinates[count // 2:])
+    stored_coordinates = list(all_coordinates)
+    check_queries()
+
+    for coordinates in all_coordinates[:count // 4]:
+        assert tree.delete_entry(coordinates)
+        stored_coordinates.remove(coordinates)
+        if len(stored_coordinates) % 100 == 0:
+            check_queries()
+    check_pinned()
+
+    tree.rebuild()
+    check_queries()
+    check_pinned()
+
+    # repeated query is answered from the cache when all its nodes fit
+    point = [random.randint(low, high) for _ in range(dimensions)]
+    tree.search_knn(5, point)
+    read_count = tree.tree_handler.nodes_read_count
+    tree.search_knn(5, point)
+    if cache_nodes > tree.tree_handler.highest_id:
+        assert tree.tree_handler.nodes_read_count == read_count
+
+    # nodes read by a walk of the whole tree are not stored
+    cached_ids = (set(tree.cache.memory_lru), set(tree.cache.memory_in))
+    assert len(tree.search_area([low] * dimensions, [high] * dimensions, cache_nodes=False)) == \
+           len(stored_coordinates)
+    assert (set(tree.cache.memory_lru), set(tree.cache.memory_in)) == cached_ids
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, node_size', [
+    (1, 500, 128),
+    (2, 1000, 256),
+    (3, 1000, 512),
+])
+def test_rtree_write_buffer(dimensions: int, count: int, node_size: int):
+    random.seed(21)
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 node_size=node_size,
+                 override_file=True)
+    tree_handler = tree.tree_handler
+    all_coordinates = [[random.randint(-1000, 1000) for _ in range(dimensions)] for _ in range(count)]
+
+    # ids of pages written by the tree
+    touched_ids = set()
+    update_node, create_node = tree_handler.update_node, tree_handler.create_node
+
+    def spy_update_node(node_id: int, node: RTreeNode) -> int:
+        touched_ids.add(node_id)
+        return update_node(node_id, node)
+
+    def spy_create_node(node: RTreeNode) -> int:
+        node_id = create_node(node)
+        touched_ids.add(node_id)
+        return node_id
+
+    tree_handler.update_node, tree_handler.create_node = spy_update_node, spy_create_node
+
+    # every page touched by an insert or a delete is written once
+    for coordinates in all_coordinates:
+        touched_ids.clear()
+        written_count = tree_handler.nodes_written_count
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+        assert not tree_handler.dirty_pages
+        assert tree_handler.nodes_written_count - written_count == len(touched_ids)
+    check_entry_counts(tree, tree.root_id)
+
+    for coordinates in all_coordinates[:count // 10]:
+        touched_ids.clear()
+        written_count = tree_handler.nodes_written_count
+        assert tree.delete_entry(coordinates)
+        assert tree_handler.nodes_written_count - written_count == len(touched_ids)
+
+    # all pages are in the file
+    del tree, tree_handler, update_node, create_node
+    tree = RTree(working_directory=TESTING_DIRECTORY, tree_file=TREE_FILE_TEST, database_file=DATABASE_FILE_TEST)
+    check_entry_counts(tree, tree.root_id)
+    for coordinates in all_coordinates[count // 10:count // 10 + 50]:
+        assert tree.search_entry(coordinates) is not None
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, cache_nodes, pinned_levels', [
+    (1, 500, 3, 1),
+    (2, 2000, 20, 2),
+    (3, 2000, 1000, 2),
+])
+def test_rtree_cache_warm_up(dimensions: int, count: int, cache_nodes: int, pinned_levels: int):
+    random.seed(23)
+
+    tree = RTree(working_directory=TESTING_DIRECTORY,
+                 tree_file=TREE_FILE_TEST,
+                 database_file=DATABASE_FILE_TEST,
+                 dimensions=dimensions,
+                 node_size=256,
+                 override_file=True)
+    all_coordinates = [[random.randint(-1000, 1000) for _ in range(dimensions)] for _ in range(count)]
+    for coordinates in all_coordinates:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+    # saved histogram is not built from the tree by the queries
+    tree.flush()
+    del tree
+
+    def open_tree() -> RTree:
+        return RTree(working_directory=TESTING_DIRECTORY, tree_file=TREE_FILE_TEST, database_file=DATABASE_FILE_TEST,
+                     cache_memory=cache_nodes * 256, cache_pinned_levels=pinned_levels)
+
+    def run_queries(tree: RTree):
+        for coordinates in all_coordinates[:50]:
+            tree.search_knn(3, coordinates)
+
+    # recorded accesses replayed by the simulator give the misses of the cache
+    tree = open_tree()
+    tree.cache.start_recording()
+    run_queries(tree)
+    simulator = CacheSimulator(tree.cache.stop_recording(), node_size=256, pinned_ids=tree.cache.get_pinned_ids())
+    assert simulator.misses(cache_nodes * 256) == tree.cache.misses
+    assert simulator.miss_ratio(cache_nodes * 256) == pytest.approx(1 - tree.cache.hit_ratio)
+    assert tree.cache.resident_bytes <= cache_nodes * 256
+    del tree
+
+    # warmed up nodes are not read by queries
+    tree = open_tree()
+    depth = tree.tree_handler.tree_depth
+    loaded_count = tree.warm_up(depth + 1)
+    assert loaded_count == min(cache_nodes, tree.tree_handler.highest_id + 1)
+    assert len(tree.cache) == loaded_count
+    if loaded_count == tree.tree_handler.highest_id + 1:
+        read_count = tree.tree_handler.nodes_read_count
+        run_queries(tree)
+        assert tree.tree_handler.nodes_read_count == read_count
+        assert tree.cache.misses == 0
+
+    # pinned levels are warmed up by default
+    del tree
+    tree = open_tree()
+    assert tree.warm_up() == len(tree.cache.get_pinned_ids())
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    remove_sidecar_files()
+
+
+@pytest.mark.parametrize('dimensions, count, cache_nodes, cache_preload', [
+    (1, 1000, 10, CACHE_PRELOAD_SYNC),
+    (2, 2000, 1000, CACHE_PRELOAD_SYNC),
+    (2, 2000, 50, CACHE_PRELOAD_BACKGROUND),
+    (3, 2000, 1000, CACHE_PRELOAD_BACKGROUND),
+])
+def test_rtree_cache_preload(dimensions: int, count: int, cache_nodes: int, cache_preload: str):
+    random.seed(25)
+
+    def open_tree(preload: str = CACHE_PRELOAD_NONE, override_file: bool = False) -> RTree:
+        return RTree(working_directory=TESTING_DIRECTORY, tree_file=TREE_FILE_TEST, database_file=DATABASE_FILE_TEST,
+                     dimensions=dimensions, node_size=256, override_file=override_file,
+                     cache_memory=cache_nodes * 256, cache_preload=preload)
+
+    tree = open_tree(override_file=True)
+    all_coordinates = [list(coordinates) for coordinates in
+                       {tuple(random.randint(-1000, 1000) for _ in range(dimensions)) for _ in range(count)}]
+    for coordinates in all_coordinates:
+        tree.insert_entry(DatabaseEntry(coordinates=coordinates, data=coordinates))
+    for coordinates in all_coordinates[:100]:
+        tree.search_knn(3, coordinates)
+    resident_ids = tree.cache.get_resident_ids()
+    assert len(resident_ids) == min(cache_nodes, tree.tree_handler.highest_id + 1)
+    tree.close()
+    tree.close()
+    assert tree.tree_handler.file.closed and tree.database.file.closed
+    del tree
+
+    # resident nodes are loaded again
+    tree = open_tree(cache_preload)
+    if tree.preload_thread is not None:
+        tree.preload_thread.join()
+    # pinned levels may take more space than before, when the root got new children
+    assert set(tree.cache.get_resident_ids()) <= set(resident_ids)
+    if cache_nodes > tree.tree_handler.highest_id:
+        assert tree.cache.get_resident_ids() == resident_ids
+    else:
+        assert len(tree.cache) >= len(resident_ids) - len(tree.cache.get_pinned_ids())
+    if cache_nodes > tree.tree_handler.highest_id:
+        read_count = tree.tree_handler.nodes_read_count
+        tree.search_knn(3, all_coordinates[0])
+        assert tree.tree_handler.nodes_read_count == read_count
+
+    # changes during the preload are not overwritten by preloaded nodes
+    del tree
+    tree = open_tree(cache_preload)
+    for coordinates in all_coordinates[:50]:
+        assert tree.delete_entry(coordinates)
+    if tree.preload_thread is not None:
+        tree.preload_thread.join()
+    check_entry_counts(tree, tree.root_id)
+    for coordinates in all_coordinates[:50]:
+        assert tree.search_entry(coordinates) is None
+    for coordinates in all_coordinates[50:100]:
+        assert tree.search_entry(coordinates) is not None
+
+    # close stops the preload, changes are saved
+    tree.close()
+    tree = open_tree(cache_preload)
+    tree.close()
+    assert tree.preload_thread is None
+    tree = open_tree()
+    assert tree.search_entry(all_coordinates[0]) is None
+    assert tree.search_entry(all_coordinates[50]) is not None
+
+    # preload is off by default, saved ids of another tree are ignored
+    tree.close()
+    del tree
+    assert len(open_tree().cache) <= 1
+    tree = open_tree(cache_preload, override_file=True)
+    assert not os.path.isfile(TESTING_DIRECTORY + TREE_FILE_TEST + CACHE_FILE_SUFFIX)
+
+    del tree
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + DATABASE_FILE_TEST)
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST + CACHE_FILE_SUFFIX)
+    remove_sidecar_files()
@@ -15,8 +15,6 @@ from rtree.default_config import *
 testing_unique_sequence = secrets.token_bytes(UNIQUE_SEQUENCE_LENGTH)
 testing_config_hash = secrets.token_bytes(CONFIG_HASH_LENGTH)
 
-RTreeNode.max_entries_count = 50
-
 
 def compare_tree_file_handler_dictionary(a_dict, b_dict):
     return (a_dict['filename'] == b_dict['filename'] and
@@ -75,6 +73,42 @@ def test_create_handler_invalid(rtree_args):
         pass
 
 
+@pytest.mark.parametrize('version', [None, 0, TREE_FILE_FORMAT_VERSION + 1])
+def test_unsupported_file_format(version):
+    if version is None:
+        # header written before the format version was added, with one empty page
+        content = testing_unique_sequence + testing_config_hash + NODE_ID_SIZE.to_bytes(1, TREE_BYTEORDER) + \
+            b''.join(value.to_bytes(size, TREE_BYTEORDER, signed=True) for value, size in
+                     ((2, 4), (1024, 4), (0, NODE_ID_SIZE), (NULL_NODE_ID, NODE_ID_SIZE), (0, NODE_ID_SIZE),
+                      (PARAMETER_RECORD_SIZE, 1), (0, 4))) + bytes(1024)
+    else:
+        tree_handler = TreeFileHandler(filename=TESTING_DIRECTORY + TREE_FILE_TEST)
+        tree_handler.create_node(RTreeNode.create_empty_node(2, is_leaf=True, parent_id=0))
+        tree_handler.close()
+        # file of the current version is opened
+        tree_handler = TreeFileHandler(filename=TESTING_DIRECTORY + TREE_FILE_TEST)
+        assert tree_handler.highest_id == 0
+        tree_handler.close()
+        del tree_handler
+
+        with open(TESTING_DIRECTORY + TREE_FILE_TEST, 'rb') as file:
+            content = bytearray(file.read())
+        version_position = UNIQUE_SEQUENCE_LENGTH + CONFIG_HASH_LENGTH + len(TREE_FILE_MAGIC)
+        content[version_position:version_position + 2] = version.to_bytes(2, TREE_BYTEORDER)
+        content = bytes(content)
+    with open(TESTING_DIRECTORY + TREE_FILE_TEST, 'wb') as file:
+        file.write(content)
+
+    with pytest.raises(IOError, match="Unsupported format of tree file"):
+        TreeFileHandler(filename=TESTING_DIRECTORY + TREE_FILE_TEST)
+
+    # file of another format is not changed
+    with open(TESTING_DIRECTORY + TREE_FILE_TEST, 'rb') as file:
+        assert file.read() == content
+
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+
+
 @pytest.mark.parametrize('tree_file_handler_args, written_nodes', [
     (
             dict(filename=TESTING_DIRECTORY + TREE_FILE_TEST, dimensions=2, node_size=1024),
@@ -109,6 +143,33 @@ def test_create_handler_invalid(rtree_args):
                               child_nodes=[1, 2], is_leaf=True)
             )
     ),
+    (
+            dict(filename=TESTING_DIRECTORY + TREE_FILE_TEST, dimensions=3, node_size=256,
+                 page_format=PAGE_FORMAT_LEAF_COORDINATES),
+            (
+                    RTreeNode(node_id=0, parent_id=0, mbb=MBB((MBBDim(1, 9), MBBDim(-2, 2), MBBDim(3, 30))),
+                              child_nodes=[1, 2], is_leaf=False),
+                    RTreeNode(node_id=1, parent_id=0, mbb=MBB((MBBDim(1, 9), MBBDim(-2, 2), MBBDim(3, 30))),
+                              child_nodes=[10, 200], is_leaf=True,
+                              child_boxes=[(MBBDim(1, 1), MBBDim(-2, -2), MBBDim(30, 30)),
+                                           (MBBDim(9, 9), MBBDim(2, 2), MBBDim(3, 3))]),
+                    RTreeNode(node_id=2, parent_id=0, mbb=MBB((MBBDim(0, 0), MBBDim(0, 0), MBBDim(0, 0))),
+                              child_nodes=[], is_leaf=True)
+            )
+    ),
+    (
+            dict(filename=TESTING_DIRECTORY + TREE_FILE_TEST, dimensions=2, node_size=256, id_size=4,
+                 page_format=PAGE_FORMAT_CHILD_MBBS),
+            (
+                    RTreeNode(node_id=0, parent_id=0, mbb=MBB((MBBDim(-5, 9), MBBDim(2, 20))),
+                              child_nodes=[1, 2], is_leaf=False,
+                              child_boxes=[(MBBDim(-5, 0), MBBDim(2, 10)), (MBBDim(1, 9), MBBDim(5, 20))]),
+                    RTreeNode(node_id=1, parent_id=0, mbb=MBB((MBBDim(-5, 0), MBBDim(2, 10))),
+                              child_nodes=list(range(40)), is_leaf=True),
+                    RTreeNode(node_id=2, parent_id=0, mbb=MBB((MBBDim(0, 0), MBBDim(0, 0))),
+                              child_nodes=[], is_leaf=False)
+            )
+    ),
 ])
 def test_write_read_node_one_handler(tree_file_handler_args, written_nodes):
     if os.path.isfile(TESTING_DIRECTORY + TREE_FILE_TEST):
@@ -437,3 +498,57 @@ def test_tree_handler_update_node(dimensions: int, count: int, low: int, high: i
         assert updated_rnd_node.child_nodes == rnd_node.child_nodes
         assert updated_rnd_node.parent_id == rnd_node.parent_id
         assert updated_rnd_node.is_leaf == rnd_node.is_leaf
+
+
+@pytest.mark.parametrize('dimensions, count, buffered_nodes', [
+    (1, 20, 100),
+    (2, 50, 8),
+    (3, 30, 1),
+])
+def test_write_buffer(dimensions: int, count: int, buffered_nodes: int):
+    random.seed(21)
+    if os.path.isfile(TESTING_DIRECTORY + TREE_FILE_TEST):
+        os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)
+
+    tree_handler = TreeFileHandler(filename=TESTING_DIRECTORY + TREE_FILE_TEST, dimensions=dimensions,
+                                   write_buffer_size=buffered_nodes * DEFAULT_NODE_SIZE)
+
+    def create_random_node(parent_id: int) -> RTreeNode:
+        box = []
+        for _ in range(dimensions):
+            lower = random.randint(0, 1000)
+            box.append(MBBDim(lower, lower + random.randint(0, 100)))
+        return RTreeNode(mbb=MBB(tuple(box)), parent_id=parent_id, child_nodes=[random.randint(0, 1000)],
+                         is_leaf=True)
+
+    nodes = {tree_handler.create_node(create_random_node(c)): None for c in range(count)}
+    tree_handler.commit()
+    assert tree_handler.nodes_written_count == count
+
+    # repeated updates of one page are merged, buffered pages are read before they are written
+    for _ in range(5):
+        for node_id in random.sample(list(nodes), count // 2):
+            nodes[node_id] = create_random_node(node_id)
+            tree_handler.update_node(node_id, nodes[node_id])
+            assert tree_handler.get_node(node_id).mbb == nodes[node_id].mbb
+    assert len(tree_handler.dirty_pages) <= buffered_nodes
+
+    tree_handler.commit()
+    updated_ids = [node_id for node_id, node in nodes.items() if node is not None]
+    assert not tree_handler.dirty_pages
+    if buffered_nodes >= count:
+        assert tree_handler.nodes_written_count == count + len(updated_ids)
+
+    # pages are written on close
+    tree_handler.update_node(updated_ids[0], create_random_node(0))
+    nodes[updated_ids[0]] = tree_handler.get_node(updated_ids[0])
+    del tree_handler
+    tree_handler = TreeFileHandler(filename=TESTING_DIRECTORY + TREE_FILE_TEST, read_only=True)
+    assert tree_handler.highest_id == count - 1
+    for node_id in updated_ids:
+        node = tree_handler.get_node(node_id)
+        assert node.mbb == nodes[node_id].mbb
+        assert node.parent_id == nodes[node_id].parent_id
+
+    del tree_handler
+    os.remove(TESTING_DIRECTORY + TREE_FILE_TEST)